@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+# Module: account_mirror
+# Author: user extension
+# Created on: 19.10.2026
+# License: AGPL v.3 https://www.gnu.org/licenses/agpl-3.0.html
+
+import os
+import json
+import time
+import sqlite3
+import xbmc
+from collections import namedtuple
+from datetime import datetime, timezone
+
+MIRROR_FILE = 'account.sqlite'
+PAGE_SIZE = 50
+SYNC_INTERVAL = 30          # sekundy, častěji se výpis s účtem nesynchronizuje
+# po jaké době se seznam stáhne celý (zachytí i změny provedené mimo doplněk, např. na webu)
+FULL_SYNC_TTL = {
+    'history': 24 * 3600,
+    'queue': 6 * 3600
+}
+HISTORY_FIELDS = ['ended_at', 'download_id', 'started_at']
+
+# idents stažených (přehraných) souborů a souborů ve frontě
+Marks = namedtuple('Marks', ['watched', 'queued'])
+
+def _timestamp(value):
+    """started_at z API jako unixový čas; údaj bez časové zóny se bere jako UTC"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def _newest_first(kind, entries):
+    """Delta synchronizace předpokládá, že API vrací nejnovější záznamy první - u historie se to ověří"""
+    if kind != 'history':
+        return True
+    times = [t for t in (_timestamp(entry.get('started_at')) for entry in entries) if t is not None]
+    return all(a >= b for a, b in zip(times, times[1:]))
+
+def _entry_key(kind, entry):
+    if kind == 'history':
+        return entry.get('download_id') or (entry.get('ident', '') + '|' + (entry.get('started_at') or ''))
+    return entry.get('ident')
+
+class AccountMirror:
+    """Lokální kopie historie stahování a fronty účtu Webshare.
+
+    Oba seznamy vrací API od nejnovějšího záznamu, synchronizace proto stahuje stránky jen
+    do prvního známého záznamu; jednou za FULL_SYNC_TTL se seznam stáhne a nahradí celý.
+    Celý se stáhne i tehdy, když delta nesedí: počet záznamů hlášený API (total) se liší od zrcadla
+    (např. soubor odebraný z fronty na webu), nebo historie nepřišla seřazená od nejnovějšího.
+    Změny provedené doplňkem (fronta, mazání historie) se do zrcadla zapisují hned; soubory přidané
+    do fronty doplňkem jsou označené jako lokální a synchronizace se na nich nezastaví, aby viděla
+    i to, co bylo do fronty přidáno jinde před nimi.
+    """
+
+    def __init__(self, profile):
+        self.conn = None
+        try:
+            if not os.path.exists(profile):
+                os.makedirs(profile)
+            self.conn = sqlite3.connect(os.path.join(profile, MIRROR_FILE), timeout=10)
+            self.conn.execute('CREATE TABLE IF NOT EXISTS history (download_id TEXT PRIMARY KEY, ident TEXT, started TEXT, data TEXT)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS history_ident ON history (ident)')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS queue (ident TEXT PRIMARY KEY, position INTEGER, data TEXT, local INTEGER DEFAULT 0)')
+            try:
+                # zrcadlo z dřívější verze bez příznaku lokálně přidaných záznamů
+                self.conn.execute('ALTER TABLE queue ADD COLUMN local INTEGER DEFAULT 0')
+            except sqlite3.OperationalError:
+                pass
+            self.conn.execute('CREATE TABLE IF NOT EXISTS sync (kind TEXT PRIMARY KEY, synced INTEGER, full INTEGER)')
+            self.conn.commit()
+        except Exception as e:
+            xbmc.log(f'WebshareCinema: Error opening account mirror: {str(e)}', level=xbmc.LOGERROR)
+            self.conn = None
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def synced(self, kind):
+        """Čas poslední synchronizace (0 = zrcadlo ještě nebylo naplněno)"""
+        if self.conn is None:
+            return 0
+        row = self.conn.execute('SELECT synced FROM sync WHERE kind = ?', (kind,)).fetchone()
+        return row[0] if row else 0
+
+    def sync(self, kind, fetch_page):
+        """Stáhne nové záznamy; fetch_page(offset, limit) vrací (záznamy, total), None při chybě API.
+
+        total je celkový počet záznamů podle API (None, pokud ho odpověď neobsahuje).
+        Vrací False, pokud API odpovědělo chybou (zrcadlo zůstane beze změny).
+        """
+        if self.conn is None:
+            return False
+        row = self.conn.execute('SELECT full FROM sync WHERE kind = ?', (kind,)).fetchone()
+        full = row is None or time.time() - row[0] >= FULL_SYNC_TTL[kind]
+        fetched = self._fetch(kind, fetch_page, set() if full else self._keys(kind))
+        if fetched is None:
+            return False
+        entries, total = fetched
+        if not full:
+            keys = self._all_keys(kind) | set(_entry_key(kind, entry) for entry in entries)
+            if not _newest_first(kind, entries) or (total is not None and total != len(keys)):
+                xbmc.log(f'WebshareCinema: Account {kind} delta does not match ({total} remote, {len(keys)} local), full sync', level=xbmc.LOGDEBUG)
+                full = True
+                fetched = self._fetch(kind, fetch_page, set())
+                if fetched is None:
+                    return False
+                entries, total = fetched
+        now = int(time.time())
+        try:
+            if kind == 'history':
+                self._store_history(entries, full)
+            else:
+                self._store_queue(entries, full)
+            self.conn.execute('INSERT OR REPLACE INTO sync (kind, synced, full) VALUES (?, ?, ?)',
+                              (kind, now, now if full else row[0]))
+            self.conn.commit()
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            xbmc.log(f'WebshareCinema: Error updating account mirror: {str(e)}', level=xbmc.LOGERROR)
+        return True
+
+    def _fetch(self, kind, fetch_page, known):
+        """Stránky od nejnovějšího do prvního známého záznamu; vrací (záznamy, total) nebo None"""
+        entries = []
+        seen = set()
+        offset = 0
+        total = None
+        while True:
+            result = fetch_page(offset, PAGE_SIZE)
+            if result is None:
+                return None
+            page, page_total = result
+            if total is None:
+                total = page_total
+            new = 0
+            reached = False
+            for entry in page:
+                key = _entry_key(kind, entry)
+                if key in seen:
+                    continue
+                if key in known:
+                    reached = True
+                    break
+                seen.add(key)
+                entries.append(entry)
+                new += 1
+            # konec seznamu, první známý záznam, nebo API stránkování nepodporuje a vrací stále totéž
+            if reached or len(page) < PAGE_SIZE or new == 0:
+                return entries, total
+            offset += PAGE_SIZE
+
+    def _all_keys(self, kind):
+        if kind == 'history':
+            return set(row[0] for row in self.conn.execute('SELECT download_id FROM history'))
+        return set(row[0] for row in self.conn.execute('SELECT ident FROM queue'))
+
+    def _keys(self, kind):
+        if kind == 'history':
+            return set(row[0] for row in self.conn.execute('SELECT download_id FROM history'))
+        return set(row[0] for row in self.conn.execute('SELECT ident FROM queue WHERE local = 0'))
+
+    def _store_history(self, entries, full):
+        if full:
+            self.conn.execute('DELETE FROM history')
+        for entry in entries:
+            data = dict((k, v) for k, v in entry.items() if k not in HISTORY_FIELDS)
+            self.conn.execute('INSERT OR REPLACE INTO history (download_id, ident, started, data) VALUES (?, ?, ?, ?)',
+                              (_entry_key('history', entry), entry.get('ident'), entry.get('started_at') or '', json.dumps(data)))
+
+    def _store_queue(self, entries, full):
+        if full:
+            self.conn.execute('DELETE FROM queue')
+            first = 0
+        else:
+            # nové záznamy jsou novější než vše uložené, řadí se před ně
+            first = (self.conn.execute('SELECT MIN(position) FROM queue').fetchone()[0] or 0) - len(entries)
+        for position, entry in enumerate(entries, first):
+            self.conn.execute('INSERT OR REPLACE INTO queue (ident, position, data, local) VALUES (?, ?, ?, 0)',
+                              (entry.get('ident'), position, json.dumps(entry)))
+
+    def history(self):
+        """Stažené soubory od nejnovějšího, každý ident jednou"""
+        if self.conn is None:
+            return []
+        items = {}
+        for ident, data in self.conn.execute('SELECT ident, data FROM history ORDER BY started DESC, rowid ASC'):
+            if ident not in items:
+                items[ident] = json.loads(data)
+        return list(items.values())
+
+    def download_ids(self, ident):
+        """Všechny záznamy historie (download_id) pro daný soubor"""
+        if self.conn is None:
+            return []
+        return [row[0] for row in self.conn.execute('SELECT download_id FROM history WHERE ident = ?', (ident,))]
+
+    def download_ids_before(self, cutoff):
+        """download_id záznamů historie zahájených před daným unixovým časem"""
+        if self.conn is None:
+            return []
+        ids = []
+        for download_id, started in self.conn.execute("SELECT download_id, started FROM history WHERE started != ''"):
+            timestamp = _timestamp(started)
+            if timestamp is not None and timestamp < cutoff:
+                ids.append(download_id)
+        return ids
+
+    def remove_history(self, download_ids):
+        if self.conn is None or not download_ids:
+            return
+        download_ids = list(download_ids)
+        for i in range(0, len(download_ids), 500):
+            chunk = download_ids[i:i + 500]
+            self.conn.execute('DELETE FROM history WHERE download_id IN (%s)' % ','.join('?' * len(chunk)), chunk)
+        self.conn.commit()
+
+    def queue(self):
+        if self.conn is None:
+            return []
+        return [json.loads(row[0]) for row in self.conn.execute('SELECT data FROM queue ORDER BY position')]
+
+    def queue_watched(self):
+        """Soubory ve frontě, které už jsou v historii stahování"""
+        if self.conn is None:
+            return []
+        return [json.loads(row[0]) for row in self.conn.execute(
+            'SELECT data FROM queue WHERE ident IN (SELECT ident FROM history) ORDER BY position')]
+
+    def add_queue(self, item):
+        if self.conn is None:
+            return
+        position = (self.conn.execute('SELECT MIN(position) FROM queue').fetchone()[0] or 0) - 1
+        self.conn.execute('INSERT OR REPLACE INTO queue (ident, position, data, local) VALUES (?, ?, ?, 1)',
+                          (item['ident'], position, json.dumps(item)))
+        self.conn.commit()
+
+    def remove_queue(self, idents):
+        if self.conn is None or not idents:
+            return
+        idents = list(idents)
+        for i in range(0, len(idents), 500):
+            chunk = idents[i:i + 500]
+            self.conn.execute('DELETE FROM queue WHERE ident IN (%s)' % ','.join('?' * len(chunk)), chunk)
+        self.conn.commit()
+
+    def marks(self):
+        if self.conn is None:
+            return Marks(frozenset(), frozenset())
+        return Marks(frozenset(row[0] for row in self.conn.execute('SELECT DISTINCT ident FROM history')),
+                     frozenset(row[0] for row in self.conn.execute('SELECT ident FROM queue')))
+
+def marks(profile):
+    """Zkratka: značky přehraných souborů a souborů ve frontě pro vykreslení výpisu"""
+    mirror = AccountMirror(profile)
+    try:
+        return mirror.marks()
+    finally:
+        mirror.close()
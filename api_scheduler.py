@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+# Module: api_scheduler
+# Author: user extension
+# Created on: 19.10.2026
+# License: AGPL v.3 https://www.gnu.org/licenses/agpl-3.0.html
+
+import os
+import json
+import time
+import heapq
+import random
+import itertools
+import threading
+import xbmc
+import file_lock
+import circuit_breaker
+
+# Priority: menší číslo = dříve
+INTERACTIVE = 0     # přehrání, otevření výpisu
+BACKGROUND = 1      # předběžné načítání, obnova, anotace
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', BACKGROUND: 'background'}
+
+# Limity platí pro jedno spuštění doplňku (každé volání pluginu, služba i stahování na pozadí
+# mají vlastní plánovač); souběžná spuštění se dohromady neomezují
+DEFAULT_RATE = 5.0          # požadavků za sekundu
+DEFAULT_BURST = 5
+DEFAULT_CONCURRENCY = 4
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5          # sekundy, zdvojuje se s každým pokusem
+BACKOFF_MAX = 8.0
+STATS_FILE = 'api_stats.json'    # v profilu; součet počítadel všech spuštění doplňku
+# Jen čtecí endpointy se opakují a souběžné stejné dotazy slučují; zápisy (queue_file,
+# dequeue_file, clear_history, file_link – zakládá záznam v historii...) se posílají přesně jednou
+IDEMPOTENT = ('search', 'file_info', 'queue', 'history', 'salt', 'user_data')
+# Dotazy, které se po neúspěšné odpovědi API (status není OK) zopakují s doplněnými parametry;
+# soubor smazaný z Webshare vrací file_info jen s maybe_removed
+FALLBACKS = {'file_info': {'maybe_removed': 'true'}}
+
+def _retryable(response):
+    return response is not None and (response.status_code == 429 or response.status_code >= 500)
+
+def _key(fnct, data):
+    """Klíč pro slučování stejných souběžných požadavků"""
+    items = []
+    for name, value in sorted((data or {}).items()):
+        items.append((name, tuple(value) if isinstance(value, list) else value))
+    return fnct, tuple(items)
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+class Scheduler:
+    """Centrální plánovač volání API Webshare.
+
+    Token bucket omezuje rychlost, semafor počet souběžných požadavků (v rámci jednoho spuštění
+    doplňku, stav se mezi spuštěními nesdílí); čekající požadavky
+    se pouští podle priority (interaktivní před podkladovými). Stejné souběžné požadavky
+    na čtecí endpointy (idempotent) se sloučí do jednoho, při 429/5xx nebo chybě spojení se
+    opakují s náhodně rozprostřeným exponenciálním čekáním; ostatní se posílají právě jednou.
+    """
+
+    def __init__(self, send, rate=DEFAULT_RATE, burst=DEFAULT_BURST, concurrency=DEFAULT_CONCURRENCY, retries=MAX_RETRIES, fatal=(),
+                 idempotent=IDEMPOTENT, stats_path=None, breaker=None, accept=None, fallbacks=FALLBACKS):
+        self.send = send
+        self.accept = accept    # accept(response) - odpověď API je úspěšná; bez ní se fallbacks nepoužijí
+        self.fallbacks = fallbacks
+        self.fatal = fatal      # výjimky, které se neopakují (např. rozpojený jistič)
+        self.breaker = breaker  # dostane jeden výsledek za celé volání, ne za každý pokus
+        self.idempotent = idempotent
+        self.stats = Stats(stats_path)
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.tokens = self.burst
+        self.last = time.time()
+        self.concurrency = max(1, int(concurrency))
+        self.retries = retries
+        self.active = 0
+        self.waiting = []
+        self.sequence = itertools.count()
+        self.cond = threading.Condition()
+        self.inflight = {}
+        self.inflight_lock = threading.Lock()
+
+    def _refill(self):
+        now = time.time()
+        if self.rate > 0:
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def _acquire(self, priority):
+        with self.cond:
+            ticket = (priority, next(self.sequence))
+            heapq.heappush(self.waiting, ticket)
+            while True:
+                wait = None
+                if self.waiting[0] == ticket and self.active < self.concurrency:
+                    self._refill()
+                    if self.rate <= 0 or self.tokens >= 1:
+                        if self.rate > 0:
+                            self.tokens -= 1
+                        heapq.heappop(self.waiting)
+                        self.active += 1
+                        self.cond.notify_all()
+                        return
+                    wait = (1 - self.tokens) / self.rate
+                self.cond.wait(wait)
+
+    def _release(self):
+        with self.cond:
+            self.active -= 1
+            self.cond.notify_all()
+
+    def call(self, fnct, data, priority=INTERACTIVE):
+        if fnct not in self.idempotent:
+            return self._execute(fnct, data, priority, 0)
+        key = _key(fnct, data)
+        with self.inflight_lock:
+            call = self.inflight.get(key)
+            owner = call is None
+            if owner:
+                call = self.inflight[key] = _Call()
+        if not owner:
+            # stejný požadavek už běží - počkáme na jeho výsledek
+            self.stats.record({'coalesced': 1})
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.response
+        try:
+            call.response = self._execute(fnct, data, priority, self.retries)
+            if fnct in self.fallbacks and self.accept is not None and not _retryable(call.response) and not self.accept(call.response):
+                # součást jednoho (sloučeného) volání, souběžní čekající dostanou až výsledek zálohy
+                call.response = self._execute(fnct, dict(data, **self.fallbacks[fnct]), priority, self.retries)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.inflight_lock:
+                self.inflight.pop(key, None)
+            call.done.set()
+        return call.response
+
+    def _execute(self, fnct, data, priority, retries):
+        stats = {'calls': 1, PRIORITY_NAMES.get(priority, 'background'): 1}
+        started = time.time()
+        response = None
+        try:
+            for attempt in range(retries + 1):
+                self._acquire(priority)
+                if attempt == 0:
+                    stats['queued_ms'] = int((time.time() - started) * 1000)
+                error = None
+                try:
+                    response = self.send(fnct, data)
+                except self.fatal as e:
+                    stats['errors'] = stats.get('errors', 0) + 1
+                    self._report(None, e)
+                    raise
+                except Exception as e:
+                    error = e
+                    response = None
+                finally:
+                    self._release()
+                if error is None and not _retryable(response):
+                    self._report(response, None)
+                    return response
+                if response is not None and response.status_code == 429:
+                    stats['throttled'] = stats.get('throttled', 0) + 1
+                else:
+                    stats['errors'] = stats.get('errors', 0) + 1
+                if attempt == retries:
+                    self._report(response, error)
+                    if error is not None:
+                        raise error
+                    return response
+                stats['retries'] = stats.get('retries', 0) + 1
+                delay = self._backoff(attempt, response)
+                xbmc.log(f'WebshareCinema: API {fnct} failed ({error or response.status_code}), retry in {delay:.1f}s', level=xbmc.LOGWARNING)
+                time.sleep(delay)
+        finally:
+            stats['total_ms'] = int((time.time() - started) * 1000)
+            self.stats.record(stats)
+        return response
+
+    def _report(self, response, error):
+        if self.breaker is None or isinstance(error, circuit_breaker.BreakerOpen):
+            return
+        if error is not None or response.status_code >= 500:
+            self.breaker.failure()
+        elif response.status_code != 429:
+            # 429 znamená, že server odpovídá, jen nás brzdí - jistič se jím neřídí
+            self.breaker.success()
+
+    def _backoff(self, attempt, response):
+        delay = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt))
+        if response is not None:
+            try:
+                delay = max(delay, float(response.headers.get('Retry-After')))
+            except (TypeError, ValueError):
+                pass
+        # jitter, aby se souběžné pokusy znovu nesešly ve stejnou chvíli
+        return min(BACKOFF_MAX, delay * random.uniform(0.5, 1.5))
+
+class Stats:
+    """Počítadla plánovače.
+
+    Během spuštění doplňku se počítá jen v paměti; flush() je na konci spuštění jednou přičte
+    do společného souboru (pod zámkem, takže se souběžná spuštění nepřepisují).
+    """
+
+    def __init__(self, path=None):
+        self.counts = {}
+        self.lock = threading.Lock()
+        self.path = path
+
+    def record(self, delta):
+        with self.lock:
+            for name, value in delta.items():
+                self.counts[name] = self.counts.get(name, 0) + value
+
+    def flush(self):
+        with self.lock:
+            counts, self.counts = self.counts, {}
+        if self.path is None or not counts:
+            return
+        lock_path = self.path + '.lock'
+        if not file_lock.acquire(lock_path, timeout=2):
+            xbmc.log('WebshareCinema: API stats locked, dropping this run', level=xbmc.LOGDEBUG)
+            return
+        try:
+            total = _load(self.path)
+            for name, value in counts.items():
+                total[name] = total.get(name, 0) + value
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w') as file:
+                file.write(json.dumps(total))
+            os.replace(tmp, self.path)
+        except OSError as e:
+            xbmc.log(f'WebshareCinema: Cannot write API stats: {str(e)}', level=xbmc.LOGDEBUG)
+        finally:
+            file_lock.release(lock_path)
+
+def _load(path):
+    try:
+        with open(path) as file:
+            return json.loads(file.read())
+    except (OSError, ValueError):
+        return {}
+
+def stats(path):
+    """Součet počítadel všech dokončených spuštění doplňku od startu Kodi (nebo posledního vynulování)"""
+    return _load(path)
+
+def reset_stats(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
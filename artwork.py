@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+# Module: artwork
+# Author: user extension
+# Created on: 19.10.2026
+# License: AGPL v.3 https://www.gnu.org/licenses/agpl-3.0.html
+
+import os
+import hashlib
+import requests
+import xbmc
+import circuit_breaker
+from concurrent.futures import ThreadPoolExecutor
+try:
+    from urllib.parse import urlparse
+except ImportError:
+    from urlparse import urlparse
+
+THUMBS_DIR = 'thumbs'
+TMDB_IMAGE_URL = 'https://image.tmdb.org/t/p/'
+# velikost obrázku TMDb podle místa, kde se zobrazí
+SIZES = {
+    'list': 'w185',
+    'detail': 'w500',
+    'fanart': 'w780'
+}
+PREFETCH_WORKERS = 4
+FETCH_TIMEOUT = (3, 10)
+MB = 1024 * 1024
+
+def tmdb_url(path, view='list'):
+    """URL obrázku TMDb ve velikosti vhodné pro daný pohled"""
+    if not path:
+        return None
+    return TMDB_IMAGE_URL + SIZES.get(view, SIZES['list']) + path
+
+class ArtworkCache:
+    """Lokální cache náhledů v profilu s LRU vyřazováním podle diskového limitu.
+
+    Při budget == 0 je vypnutá: resolve() vrací původní URL a prefetch() nic nedělá.
+    """
+
+    def __init__(self, profile, budget_mb):
+        self.dir = os.path.join(profile, THUMBS_DIR)
+        self.budget = max(0, budget_mb) * MB
+        self.enabled = self.budget > 0
+        if self.enabled and not os.path.isdir(self.dir):
+            try:
+                os.makedirs(self.dir)
+            except OSError as e:
+                xbmc.log(f'WebshareCinema: Cannot create thumbnail cache: {str(e)}', level=xbmc.LOGERROR)
+                self.enabled = False
+
+    def path(self, url):
+        ext = os.path.splitext(url.split('?')[0])[1].lower()
+        if ext not in ('.jpg', '.jpeg', '.png', '.webp'):
+            ext = '.jpg'
+        return os.path.join(self.dir, hashlib.md5(url.encode('utf8')).hexdigest() + ext)
+
+    def resolve(self, url):
+        """Lokální cesta, pokud je obrázek v cache (a označí ho jako použitý), jinak původní URL"""
+        if not self.enabled or not url:
+            return url
+        path = self.path(url)
+        try:
+            os.utime(path, None)
+            return path
+        except OSError:
+            return url
+
+    def prefetch(self, urls, monitor=None):
+        """Stáhne obrázky, které ještě nejsou v cache, a pak pročistí cache na limit"""
+        if not self.enabled:
+            return
+        missing = [url for url in dict.fromkeys(u for u in urls if u) if not os.path.exists(self.path(url))]
+        if missing:
+            session = requests.Session()
+            def fetch(url):
+                if monitor is not None and monitor.abortRequested():
+                    return
+                path = self.path(url)
+                tmp = path + '.part'
+                breaker = circuit_breaker.Breaker(urlparse(url).netloc)
+                try:
+                    response = breaker.call(session.get, url, timeout=FETCH_TIMEOUT)
+                    if response.status_code != 200 or not response.content:
+                        return
+                    with open(tmp, 'wb') as file:
+                        file.write(response.content)
+                    os.replace(tmp, path)
+                except Exception as e:
+                    xbmc.log(f'WebshareCinema: Thumbnail prefetch failed for {url}: {str(e)}', level=xbmc.LOGDEBUG)
+                    if os.path.exists(tmp):
+                        os.unlink(tmp)
+            with ThreadPoolExecutor(max_workers=PREFETCH_WORKERS) as executor:
+                list(executor.map(fetch, missing))
+        self.evict()
+
+    def evict(self):
+        """Smaže nejdéle nepoužité obrázky, dokud cache nepřesahuje limit"""
+        if not self.enabled:
+            return
+        entries = []
+        total = 0
+        for entry in os.scandir(self.dir):
+            if not entry.is_file():
+                continue
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+        if total <= self.budget:
+            return
+        entries.sort()
+        for mtime, size, path in entries:
+            try:
+                os.unlink(path)
+                total -= size
+            except OSError:
+                pass
+            if total <= self.budget:
+                break
+
+def from_settings(addon, profile):
+    """ArtworkCache podle nastavení 'artwork_budget' (MB, 0 = vypnuto)"""
+    try:
+        budget = int(addon.getSetting('artwork_budget') or 0)
+    except ValueError:
+        budget = 0
+    return ArtworkCache(profile, budget)
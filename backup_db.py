@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+# Module: backup_db
+# Author: user extension
+# Created on: 19.10.2026
+# License: AGPL v.3 https://www.gnu.org/licenses/agpl-3.0.html
+
+import io
+import os
+import json
+import time
+import uuid
+import shutil
+import sqlite3
+import zipfile
+import xbmc
+import downloader
+import utils
+
+DB_META = 'db_meta'
+LEGACY_DIR = 'db'      # adresář, do kterého se archiv rozbaloval dříve
+SEARCH_LIMIT = 100
+
+# váhy pro řazení výsledků: (pole, přesná shoda)
+TITLE, PLOT = 0, 1
+WEIGHTS = {(TITLE, True): 10, (TITLE, False): 6, (PLOT, True): 3, (PLOT, False): 1}
+
+class BackupDB:
+    """Správa lokální kopie Backup DB: stažení, podmíněná aktualizace, SQLite index a atomická výměna"""
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.meta_path = os.path.join(profile, DB_META)
+
+    def meta(self):
+        try:
+            with io.open(self.meta_path, 'r', encoding='utf8') as file:
+                fdata = file.read()
+                file.close()
+                try:
+                    return json.loads(fdata, "utf-8")
+                except TypeError:
+                    return json.loads(fdata)
+        except Exception:
+            return {}
+
+    def save_meta(self, meta):
+        # zápis přes dočasný soubor + os.replace, aby se metadata nikdy nepoškodila
+        tmp = self.meta_path + '.tmp'
+        with io.open(tmp, 'w', encoding='utf8') as file:
+            try:
+                data = json.dumps(meta).decode('utf8')
+            except AttributeError:
+                data = json.dumps(meta)
+            file.write(data)
+            file.close()
+        os.replace(tmp, self.meta_path)
+
+    def index_path(self):
+        """Cesta k SQLite indexu aktuální verze databáze nebo None, pokud není nainstalována"""
+        meta = self.meta()
+        if meta.get('index'):
+            path = os.path.join(self.profile, meta['index'])
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def legacy_dir(self):
+        """Adresář s rozbalenými JSON soubory ze starších verzí doplňku"""
+        meta = self.meta()
+        for name in [meta.get('dir'), LEGACY_DIR]:
+            if name and os.path.isdir(os.path.join(self.profile, name)):
+                return os.path.join(self.profile, name)
+        return None
+
+    def is_installed(self):
+        return self.index_path() is not None
+
+    def migrate(self):
+        """Převede dříve rozbalenou databázi na index a JSON soubory smaže"""
+        dbdir = self.legacy_dir()
+        if dbdir is None or self.is_installed():
+            return
+        def sources():
+            for name in os.listdir(dbdir):
+                path = os.path.join(dbdir, name)
+                if os.path.isfile(path):
+                    with io.open(path, 'rb') as file:
+                        yield name, file.read()
+        try:
+            self._activate(sources(), {})
+            shutil.rmtree(dbdir, ignore_errors=True)
+        except Exception as e:
+            xbmc.log(f'WebshareCinema: Backup DB migration failed: {str(e)}', level=xbmc.LOGERROR)
+
+    def needs_check(self, days):
+        if days <= 0:
+            return False
+        return time.time() - self.meta().get('checked', 0) > days * 86400
+
+    def mark_checked(self):
+        meta = self.meta()
+        meta['checked'] = int(time.time())
+        self.save_meta(meta)
+
+    def changed(self, remote):
+        """Porovná velikost (a hash, pokud ho API vrátí) s nainstalovanou verzí"""
+        meta = self.meta()
+        if not self.is_installed() or not meta.get('size'):
+            return True
+        if remote.get('hash') and meta.get('hash') and remote['hash'] != meta['hash']:
+            return True
+        return str(remote.get('size')) != str(meta.get('size'))
+
+    def install(self, response, remote, link, progress=None):
+        """Stáhne archiv po částech a postaví z něj nový index přímo ze zipu.
+
+        Dokud se přepnutí (os.replace metadat) nedokončí, procházení používá starou verzi.
+        """
+        part = os.path.join(self.profile, 'db.zip.part')
+        try:
+            total = response.headers.get('content-length')
+            with io.open(part, 'wb') as bf:
+                downloader.pipe(response, bf, int(total) if total else None, progress)
+            with zipfile.ZipFile(part, 'r') as zf:
+                def sources():
+                    for info in zf.infolist():
+                        if not info.filename.endswith('/'):
+                            yield os.path.basename(info.filename), zf.read(info)
+                version = self._activate(sources(), {
+                    'ident': remote.get('ident'),
+                    'size': remote.get('size'),
+                    'hash': remote.get('hash'),
+                    'link': link
+                })
+        finally:
+            if os.path.exists(part):
+                os.unlink(part)
+        xbmc.log(f'WebshareCinema: Backup DB updated to {version} ({remote.get("size")} B)', level=xbmc.LOGINFO)
+        return version
+
+    def _activate(self, sources, fields):
+        """Postaví index do dočasného souboru, přejmenuje ho a přepne na něj metadata"""
+        version = uuid.uuid4().hex[:8]
+        name = 'db_' + version + '.sqlite'
+        path = os.path.join(self.profile, name)
+        tmp = path + '.tmp'
+        try:
+            build_index(tmp, sources)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+
+        old = self.index_path()
+        meta = self.meta()
+        meta.pop('dir', None)
+        meta.update(fields)
+        meta.update({
+            'index': name,
+            'version': version,
+            'installed': int(time.time()),
+            'checked': int(time.time())
+        })
+        self.save_meta(meta)
+        if old and os.path.abspath(old) != os.path.abspath(path):
+            try:
+                os.unlink(old)
+            except OSError:
+                pass
+        return version
+
+    def _connect(self):
+        path = self.index_path()
+        if path is None:
+            return None
+        return sqlite3.connect(path)
+
+    def files(self):
+        conn = self._connect()
+        if conn is None:
+            return []
+        try:
+            return [row[0] for row in conn.execute('SELECT name FROM files ORDER BY name')]
+        finally:
+            conn.close()
+
+    def titles(self, file):
+        """Seznam (id, title, plot) pro jeden soubor databáze"""
+        conn = self._connect()
+        if conn is None:
+            return []
+        try:
+            return conn.execute('SELECT id, title, plot FROM titles WHERE file = ? ORDER BY pos', (file,)).fetchall()
+        finally:
+            conn.close()
+
+    def item(self, file, key):
+        """Jedna položka včetně streamů, vyhledaná přímo přes primární klíč"""
+        conn = self._connect()
+        if conn is None:
+            return None
+        try:
+            row = conn.execute('SELECT id, title, plot, streams FROM titles WHERE file = ? AND id = ?', (file, key)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        return {'id': row[0], 'title': row[1], 'plot': row[2], 'streams': json.loads(row[3])}
+
+    def ensure_search_index(self):
+        """Doplní invertovaný index do indexů postavených dřívější verzí doplňku"""
+        conn = self._connect()
+        if conn is None:
+            return
+        try:
+            if not conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'postings'").fetchone():
+                build_postings(conn)
+                conn.commit()
+        finally:
+            conn.close()
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """Fulltextové hledání v názvech a popisech, bez diakritiky a s prefixovou shodou.
+
+        Vrací seznam dictů (file, id, title, plot) seřazený podle kvality shody.
+        """
+        tokens = list(dict.fromkeys(utils.tokenize(query)))
+        conn = self._connect()
+        if conn is None or not tokens:
+            return []
+        try:
+            scores = None
+            for token in tokens:
+                upper = token[:-1] + chr(ord(token[-1]) + 1)
+                matches = {}
+                for tid, field, exact in conn.execute(
+                        'SELECT tid, field, token = ? FROM postings WHERE token >= ? AND token < ?', (token, token, upper)):
+                    weight = WEIGHTS[(field, bool(exact))]
+                    if weight > matches.get(tid, 0):
+                        matches[tid] = weight
+                # všechna slova dotazu musí odpovídat (AND)
+                if scores is None:
+                    scores = matches
+                else:
+                    scores = {tid: score + matches[tid] for tid, score in scores.items() if tid in matches}
+                if not scores:
+                    return []
+            best = sorted(scores.items(), key=lambda x: -x[1])[:limit * 2]
+            rows = {}
+            tids = [tid for tid, _ in best]
+            for i in range(0, len(tids), 500):
+                chunk = tids[i:i + 500]
+                for row in conn.execute('SELECT rowid, file, id, title, plot FROM titles WHERE rowid IN (%s)' % ','.join('?' * len(chunk)), chunk):
+                    rows[row[0]] = row
+            results = []
+            phrase = ' '.join(tokens)
+            for tid, score in best:
+                row = rows.get(tid)
+                if row is not None:
+                    # bonus za celou frázi v názvu
+                    if phrase in ' '.join(utils.tokenize(row[3])):
+                        score += 5
+                    results.append({'file': row[1], 'id': row[2], 'title': row[3], 'plot': row[4], 'score': score})
+            results.sort(key=lambda x: (-x['score'], len(x['title'] or '')))
+            return results[:limit]
+        finally:
+            conn.close()
+
+def build_index(path, sources):
+    """Vytvoří SQLite index ze zdrojů (název souboru, JSON obsah)"""
+    if os.path.exists(path):
+        os.unlink(path)
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute('CREATE TABLE files (name TEXT PRIMARY KEY)')
+        conn.execute('CREATE TABLE titles (file TEXT, id TEXT, pos INTEGER, title TEXT, plot TEXT, streams TEXT, PRIMARY KEY (file, id))')
+        for name, content in sources:
+            try:
+                data = json.loads(content.decode('utf8'))['data']
+            except Exception as e:
+                xbmc.log(f'WebshareCinema: Backup DB skipping {name}: {str(e)}', level=xbmc.LOGWARNING)
+                continue
+            conn.execute('INSERT OR REPLACE INTO files (name) VALUES (?)', (name,))
+            conn.executemany(
+                'INSERT OR REPLACE INTO titles (file, id, pos, title, plot, streams) VALUES (?, ?, ?, ?, ?, ?)',
+                ((name, str(item['id']), pos, item.get('title', ''), item.get('plot'), json.dumps(item.get('streams', [])))
+                 for pos, item in enumerate(data))
+            )
+        build_postings(conn)
+        conn.commit()
+    finally:
+        conn.close()
+
+def build_postings(conn):
+    """Invertovaný index token -> titul, zvlášť pro název a popis"""
+    conn.execute('DROP TABLE IF EXISTS postings')
+    conn.execute('CREATE TABLE postings (token TEXT, tid INTEGER, field INTEGER, PRIMARY KEY (token, tid, field)) WITHOUT ROWID')
+    def rows():
+        for tid, title, plot in conn.execute('SELECT rowid, title, plot FROM titles').fetchall():
+            for token in set(utils.tokenize(title)):
+                yield token, tid, TITLE
+            for token in set(utils.tokenize(plot, 3)):
+                yield token, tid, PLOT
+    conn.executemany('INSERT OR IGNORE INTO postings (token, tid, field) VALUES (?, ?, ?)', rows())
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+# Module: catalog
+# Author: user extension
+# Created on: 19.10.2026
+# License: AGPL v.3 https://www.gnu.org/licenses/agpl-3.0.html
+
+import os
+import time
+import sqlite3
+import xbmc
+import utils
+
+CATALOG_FILE = 'catalog.sqlite'
+
+_fts5 = None
+
+def has_fts5():
+    """Ne každé sestavení Kodi má SQLite s FTS5 - jinak se hledá přes LIKE"""
+    global _fts5
+    if _fts5 is None:
+        try:
+            conn = sqlite3.connect(':memory:')
+            conn.execute('CREATE VIRTUAL TABLE t USING fts5(x)')
+            conn.close()
+            _fts5 = True
+        except sqlite3.Error:
+            _fts5 = False
+    return _fts5
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+class Catalog:
+    """Lokální katalog všech souborových záznamů, které doplněk kdy viděl v odpovědích API"""
+
+    def __init__(self, profile):
+        self.path = os.path.join(profile, CATALOG_FILE)
+        self.conn = None
+        try:
+            if not os.path.exists(profile):
+                os.makedirs(profile)
+            self.conn = sqlite3.connect(self.path, timeout=10)
+            self._create()
+        except Exception as e:
+            xbmc.log(f'WebshareCinema: Error opening catalog: {str(e)}', level=xbmc.LOGERROR)
+            self.conn = None
+
+    def _create(self):
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS files (
+            ident TEXT PRIMARY KEY,
+            name TEXT,
+            norm TEXT,
+            size INTEGER,
+            type TEXT,
+            positive_votes INTEGER,
+            negative_votes INTEGER,
+            img TEXT,
+            first_seen INTEGER,
+            last_seen INTEGER)''')
+        if has_fts5():
+            self.conn.execute('CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(norm)')
+        self.conn.commit()
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def upsert(self, items):
+        """Uloží/aktualizuje záznamy (dicty z todict) v jedné transakci"""
+        if self.conn is None or not items:
+            return
+        now = int(time.time())
+        fts = has_fts5()
+        try:
+            for item in items:
+                if not item.get('ident') or not item.get('name'):
+                    continue
+                norm = ' '.join(utils.tokenize(item['name']))
+                row = self.conn.execute('SELECT rowid, norm FROM files WHERE ident = ?', (item['ident'],)).fetchone()
+                values = (item['name'], norm, _int(item.get('size')), item.get('type'),
+                          _int(item.get('positive_votes')), _int(item.get('negative_votes')), item.get('img'))
+                if row is None:
+                    cursor = self.conn.execute(
+                        'INSERT INTO files (name, norm, size, type, positive_votes, negative_votes, img, ident, first_seen, last_seen) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        values + (item['ident'], now, now))
+                    if fts:
+                        self.conn.execute('INSERT INTO files_fts (rowid, norm) VALUES (?, ?)', (cursor.lastrowid, norm))
+                else:
+                    self.conn.execute(
+                        'UPDATE files SET name = ?, norm = ?, size = COALESCE(?, size), type = COALESCE(?, type), '
+                        'positive_votes = COALESCE(?, positive_votes), negative_votes = COALESCE(?, negative_votes), '
+                        'img = COALESCE(?, img), last_seen = ? WHERE ident = ?',
+                        values + (now, item['ident']))
+                    if fts and row[1] != norm:
+                        self.conn.execute('DELETE FROM files_fts WHERE rowid = ?', (row[0],))
+                        self.conn.execute('INSERT INTO files_fts (rowid, norm) VALUES (?, ?)', (row[0], norm))
+            self.conn.commit()
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            xbmc.log(f'WebshareCinema: Error updating catalog: {str(e)}', level=xbmc.LOGERROR)
+
+    def get(self, idents):
+        """Záznamy pro dané identy jako dict ident -> záznam"""
+        if self.conn is None or not idents:
+            return {}
+        result = {}
+        idents = list(idents)
+        for i in range(0, len(idents), 500):
+            chunk = idents[i:i + 500]
+            cursor = self.conn.execute(
+                'SELECT ident, name, size, type, positive_votes, negative_votes, img FROM files WHERE ident IN (%s)' % ','.join('?' * len(chunk)), chunk)
+            for row in cursor:
+                result[row[0]] = self._todict(row)
+        return result
+
+    def search(self, query, limit=50):
+        """Hledání podle názvu; každé slovo dotazu se bere jako prefix"""
+        tokens = utils.tokenize(query)
+        if self.conn is None or not tokens:
+            return []
+        columns = 'f.ident, f.name, f.size, f.type, f.positive_votes, f.negative_votes, f.img'
+        try:
+            if has_fts5():
+                match = ' '.join('"' + t + '"*' for t in tokens)
+                cursor = self.conn.execute(
+                    'SELECT ' + columns + ' FROM files_fts JOIN files f ON f.rowid = files_fts.rowid '
+                    'WHERE files_fts MATCH ? ORDER BY files_fts.rank, f.last_seen DESC LIMIT ?', (match, limit))
+            else:
+                where = ' AND '.join(["(' ' || f.norm) LIKE ?"] * len(tokens))
+                cursor = self.conn.execute(
+                    'SELECT ' + columns + ' FROM files f WHERE ' + where + ' ORDER BY f.last_seen DESC LIMIT ?',
+                    ['% ' + t + '%' for t in tokens] + [limit])
+            return [self._todict(row) for row in cursor]
+        except sqlite3.Error as e:
+            xbmc.log(f'WebshareCinema: Catalog search failed: {str(e)}', level=xbmc.LOGERROR)
+            return []
+
+    def _todict(self, row):
+        item = {'ident': row[0], 'name': row[1]}
+        for key, value in zip(['size', 'type', 'positive_votes', 'negative_votes', 'img'], row[2:]):
+            if value is not None:
+                item[key] = value if isinstance(value, str) else str(value)
+        return item
+
+def remember(profile, items):
+    """Zkratka: otevře katalog, uloží záznamy a zavře ho"""
+    catalog = Catalog(profile)
+    try:
+        catalog.upsert(items)
+    finally:
+        catalog.close()
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# Module: circuit_breaker
+# Author: user extension
+# Created on: 19.10.2026
+# License: AGPL v.3 https://www.gnu.org/licenses/agpl-3.0.html
+
+import json
+import time
+import threading
+import xbmc
+import xbmcgui
+
+PROPERTY_PREFIX = 'plugin.video.wsc.breaker.'
+FAILURE_THRESHOLD = 3       # po kolika chybách v řadě se okruh rozpojí
+COOLDOWN = 60               # sekundy, po které volání rovnou selhávají
+
+_lock = threading.Lock()
+
+class BreakerOpen(Exception):
+    """Služba je po opakovaných chybách dočasně považována za nedostupnou"""
+
+class Breaker:
+    """Jistič pro jeden server.
+
+    Stav je ve vlastnosti okna Kodi, takže ho sdílí všechna spuštění doplňku.
+    Po FAILURE_THRESHOLD chybách v řadě volání po dobu COOLDOWN rovnou selhávají,
+    potom se pustí jeden zkušební požadavek - úspěch jistič zavře, chyba ho rozpojí znovu.
+    """
+
+    def __init__(self, host, threshold=FAILURE_THRESHOLD, cooldown=COOLDOWN):
+        self.host = host
+        self.property = PROPERTY_PREFIX + host
+        self.threshold = threshold
+        self.cooldown = cooldown
+
+    def _state(self):
+        try:
+            return json.loads(xbmcgui.Window(10000).getProperty(self.property) or '{}')
+        except ValueError:
+            return {}
+
+    def _save(self, state):
+        if state:
+            xbmcgui.Window(10000).setProperty(self.property, json.dumps(state))
+        else:
+            xbmcgui.Window(10000).clearProperty(self.property)
+
+    def is_open(self):
+        state = self._state()
+        return state.get('failures', 0) >= self.threshold and time.time() - state.get('opened', 0) < self.cooldown
+
+    def check(self):
+        """Vyhodí BreakerOpen, pokud se na server teď nemá volat"""
+        with _lock:
+            state = self._state()
+            if state.get('failures', 0) < self.threshold:
+                return
+            if time.time() - state.get('opened', 0) < self.cooldown:
+                raise BreakerOpen(self.host)
+            # zkušební požadavek; ostatní čekají na jeho výsledek další cooldown
+            state['opened'] = time.time()
+            self._save(state)
+
+    def success(self):
+        with _lock:
+            if self._state():
+                self._save({})
+
+    def failure(self):
+        with _lock:
+            state = self._state()
+            state['failures'] = state.get('failures', 0) + 1
+            if state['failures'] >= self.threshold:
+                if state['failures'] == self.threshold:
+                    xbmc.log(f'WebshareCinema: {self.host} unavailable, failing fast for {self.cooldown}s', level=xbmc.LOGWARNING)
+                state['opened'] = time.time()
+            self._save(state)
+
+    def call(self, fn, *args, **kwargs):
+        """Zavolá fn přes jistič; výjimky fn se počítají jako chyba serveru"""
+        self.check()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self.failure()
+            raise
+        self.success()
+        return result
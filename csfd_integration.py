@@ -3,68 +3,241 @@
 Jednoduchý scraper na CSFD.cz pro Kodi plugin.
 Vyhledává film/seriál podle názvu, vrací základní informace a plakát.
 Nevyžaduje žádné speciální knihovny (jen requests a re).
+
+Výsledky se ukládají do perzistentní cache podle normalizovaného názvu,
+hromadné dotazy (csfd_lookup_many) jsou omezené na několik požadavků za sekundu.
 """
-import requests
+import os
 import re
+import json
+import time
+import sqlite3
+import requests
+import xbmc
+from html import unescape
+from concurrent.futures import ThreadPoolExecutor
 from unidecode import unidecode
+import utils
+import circuit_breaker
+from rate_limiter import RateLimiter
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Kodi plugin, https://github.com/mchlup/plugin.video.webshare-cinema)"
 }
+BASE_URL = "https://www.csfd.cz"
+
+CACHE_FILE = 'csfd.sqlite'
+CSFD_TTL = 14 * 86400           # platnost nalezených údajů
+CSFD_MISSING_TTL = 3 * 86400    # jak dlouho si pamatujeme, že titul na ČSFD není
+REQUESTS_PER_SECOND = 2.0
+LOOKUP_WORKERS = 2
+CSFD_TIMEOUT = (3, 5)           # (spojení, čtení)
+
+_breaker = circuit_breaker.Breaker('csfd')
+
+# Vzory jsou zkompilované jednou a pouští se jen na výřez stránky, kde hledaný údaj je
+DETAIL_LINK = re.compile(r'href="(/film/\d+[^"#?]*)"')
+TITLE = re.compile(r'<title>([^|<]*)')
+YEAR = re.compile(r'\((\d{4})\)|(\d{4})')
+RATING = re.compile(r'>\s*(\d+(?:[,.]\d+)?)\s*%')
+VOTES = re.compile(r'([\d\s\xa0]+?)\s*hodnocen[íi]')
+POSTER = re.compile(r'<img[^>]*\ssrc="([^"]+)"')
+TAGS = re.compile(r'<[^>]+>')
+SPACES = re.compile(r'\s+')
+
+# (značka začátku výřezu, délka výřezu)
+SEARCH_SECTIONS = {'movie': 'main-movies', 'series': 'main-series'}
+RATING_SECTION = ('film-rating-average', 300)
+VOTES_SECTION = ('ratings-btn', 1500)
+POSTER_SECTION = ('film-posters', 1500)
+DESCRIPTION_MARKERS = ['plot-full', 'film-content__description', 'plot-preview']
+
+def _section(text, marker, length=None):
+    """Výřez textu od značky (a případně dané délky); prázdný řetězec, pokud značka chybí"""
+    start = text.find(marker)
+    if start == -1:
+        return ''
+    return text[start:start + length] if length else text[start:]
+
+def _description(text):
+    for marker in DESCRIPTION_MARKERS:
+        section = _section(text, marker)
+        if not section:
+            continue
+        # obsah končí prvním uzavřeným odstavcem nebo divem - bez DOTALL regexu přes celou stránku
+        start = section.find('>') + 1
+        end = len(section)
+        for tag in ('</p>', '</div>'):
+            pos = section.find(tag, start)
+            if pos != -1:
+                end = min(end, pos)
+        desc = SPACES.sub(' ', unescape(TAGS.sub('', section[start:end]))).strip()
+        if desc:
+            return desc
+    return ""
+
+def parse_detail(html, title=''):
+    """Vytáhne údaje z detailu filmu/seriálu"""
+    head = html[:html.find('</head>')] if '</head>' in html else html[:5000]
+    m = TITLE.search(head)
+    title_csfd = unescape(m.group(1)).strip() if m else title
+
+    m = YEAR.search(title_csfd)
+    year = (m.group(1) or m.group(2)) if m else ""
+
+    m = RATING.search(_section(html, *RATING_SECTION))
+    rating = m.group(1).replace(",", ".") if m else ""
+
+    m = VOTES.search(unescape(_section(html, *VOTES_SECTION)))
+    votes = re.sub(r'\D', '', m.group(1)) if m else ""
+
+    m = POSTER.search(_section(html, *POSTER_SECTION))
+    poster = m.group(1) if m else ""
+    if poster.startswith('//'):
+        poster = 'https:' + poster
+
+    return {
+        "title": title_csfd,
+        "year": year,
+        "rating": rating,
+        "votes": votes,
+        "poster": poster,
+        "desc": _description(html)
+    }
+
+def _fetch(session, title, mode='movie', limiter=None):
+    """Vyhledá titul a načte jeho detail; None = nenalezeno, síťové chyby propadají volajícímu"""
+    if limiter is not None:
+        limiter.consume(1)
+    resp = _breaker.call(session.get, BASE_URL + "/hledat/?q=" + requests.utils.quote(unidecode(title)), headers=HEADERS, timeout=CSFD_TIMEOUT)
+    resp.raise_for_status()
+    # odkaz hledáme nejdřív v sekci výsledků pro daný druh (filmy/seriály)
+    m = DETAIL_LINK.search(_section(resp.text, SEARCH_SECTIONS.get(mode, ''))) or DETAIL_LINK.search(resp.text)
+    if not m:
+        return None
+    detail_url = BASE_URL + m.group(1)
+    if limiter is not None:
+        limiter.consume(1)
+    resp = _breaker.call(session.get, detail_url, headers=HEADERS, timeout=CSFD_TIMEOUT)
+    resp.raise_for_status()
+    result = parse_detail(resp.text, title)
+    result["url"] = detail_url
+    return result
 
 def csfd_search(title, mode='movie'):
     """
-    Hledá film/seriál na CSFD.cz, vrací dict: title, year, rating, votes, poster, url
+    Hledá film/seriál na CSFD.cz, vrací dict: title, year, rating, votes, poster, desc, url
     """
     try:
-        # Normalizace hledaného názvu
-        search_term = unidecode(title)
-        resp = requests.get(
-            "https://www.csfd.cz/hledat/?q=" + requests.utils.quote(search_term),
-            headers=HEADERS,
-            timeout=5
-        )
-        if not resp.ok:
-            return {}
-        # Najdi první detail (odkaz na /film/ nebo /serial/)
-        m = re.search(r'/([fs]erial|film)/(\d+)[^"]*"', resp.text)
-        if not m:
-            return {}
-        detail_url = "https://www.csfd.cz" + m.group(0).strip('"')
-        resp2 = requests.get(detail_url, headers=HEADERS, timeout=5)
-        if not resp2.ok:
-            return {}
-
-        # Titulek
-        m_title = re.search(r'<title>(.*?)\|', resp2.text)
-        title_csfd = m_title.group(1).strip() if m_title else title
-
-        # Rok
-        m_year = re.search(r'(\d{4})', title_csfd)
-        year = m_year.group(1) if m_year else ""
-
-        # Hodnocení a počet hlasů
-        m_rating = re.search(r'<h2.*?average.*?>([\d,]+)\s*%', resp2.text)
-        rating = m_rating.group(1).replace(",", ".") if m_rating else ""
-        m_votes = re.search(r'([0-9 ]+)\s*hodnocen[íi]', resp2.text)
-        votes = m_votes.group(1).replace(" ", "") if m_votes else ""
-
-        # Plakát
-        m_poster = re.search(r'<img class="film-posters__img.*?src="([^"]+)"', resp2.text)
-        poster = m_poster.group(1) if m_poster else ""
-
-        # Popis
-        m_desc = re.search(r'<div class="film-content__description.*?>(.*?)</div>', resp2.text, re.DOTALL)
-        desc = re.sub('<.*?>', '', m_desc.group(1).strip()) if m_desc else ""
-
-        return {
-            "title": title_csfd,
-            "year": year,
-            "rating": rating,
-            "votes": votes,
-            "poster": poster,
-            "desc": desc,
-            "url": detail_url
-        }
+        return _fetch(requests.Session(), title, mode) or {}
     except Exception as e:
         return {}
+
+def cache_key(title, mode='movie'):
+    return ' '.join(utils.tokenize(title)) + '|' + mode
+
+class CsfdCache:
+    """Perzistentní cache výsledků ČSFD podle normalizovaného názvu (včetně negativních výsledků)"""
+
+    def __init__(self, profile):
+        self.conn = None
+        try:
+            if not os.path.exists(profile):
+                os.makedirs(profile)
+            self.conn = sqlite3.connect(os.path.join(profile, CACHE_FILE), timeout=10)
+            self.conn.execute('CREATE TABLE IF NOT EXISTS csfd (key TEXT PRIMARY KEY, data TEXT, fetched INTEGER)')
+            self.conn.commit()
+        except Exception as e:
+            xbmc.log(f'WebshareCinema: Error opening CSFD cache: {str(e)}', level=xbmc.LOGERROR)
+            self.conn = None
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def get_many(self, titles, mode='movie'):
+        """název -> uložený výsledek (dict, nebo None pro nenalezený titul); neznámé názvy vynechá"""
+        if self.conn is None or not titles:
+            return {}
+        keys = {}
+        for title in titles:
+            keys.setdefault(cache_key(title, mode), []).append(title)
+        result = {}
+        now = time.time()
+        key_list = list(keys)
+        for i in range(0, len(key_list), 500):
+            chunk = key_list[i:i + 500]
+            cursor = self.conn.execute('SELECT key, data, fetched FROM csfd WHERE key IN (%s)' % ','.join('?' * len(chunk)), chunk)
+            for key, data, fetched in cursor:
+                if now - fetched >= (CSFD_MISSING_TTL if data is None else CSFD_TTL):
+                    continue
+                value = json.loads(data) if data is not None else None
+                for title in keys[key]:
+                    result[title] = value
+        return result
+
+    def put(self, title, data, mode='movie'):
+        if self.conn is None:
+            return
+        self.conn.execute('INSERT OR REPLACE INTO csfd (key, data, fetched) VALUES (?, ?, ?)',
+                          (cache_key(title, mode), json.dumps(data) if data is not None else None, int(time.time())))
+        self.conn.commit()
+
+def csfd_lookup_many(titles, profile, mode='movie', rate=REQUESTS_PER_SECOND, monitor=None):
+    """Hromadné vyhledání na ČSFD: z cache, chybějící tituly se stáhnou s omezením rychlosti.
+
+    Vrací dict název -> výsledek jen pro nalezené tituly.
+    """
+    cache = CsfdCache(profile)
+    try:
+        known = cache.get_many(titles, mode)
+        # jeden dotaz na každý normalizovaný název
+        missing = {}
+        for title in titles:
+            if title not in known:
+                missing.setdefault(cache_key(title, mode), title)
+        if missing:
+            session = requests.Session()
+            limiter = RateLimiter(rate)
+            def fetch(title):
+                if monitor is not None and monitor.abortRequested():
+                    return title, None, False
+                try:
+                    return title, _fetch(session, title, mode, limiter), True
+                except Exception as e:
+                    xbmc.log(f'WebshareCinema: CSFD lookup failed for {title}: {str(e)}', level=xbmc.LOGWARNING)
+                    return title, None, False
+            with ThreadPoolExecutor(max_workers=LOOKUP_WORKERS) as executor:
+                # zápis do SQLite jen z tohoto vlákna; výpadek se neukládá jako "nenalezeno"
+                for title, data, ok in executor.map(fetch, missing.values()):
+                    if ok:
+                        cache.put(title, data, mode)
+            known = cache.get_many(titles, mode)
+    finally:
+        cache.close()
+    return {title: data for title, data in known.items() if data}
+
+def csfd_cached(titles, profile, mode='movie'):
+    """Jen uložené výsledky, bez síťových dotazů - pro vykreslení výpisu"""
+    cache = CsfdCache(profile)
+    try:
+        return {title: data for title, data in cache.get_many(titles, mode).items() if data}
+    finally:
+        cache.close()
+
+def merge_info(info, data):
+    """Doplní do infoLabels hodnocení z ČSFD a popis/rok, pokud chybí"""
+    if not data:
+        return info
+    try:
+        info['rating'] = float(data['rating']) / 10
+        if data.get('votes'):
+            info['votes'] = data['votes']
+    except (KeyError, ValueError):
+        pass
+    if not info.get('plot') and data.get('desc'):
+        info['plot'] = data['desc']
+    if not info.get('year') and data.get('year'):
+        info['year'] = data['year']
+    return info
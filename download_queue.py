@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+# Module: download_queue
+# Author: user extension
+# Created on: 19.10.2026
+# License: AGPL v.3 https://www.gnu.org/licenses/agpl-3.0.html
+
+import io
+import os
+import json
+import time
+import uuid
+import threading
+import traceback
+import xbmc
+import file_lock
+from rate_limiter import RateLimiter
+
+QUEUE_FILE = 'download_queue'
+LOCK_FILE = 'download_queue.lock'
+RUNNER_FILE = 'download_queue.running'
+RUNNER_STALE = 60            # zámek zpracování bez heartbeatu déle než 60 s patří spadlému procesu
+RUNNER_HEARTBEAT = 10
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+class DownloadQueue:
+    """Perzistentní fronta stahování uložená v profilu doplňku"""
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.path = os.path.join(profile, QUEUE_FILE)
+        self.lock_path = os.path.join(profile, LOCK_FILE)
+        self.runner_path = os.path.join(profile, RUNNER_FILE)
+        self.local_lock = threading.RLock()
+        try:
+            if not os.path.exists(profile):
+                os.makedirs(profile)
+        except Exception as e:
+            xbmc.log(f'WebshareCinema: Error creating directories: {str(e)}', level=xbmc.LOGERROR)
+
+    def _acquire(self):
+        # Zámek mezi procesy - fronta se mění z více volání pluginu najednou
+        if not file_lock.acquire(self.lock_path):
+            raise IOError('download queue is locked')
+
+    def _release(self):
+        file_lock.release(self.lock_path)
+
+    def _load(self):
+        try:
+            with io.open(self.path, 'r', encoding='utf8') as file:
+                fdata = file.read()
+                file.close()
+                try:
+                    return json.loads(fdata, "utf-8")
+                except TypeError:
+                    return json.loads(fdata)
+        except Exception:
+            return []
+
+    def _save(self, jobs):
+        tmp = self.path + '.tmp'
+        with io.open(tmp, 'w', encoding='utf8') as file:
+            try:
+                data = json.dumps(jobs).decode('utf8')
+            except AttributeError:
+                data = json.dumps(jobs)
+            file.write(data)
+            file.close()
+        os.replace(tmp, self.path)
+
+    def _modify(self, fnct):
+        with self.local_lock:
+            self._acquire()
+            try:
+                jobs = self._load()
+                result = fnct(jobs)
+                self._save(jobs)
+                return result
+            finally:
+                self._release()
+
+    def jobs(self):
+        with self.local_lock:
+            return self._load()
+
+    def add(self, ident, name=None):
+        return self.add_many([{'ident': ident, 'name': name}])
+
+    def add_many(self, items):
+        """Přidá soubory do fronty, již čekající/běžící identy přeskočí. Vrací počet přidaných."""
+        def fnct(jobs):
+            active = set(j['ident'] for j in jobs if j['state'] in (PENDING, RUNNING))
+            added = 0
+            for item in items:
+                if item['ident'] in active:
+                    continue
+                jobs.append({
+                    'id': uuid.uuid4().hex,
+                    'ident': item['ident'],
+                    'name': item.get('name') or item['ident'],
+                    'state': PENDING,
+                    'added': int(time.time()),
+                    'done': 0,
+                    'total': 0,
+                    'error': ''
+                })
+                active.add(item['ident'])
+                added += 1
+            return added
+        return self._modify(fnct)
+
+    def claim(self):
+        """Vezme první čekající úlohu a označí ji jako běžící"""
+        def fnct(jobs):
+            for job in jobs:
+                if job['state'] == PENDING:
+                    job['state'] = RUNNING
+                    return dict(job)
+            return None
+        return self._modify(fnct)
+
+    def update(self, job_id, **fields):
+        def fnct(jobs):
+            for job in jobs:
+                if job['id'] == job_id:
+                    job.update(fields)
+        self._modify(fnct)
+
+    def remove(self, job_id):
+        def fnct(jobs):
+            jobs[:] = [j for j in jobs if j['id'] != job_id]
+        self._modify(fnct)
+
+    def retry(self, job_id):
+        self.update(job_id, state=PENDING, error='', done=0)
+
+    def clear_finished(self):
+        def fnct(jobs):
+            jobs[:] = [j for j in jobs if j['state'] not in (DONE, FAILED)]
+        self._modify(fnct)
+
+    def reset_running(self):
+        """Úlohy přerušené restartem Kodi vrátí zpět do stavu čekající"""
+        def fnct(jobs):
+            for job in jobs:
+                if job['state'] == RUNNING:
+                    job['state'] = PENDING
+        self._modify(fnct)
+
+    def has_pending(self):
+        return any(j['state'] in (PENDING, RUNNING) for j in self.jobs())
+
+    def start_runner(self):
+        """Zámek zpracování fronty; vrací False, pokud frontu už zpracovává jiné spuštění doplňku"""
+        return file_lock.acquire(self.runner_path, stale=RUNNER_STALE, timeout=0)
+
+    def stop_runner(self):
+        file_lock.release(self.runner_path)
+
+    def is_running(self):
+        try:
+            return time.time() - os.path.getmtime(self.runner_path) <= RUNNER_STALE
+        except OSError:
+            return False
+
+def run(dqueue, worker, concurrency=2, rate=0):
+    """Zpracuje frontu pomocí `concurrency` vláken.
+
+    worker(job, limiter) stáhne jeden soubor a vyhodí výjimku při chybě.
+    Vlákna končí, když ve frontě nezbývá žádná čekající úloha.
+    """
+    limiter = RateLimiter(rate) if rate > 0 else None
+    monitor = xbmc.Monitor()
+
+    def loop():
+        while not monitor.abortRequested():
+            job = dqueue.claim()
+            if job is None:
+                return
+            try:
+                worker(job, limiter)
+                dqueue.update(job['id'], state=DONE, error='')
+            except Exception as e:
+                traceback.print_exc()
+                if monitor.abortRequested():
+                    dqueue.update(job['id'], state=PENDING)
+                else:
+                    dqueue.update(job['id'], state=FAILED, error=str(e))
+
+    threads = [threading.Thread(target=loop) for _ in range(max(1, concurrency))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        while t.is_alive():
+            t.join(RUNNER_HEARTBEAT)
+            file_lock.touch(dqueue.runner_path)
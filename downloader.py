@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+# Module: downloader
+# Author: user extension
+# Created on: 19.10.2026
+# License: AGPL v.3 https://www.gnu.org/licenses/agpl-3.0.html
+
+import time
+import threading
+import xbmc
+import xbmcgui
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+READ_CHUNK = 256 * 1024          # velikost čtení ze sítě
+WRITE_CHUNK = 4 * 1024 * 1024    # zápisy do cíle (SMB/NFS) slučujeme do bloků po 4 MB
+QUEUE_DEPTH = 32                 # max. počet rozpracovaných bufferů mezi čtením a zápisem
+PROGRESS_INTERVAL = 1.0          # jak často (s) překreslit DialogProgressBG
+
+_EOF = object()
+
+class DownloadAborted(Exception):
+    pass
+
+class ThrottledProgress:
+    """DialogProgressBG, který se překresluje nejvýše jednou za `interval` sekund.
+
+    S show=False se dialog nezobrazí a průběh dostává jen on_update.
+    """
+
+    def __init__(self, heading, message, interval=PROGRESS_INTERVAL, on_update=None, show=True):
+        self.heading = heading
+        self.message = message
+        self.interval = interval
+        self.last = 0
+        self.on_update = on_update
+        self.dialog = None
+        if show:
+            self.dialog = xbmcgui.DialogProgressBG()
+            self.dialog.create(heading, message)
+
+    def update(self, done, total, force=False):
+        now = time.time()
+        if not force and now - self.last < self.interval:
+            return
+        self.last = now
+        if self.on_update is not None:
+            self.on_update(done, total)
+        if self.dialog is None:
+            return
+        if total:
+            percent = min(100, int(done * 100 / total))
+            self.dialog.update(percent, self.heading, f'{percent}% - {self.message}')
+        else:
+            self.dialog.update(0, self.heading, f'{done // (1024 * 1024)} MB - {self.message}')
+
+    def close(self):
+        if self.dialog is None:
+            return
+        try:
+            self.dialog.close()
+        except Exception:
+            pass
+
+def pipe(response, target, total=None, progress=None, limiter=None, read_chunk=READ_CHUNK, write_chunk=WRITE_CHUNK, depth=QUEUE_DEPTH):
+    """Copy a streamed requests response into target (io file or xbmcvfs.File).
+
+    A reader thread pulls the network stream into a bounded queue, a writer thread
+    coalesces the buffers into write_chunk sized writes, so slow remote writes do not
+    stall the network reads. An optional limiter (rate_limiter.RateLimiter) caps
+    the read rate. Returns the number of bytes written.
+    """
+    buffers = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    errors = []
+    state = {'written': 0}
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                buffers.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def reader():
+        try:
+            for data in response.iter_content(chunk_size=read_chunk):
+                if not data:
+                    continue
+                if limiter is not None:
+                    limiter.consume(len(data))
+                if not put(data):
+                    return
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            put(_EOF)
+
+    def flush(buf):
+        if target.write(bytes(buf)) is False:  # xbmcvfs.File.write vrací False při chybě
+            raise IOError('write failed')
+        state['written'] += len(buf)
+
+    def writer():
+        buf = bytearray()
+        try:
+            while True:
+                try:
+                    data = buffers.get(timeout=0.5)
+                except queue.Empty:
+                    if stop.is_set():
+                        return
+                    continue
+                if data is _EOF:
+                    break
+                buf += data
+                if len(buf) >= write_chunk:
+                    flush(buf)
+                    buf = bytearray()
+            if buf and not stop.is_set():
+                flush(buf)
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+
+    threads = [threading.Thread(target=reader), threading.Thread(target=writer)]
+    for t in threads:
+        t.daemon = True
+        t.start()
+
+    monitor = xbmc.Monitor()
+    try:
+        while threads[1].is_alive():
+            if monitor.waitForAbort(0.2):
+                stop.set()
+                raise DownloadAborted()
+            if progress is not None:
+                progress.update(state['written'], total)
+    finally:
+        for t in threads:
+            t.join(5)
+
+    if errors:
+        raise errors[0]
+    if stop.is_set():
+        raise DownloadAborted()
+    if progress is not None:
+        progress.update(state['written'], total, force=True)
+    return state['written']
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# Module: file_lock
+# Author: user extension
+# Created on: 19.10.2026
+# License: AGPL v.3 https://www.gnu.org/licenses/agpl-3.0.html
+
+import os
+import time
+
+LOCK_STALE = 30              # zámek starší než 30 s považujeme za opuštěný
+
+def acquire(path, stale=LOCK_STALE, timeout=10):
+    """Zámek mezi procesy: soubor vytvořený s O_EXCL.
+
+    Zámek, jehož soubor se nezměnil déle než stale sekund, se považuje za opuštěný (proces
+    spadl nebo ho Kodi ukončilo). Vrací False, pokud se zámek nepodařilo získat do timeout sekund.
+    """
+    deadline = time.time() + timeout
+    while True:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.close(fd)
+            return True
+        except OSError:
+            try:
+                if time.time() - os.path.getmtime(path) > stale:
+                    os.remove(path)
+                    continue
+            except OSError:
+                continue
+            if time.time() >= deadline:
+                return False
+            time.sleep(0.05)
+
+def touch(path):
+    """Prodlouží platnost drženého zámku (heartbeat pro dlouho běžící držitele)"""
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+def release(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+# Module: file_meta
+# Author: user extension
+# Created on: 19.10.2026
+# License: AGPL v.3 https://www.gnu.org/licenses/agpl-3.0.html
+
+import os
+import json
+import time
+import sqlite3
+import xbmc
+from xml.etree import ElementTree as ET
+
+META_FILE = 'file_meta.sqlite'
+META_TTL = 7 * 86400       # platnost uložené odpovědi file_info
+MISSING_TTL = 86400        # jak dlouho si pamatujeme, že soubor neexistuje
+MISSING = object()
+# kód odpovědi file_info pro neexistující soubor; jiné chyby (token, přetížení) se neukládají
+NOT_FOUND_CODES = ('FILE_INFO_FATAL_1',)
+
+class FileMetaStore:
+    """Perzistentní cache odpovědí file_info podle identu (včetně negativních výsledků)"""
+
+    def __init__(self, profile):
+        self.conn = None
+        try:
+            if not os.path.exists(profile):
+                os.makedirs(profile)
+            self.conn = sqlite3.connect(os.path.join(profile, META_FILE), timeout=10)
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS meta (
+                ident TEXT PRIMARY KEY,
+                xml TEXT,
+                summary TEXT,
+                fetched INTEGER)''')
+            self.conn.commit()
+        except Exception as e:
+            xbmc.log(f'WebshareCinema: Error opening file meta store: {str(e)}', level=xbmc.LOGERROR)
+            self.conn = None
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def get(self, ident):
+        """Uložené XML file_info, MISSING pro známý neexistující soubor, jinak None"""
+        if self.conn is None:
+            return None
+        row = self.conn.execute('SELECT xml, fetched FROM meta WHERE ident = ?', (ident,)).fetchone()
+        if row is None:
+            return None
+        age = time.time() - row[1]
+        if row[0] is None:
+            return MISSING if age < MISSING_TTL else None
+        if age < META_TTL:
+            return ET.fromstring(row[0])
+        return None
+
+    def put(self, ident, xml):
+        if self.conn is None:
+            return
+        self.conn.execute('INSERT OR REPLACE INTO meta (ident, xml, summary, fetched) VALUES (?, ?, ?, ?)',
+                          (ident, ET.tostring(xml, encoding='unicode'), json.dumps(summarize(xml)), int(time.time())))
+        self.conn.commit()
+
+    def put_missing(self, ident):
+        if self.conn is None:
+            return
+        self.conn.execute('INSERT OR REPLACE INTO meta (ident, xml, summary, fetched) VALUES (?, NULL, NULL, ?)',
+                          (ident, int(time.time())))
+        self.conn.commit()
+
+    def fresh(self, idents):
+        """Identy, které mají platný záznam (i negativní) a není potřeba je stahovat znovu"""
+        if self.conn is None or not idents:
+            return set()
+        result = set()
+        now = time.time()
+        idents = list(idents)
+        for i in range(0, len(idents), 500):
+            chunk = idents[i:i + 500]
+            cursor = self.conn.execute('SELECT ident, xml IS NULL, fetched FROM meta WHERE ident IN (%s)' % ','.join('?' * len(chunk)), chunk)
+            for ident, missing, fetched in cursor:
+                if now - fetched < (MISSING_TTL if missing else META_TTL):
+                    result.add(ident)
+        return result
+
+    def summaries(self, idents):
+        """Souhrny (rozlišení, kodeky, jazyky) pro dané identy bez volání API: ident -> dict"""
+        if self.conn is None or not idents:
+            return {}
+        result = {}
+        idents = list(idents)
+        for i in range(0, len(idents), 500):
+            chunk = idents[i:i + 500]
+            cursor = self.conn.execute('SELECT ident, summary FROM meta WHERE summary IS NOT NULL AND ident IN (%s)' % ','.join('?' * len(chunk)), chunk)
+            for ident, summary in cursor:
+                result[ident] = json.loads(summary)
+        return result
+
+def is_not_found(xml):
+    """Chybová odpověď file_info znamená, že soubor neexistuje (ne chybu tokenu nebo serveru).
+
+    Rozhoduje jen kód odpovědi; text zprávy Webshare lokalizuje, takže se podle něj nepozná nic.
+    """
+    code = _text(xml, 'code')
+    if code not in NOT_FOUND_CODES:
+        xbmc.log(f'WebshareCinema: file_info failed with code {code}, not cached', level=xbmc.LOGDEBUG)
+        return False
+    return True
+
+def _streams(xml, kind):
+    section = xml.find(kind)
+    if section is None:
+        return []
+    return section.findall('stream')
+
+def _text(element, tag):
+    child = element.find(tag)
+    return child.text if child is not None and child.text else None
+
+def resolution_label(width, height):
+    try:
+        width, height = int(width or 0), int(height or 0)
+    except ValueError:
+        return None
+    if not width and not height:
+        return None
+    if width >= 3200 or height >= 1800:
+        return '2160p'
+    if width >= 1800 or height >= 1000:
+        return '1080p'
+    if width >= 1200 or height >= 700:
+        return '720p'
+    return 'SD'
+
+def summarize(xml):
+    """Vytáhne z file_info to, co se hodí do výpisů"""
+    video = _streams(xml, 'video')
+    audio = _streams(xml, 'audio')
+    first = video[0] if video else xml
+    languages = []
+    for stream in audio:
+        lang = _text(stream, 'language') or _text(stream, 'lang')
+        if lang and lang.upper() not in languages:
+            languages.append(lang.upper())
+    return {
+        'width': _text(first, 'width') or _text(xml, 'width'),
+        'height': _text(first, 'height') or _text(xml, 'height'),
+        'resolution': resolution_label(_text(first, 'width') or _text(xml, 'width'), _text(first, 'height') or _text(xml, 'height')),
+        'vcodec': _text(first, 'format') if video else None,
+        'acodec': _text(audio[0], 'format') if audio else None,
+        'channels': _text(audio[0], 'channels') if audio else None,
+        'languages': languages,
+        'video_streams': len(video),
+        'audio_streams': len(audio),
+        'removed': _text(xml, 'removed') == '1'
+    }
+
+def label_suffix(summary):
+    """Krátká anotace do popisku položky, např. ' [1080p, H264, CZ/EN]'"""
+    if not summary:
+        return ''
+    parts = [p for p in [summary.get('resolution'), summary.get('vcodec')] if p]
+    if summary.get('languages'):
+        parts.append('/'.join(summary['languages']))
+    if summary.get('audio_streams', 0) > 1 and not summary.get('languages'):
+        parts.append(str(summary['audio_streams']) + 'x audio')
+    return ' [' + ', '.join(parts) + ']' if parts else ''
+
+def apply(listitem, summary):
+    """Doplní do ListItem informace o streamech (ikony rozlišení/kodeku ve skinu)"""
+    if not summary:
+        return
+    video = {}
+    if summary.get('vcodec'):
+        video['codec'] = summary['vcodec'].lower()
+    if summary.get('width') and summary.get('height'):
+        video['width'] = int(summary['width'])
+        video['height'] = int(summary['height'])
+    if video:
+        listitem.addStreamInfo('video', video)
+    if summary.get('acodec') or summary.get('languages'):
+        audio = {}
+        if summary.get('acodec'):
+            audio['codec'] = summary['acodec'].lower()
+        if summary.get('channels'):
+            try:
+                audio['channels'] = int(summary['channels'])
+            except ValueError:
+                pass
+        if summary.get('languages'):
+            audio['language'] = summary['languages'][0].lower()
+        listitem.addStreamInfo('audio', audio)
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# Module: link_cache
+# Author: user extension
+# Created on: 19.10.2026
+# License: AGPL v.3 https://www.gnu.org/licenses/agpl-3.0.html
+
+import io
+import os
+import json
+import time
+import traceback
+
+LINK_CACHE = 'link_cache'
+LINK_TTL = 3600     # jak dlouho považujeme odkaz z file_link za platný (s)
+
+class LinkCache:
+    """Předem získané odkazy na streamy (ident -> odkaz s dobou platnosti)"""
+
+    def __init__(self, profile):
+        self.path = os.path.join(profile, LINK_CACHE)
+
+    def _load(self):
+        try:
+            with io.open(self.path, 'r', encoding='utf8') as file:
+                fdata = file.read()
+                file.close()
+                try:
+                    return json.loads(fdata, "utf-8")
+                except TypeError:
+                    return json.loads(fdata)
+        except Exception:
+            return {}
+
+    def _save(self, data):
+        try:
+            tmp = self.path + '.tmp'
+            with io.open(tmp, 'w', encoding='utf8') as file:
+                try:
+                    fdata = json.dumps(data).decode('utf8')
+                except AttributeError:
+                    fdata = json.dumps(data)
+                file.write(fdata)
+                file.close()
+            os.replace(tmp, self.path)
+        except Exception:
+            traceback.print_exc()
+
+    def get(self, ident):
+        entry = self._load().get(ident)
+        if entry and entry['expires'] > time.time():
+            return entry['link']
+        return None
+
+    def put(self, ident, link, ttl=LINK_TTL):
+        now = time.time()
+        data = {k: v for k, v in self._load().items() if v['expires'] > now}
+        data[ident] = {'link': link, 'expires': now + ttl}
+        self._save(data)
+
+    def take(self, ident):
+        """Platný odkaz pro ident (nebo None); záznam se odebere, odkaz je jednorázový"""
+        data = self._load()
+        entry = data.pop(ident, None)
+        if entry is None:
+            return None
+        self._save(data)
+        if entry['expires'] > time.time():
+            return entry['link']
+        return None
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# Module: listing_cache
+# Author: user extension
+# Created on: 19.10.2026
+# License: AGPL v.3 https://www.gnu.org/licenses/agpl-3.0.html
+
+import os
+import json
+import time
+import sqlite3
+import xbmc
+from concurrent.futures import ThreadPoolExecutor, wait
+
+try:
+    from urllib import urlencode
+except ImportError:
+    from urllib.parse import urlencode
+
+CACHE_FILE = 'listings.sqlite'
+MAX_ENTRIES = 200           # kolik výpisů (hlavně stránek hledání) si pamatujeme
+FETCH_BUDGET = 4            # sekundy, déle výpis na API nečeká a zobrazí uložený snímek
+REVALIDATED_TTL = 60        # jak dlouho se snímek obnovený na pozadí zobrazí bez nového dotazu
+
+def listing_key(name, **params):
+    """Klíč výpisu: druh + parametry, které určují jeho obsah (bez tokenu)"""
+    return name + '|' + urlencode(sorted(params.items()))
+
+class ListingCache:
+    """Poslední úspěšný výsledek výpisů z API (stránky hledání)"""
+
+    def __init__(self, profile):
+        self.conn = None
+        try:
+            if not os.path.exists(profile):
+                os.makedirs(profile)
+            self.conn = sqlite3.connect(os.path.join(profile, CACHE_FILE), timeout=10)
+            self.conn.execute('CREATE TABLE IF NOT EXISTS listings (key TEXT PRIMARY KEY, data TEXT, fetched INTEGER, revalidated INTEGER)')
+            self.conn.commit()
+        except Exception as e:
+            xbmc.log(f'WebshareCinema: Error opening listing cache: {str(e)}', level=xbmc.LOGERROR)
+            self.conn = None
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def get(self, key):
+        """Uložený snímek {'data', 'fetched'}, nebo None"""
+        if self.conn is None:
+            return None
+        row = self.conn.execute('SELECT data, fetched FROM listings WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        return {'data': json.loads(row[0]), 'fetched': row[1]}
+
+    def put(self, key, data, revalidated=False):
+        if self.conn is None:
+            return
+        self.conn.execute('INSERT OR REPLACE INTO listings (key, data, fetched, revalidated) VALUES (?, ?, ?, ?)',
+                          (key, json.dumps(data), int(time.time()), 1 if revalidated else 0))
+        self.conn.execute('DELETE FROM listings WHERE key NOT IN (SELECT key FROM listings ORDER BY fetched DESC LIMIT ?)', (MAX_ENTRIES,))
+        self.conn.commit()
+
+    def take_revalidated(self, key):
+        """Data právě obnovená na pozadí (jednorázově), aby obnova výpisu nevolala API znovu"""
+        if self.conn is None:
+            return None
+        row = self.conn.execute('SELECT data, fetched FROM listings WHERE key = ? AND revalidated = 1', (key,)).fetchone()
+        if row is None:
+            return None
+        self.conn.execute('UPDATE listings SET revalidated = 0 WHERE key = ?', (key,))
+        self.conn.commit()
+        if time.time() - row[1] >= REVALIDATED_TTL:
+            return None
+        return json.loads(row[0])
+
+def start(fn):
+    """Spustí fn ve vlákně a vrátí Future; proces doplňku na dokončení počká i po vykreslení výpisu"""
+    executor = ThreadPoolExecutor(max_workers=1)
+    future = executor.submit(fn)
+    executor.shutdown(wait=False)
+    return future
+
+def load(profile, key, fetch, budget=FETCH_BUDGET):
+    """Stale-while-revalidate: čerstvá data, když fetch doběhne do budget sekund, jinak uložený snímek.
+
+    fetch() vrací data výpisu k uložení, None znamená chybovou odpověď API (neukládá se).
+    Vrací (data, snapshot, pending): snapshot je čas uloženého snímku (int), pokud se zobrazují stará
+    data, pending je nedokončený dotaz pro revalidate(). Bez snímku se na dotaz čeká a jeho výjimka
+    propadne volajícímu.
+    """
+    cache = ListingCache(profile)
+    try:
+        data = cache.take_revalidated(key)
+        if data is not None:
+            return data, None, None
+        future = start(fetch)
+        wait([future], budget)
+        if not future.done() or future.exception() is not None:
+            snapshot = cache.get(key)
+            if snapshot is not None:
+                if future.done():
+                    xbmc.log(f'WebshareCinema: Listing {key} failed, serving snapshot: {str(future.exception())}', level=xbmc.LOGWARNING)
+                return snapshot['data'], snapshot['fetched'], future
+        data = future.result()
+        if data is not None:
+            cache.put(key, data)
+        return data, None, None
+    finally:
+        cache.close()
+
+def settle(pending, showing, monitor):
+    """Dokončí nedokončený dotaz - jediný pokus na pozadí, neúspěch se už neopakuje.
+
+    Vrací výsledek dotazu, nebo None, pokud selhal, Kodi končí nebo výpis už není zobrazený.
+    """
+    try:
+        data = pending.result()
+    except Exception as e:
+        xbmc.log(f'WebshareCinema: Listing revalidation failed: {str(e)}', level=xbmc.LOGDEBUG)
+        return None
+    if monitor.abortRequested() or not showing():
+        return None
+    return data
+
+def revalidate(profile, key, pending, showing, monitor):
+    """settle() pro výpis ze snímku; vrací True, pokud se uložila nová data (volající pak výpis obnoví)"""
+    data = settle(pending, showing, monitor)
+    if data is None:
+        return False
+    cache = ListingCache(profile)
+    try:
+        cache.put(key, data, revalidated=True)
+    finally:
+        cache.close()
+    return True
@@ -43,13 +43,26 @@ ITOA64 = "./0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
 
 import hashlib
 
+# pořadí bajtů výsledného digestu ve skupinách po třech (poslední skupina je jen bajt 11)
+FINAL_GROUPS = ((0, 6, 12), (1, 7, 13), (2, 8, 14), (3, 9, 15), (4, 10, 5))
+# vzor 1000 kol se opakuje s periodou nsn(2, 3, 7)
+ROUND_PERIOD = 42
+
+# (heslo, sůl, výsledek) - referenční hodnoty z `openssl passwd -1`
+REFERENCE_VECTORS = [
+    ('cat', 'hat', '$1$hat$MeF2VXsGSCLmZs2pWYDI90'),
+    ('password', 'saltsalt', '$1$saltsalt$qjXMvbEw8oaL.CzflDtaK/'),
+    ('', 'salt', '$1$salt$UsdFqFVB.FsuinRDK5eE..'),
+    ('0123456789abcdefghijklmnopqrstuvwxyz', '12345678', '$1$12345678$3AkPbM84MQplCira/amUq0'),
+    ('heslo123', 'Ab.d/3Zx', '$1$Ab.d/3Zx$trl3beE86q/c9RTEznAYk1'),
+    (u'\u017elu\u0165ou\u010dk\u00fd', 'q7Xz', '$1$q7Xz$Rxd32vTP5pMedQGRLULWd0'),
+]
+
+def _bytes(value):
+    return value.encode('utf-8') if not isinstance(value, bytes) else value
+
 def to64 (v, n):
-    ret = ''
-    while (n - 1 >= 0):
-        n = n - 1
-        ret = ret + ITOA64[v & 0x3f]
-        v = v >> 6
-    return ret
+    return ''.join(ITOA64[(v >> (6 * i)) & 0x3f] for i in range(n))
 
 
 def apache_md5_crypt (pw, salt):
@@ -58,139 +71,68 @@ def apache_md5_crypt (pw, salt):
 
 
 def unix_md5_crypt(pw, salt, magic=None):
+    """md5crypt heslo pw se solí salt (str nebo bytes); vrací řetězec '$1$sůl$hash'
 
+    Počítá se nad bytes; 1000 kol používá předpočítané stavy md5 pro začátek 'pw[+sůl][+pw]'
+    (kopie stavu místo nového hashování) a předpočítané konce pro kola začínající digestem.
+    """
     if magic == None:
         magic = MAGIC
+    pw = _bytes(pw)
+    salt = _bytes(salt)
+    magic_bytes = _bytes(magic)
 
-    # Take care of the magic string if present
-    if salt[:len(magic)] == magic:
-        salt = salt[len(magic):]
-
-
-    # salt can have up to 8 characters:
-    import string
-    
-    try:
-        salt = string.split(salt, '$', 1)[0]
-    except AttributeError:
-        salt = salt.decode("utf-8").split('$', 1)[0].encode("utf-8")
-    
-    salt = salt[:8]
-    
-    try:
-        ctx = pw + magic + salt
-    except TypeError:
-        ctx = pw + magic.encode("utf-8") + salt
+    # Take care of the magic string if present; salt can have up to 8 characters
+    if salt[:len(magic_bytes)] == magic_bytes:
+        salt = salt[len(magic_bytes):]
+    salt = salt.split(b'$', 1)[0][:8]
 
     final = hashlib.md5(pw + salt + pw).digest()
+    ctx = hashlib.md5(pw + magic_bytes + salt)
+    for pl in range(len(pw), 0, -16):
+        ctx.update(final[:min(pl, 16)])
 
-    for pl in range(len(pw),0,-16):
-        if pl > 16:
-            ctx = ctx + final[:16]
-        else:
-            ctx = ctx + final[:pl]
-
-
-    # Now the 'weird' xform (??)
-
+    # Now the 'weird' xform
+    first = pw[:1]
     i = len(pw)
     while i:
+        ctx.update(b'\x00' if i & 1 else first)
+        i >>= 1
+    final = ctx.digest()
+
+    # 1000 kol: liché začínají heslem (stav md5 se jen zkopíruje), sudé digestem (konec je předpočítaný)
+    rounds = []
+    for i in range(ROUND_PERIOD):
+        middle = (salt if i % 3 else b'') + (pw if i % 7 else b'')
         if i & 1:
-            try:
-                ctx = ctx + chr(0)  #if ($i & 1) { $ctx->add(pack("C", 0)); }
-            except TypeError:
-                ctx = ctx + chr(0).encode("utf-8")
+            rounds.append(hashlib.md5(pw + middle))
         else:
-            try:
-                ctx = ctx + pw[0]
-            except TypeError:
-                ctx = ctx + chr(pw[0]).encode("utf-8")
-        i = i >> 1
-
-    final = hashlib.md5(ctx).digest()
-
-    # The following is supposed to make
-    # things run slower.
-
-    # my question: WTF???
-
+            rounds.append(middle + pw)
+    md5 = hashlib.md5
     for i in range(1000):
-        ctx1 = ''.encode("utf-8")
-
-        if i & 1:
-            ctx1 = ctx1 + pw
-        else:
-            ctx1 = ctx1 + final[:16]
-
-        if i % 3:
-            ctx1 = ctx1 + salt
-
-        if i % 7:
-            ctx1 = ctx1 + pw
-
+        step = rounds[i % ROUND_PERIOD]
         if i & 1:
-            ctx1 = ctx1 + final[:16]
+            state = step.copy()
+            state.update(final)
+            final = state.digest()
         else:
-            ctx1 = ctx1 + pw
-
-
-        final = hashlib.md5(ctx1).digest()
-
+            final = md5(final + step).digest()
 
     # Final xform
-    
-    passwd = ''
-
-    try:
-        passwd = passwd + to64((int(ord(final[0])) << 16)
-                               |(int(ord(final[6])) << 8)
-                               |(int(ord(final[12]))),4)
-
-        passwd = passwd + to64((int(ord(final[1])) << 16)
-                               |(int(ord(final[7])) << 8)
-                               |(int(ord(final[13]))), 4)
-
-        passwd = passwd + to64((int(ord(final[2])) << 16)
-                               |(int(ord(final[8])) << 8)
-                               |(int(ord(final[14]))), 4)
-
-        passwd = passwd + to64((int(ord(final[3])) << 16)
-                               |(int(ord(final[9])) << 8)
-                               |(int(ord(final[15]))), 4)
-
-        passwd = passwd + to64((int(ord(final[4])) << 16)
-                               |(int(ord(final[10])) << 8)
-                               |(int(ord(final[5]))), 4)
-
-        passwd = passwd + to64((int(ord(final[11]))), 2)
-
-        return magic + salt + '$' + passwd
-    except TypeError:
-        passwd = passwd + to64((int(final[0]) << 16)
-                               |(int(final[6]) << 8)
-                               |(int(final[12])),4)
-
-        passwd = passwd + to64((int(final[1]) << 16)
-                               |(int(final[7]) << 8)
-                               |(int(final[13])), 4)
-
-        passwd = passwd + to64((int(final[2]) << 16)
-                               |(int(final[8]) << 8)
-                               |(int(final[14])), 4)
-
-        passwd = passwd + to64((int(final[3]) << 16)
-                               |(int(final[9]) << 8)
-                               |(int(final[15])), 4)
-
-        passwd = passwd + to64((int(final[4]) << 16)
-                               |(int(final[10]) << 8)
-                               |(int(final[5])), 4)
-
-        passwd = passwd + to64((int(final[11])), 2)
-        return magic + salt.decode("utf-8") + '$' + passwd
+    passwd = ''.join(to64((final[a] << 16) | (final[b] << 8) | final[c], 4) for a, b, c in FINAL_GROUPS)
+    passwd += to64(final[11], 2)
+    return magic + salt.decode('utf-8', 'replace') + '$' + passwd
 
 ## assign a wrapper function:
 md5crypt = unix_md5_crypt
 
 if __name__ == "__main__":
-    print (unix_md5_crypt("cat", "hat"))
+    # kontrola proti referenčním hodnotám: python md5crypt.py
+    failed = 0
+    for password, salt, expected in REFERENCE_VECTORS:
+        result = unix_md5_crypt(password, salt)
+        if result != expected:
+            failed += 1
+            print ('FAIL %r %r: %s != %s' % (password, salt, result, expected))
+    print ('%d/%d OK' % (len(REFERENCE_VECTORS) - failed, len(REFERENCE_VECTORS)))
+    raise SystemExit(1 if failed else 0)
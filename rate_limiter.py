@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Module: rate_limiter
+# Author: user extension
+# Created on: 19.10.2026
+# License: AGPL v.3 https://www.gnu.org/licenses/agpl-3.0.html
+
+import time
+import threading
+
+class RateLimiter:
+    """Sdílený token bucket: nejvýše `rate` jednotek za sekundu (bajty stahování, požadavky na CSFD)"""
+
+    def __init__(self, rate):
+        self.rate = float(rate)
+        self.allowance = self.rate
+        self.last = time.time()
+        self.lock = threading.Lock()
+
+    def consume(self, amount):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.time()
+                self.allowance = min(self.rate, self.allowance + (now - self.last) * self.rate)
+                self.last = now
+                if self.allowance >= amount or self.allowance >= self.rate:
+                    self.allowance -= amount
+                    return
+                wait = (amount - self.allowance) / self.rate
+            time.sleep(min(wait, 1.0))
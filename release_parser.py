@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+# Module: release_parser
+# Author: user extension
+# Created on: 19.10.2026
+# License: AGPL v.3 https://www.gnu.org/licenses/agpl-3.0.html
+
+import os
+import re
+from functools import lru_cache
+
+# Vzory jsou zkompilované jednou při importu modulu
+RESOLUTION = re.compile(r'(?<![a-z0-9])(2160p|4k|uhd|1080[pi]|720p|576p|480p)(?![a-z0-9])', re.IGNORECASE)
+CODEC = re.compile(r'(?<![a-z0-9])(x265|h\.?265|hevc|x264|h\.?264|avc|xvid|divx|av1|vp9)(?![a-z0-9])', re.IGNORECASE)
+HDR = re.compile(r'(?<![a-z0-9])(hdr10\+?|hdr|dv|dovi|dolby[ ._-]?vision)(?![a-z0-9])', re.IGNORECASE)
+AUDIO = re.compile(r'(?<![a-z0-9])(truehd|atmos|dts[ ._-]?hd|dts|e?ac3|dd5[ ._]?1|dd\+?|aac|mp3)(?![a-z0-9])', re.IGNORECASE)
+CZ_DUB = re.compile(r'(?<![a-z0-9])(cz[ ._-]?dab(ing)?|czdab|cz[ ._-]?dub(bing)?|cesky[ ._-]?dabing|český[ ._-]?dabing|dabing[ ._-]?cz|cz[ ._-]?audio)(?![a-z0-9])', re.IGNORECASE)
+SK_DUB = re.compile(r'(?<![a-z0-9])(sk[ ._-]?dab(ing)?|skdab|sk[ ._-]?dub(bing)?|slovensky[ ._-]?dabing|dabing[ ._-]?sk)(?![a-z0-9])', re.IGNORECASE)
+CZ_SUBS = re.compile(r'(?<![a-z0-9])(cz[ ._-]?tit(ulky)?|cztit|cz[ ._-]?subs?|titulky[ ._-]?cz|cz[ ._-]?tit)(?![a-z0-9])', re.IGNORECASE)
+CZ_ANY = re.compile(r'(?<![a-z0-9])(cz|cze|cesky|česky)(?![a-z0-9])', re.IGNORECASE)
+SOURCE = re.compile(r'(?<![a-z0-9])(remux|blu[ ._-]?ray|bdrip|brrip|web[ ._-]?dl|webrip|web|hdtv|dvdrip|dvd|hdrip|tvrip|cam|ts)(?![a-z0-9])', re.IGNORECASE)
+EDITION = re.compile(r'(?<![a-z0-9])(extended([ ._-]?(cut|edition))?|director\'?s[ ._-]?cut|unrated|uncut|remastered|theatrical|imax|special[ ._-]?edition)(?![a-z0-9])', re.IGNORECASE)
+LANGUAGE = re.compile(r'(?<![a-z0-9])(cz|cze|sk|svk|en|eng|de|ger|multi|dabing|dab|titulky|tit|subs?)(?![a-z0-9])', re.IGNORECASE)
+# jazykové značky, které ukončí název i bez roku; krátké en/de/tit/dab/sub bývají i slovy názvu
+LANGUAGE_STOP = re.compile(r'(?<![a-z0-9])(cz|cze|sk|svk|eng|ger|multi|dabing|titulky)(?![a-z0-9])', re.IGNORECASE)
+YEAR = re.compile(r'(?<![a-z0-9])(19[0-9]{2}|20[0-9]{2})(?![a-z0-9])')
+EPISODE = re.compile(r'(?<![a-z0-9])(s\d{1,2}[ ._-]?e\d{1,3}|\d{1,2}x\d{2})(?![a-z0-9])', re.IGNORECASE)
+EXTENSION = re.compile(r'\.(mkv|mp4|avi|mov|wmv|m4v|ts|iso)$', re.IGNORECASE)
+GROUP = re.compile(r'^\[[^\]]*\]\s*')      # [skupina] na začátku názvu
+SEPARATORS = re.compile(r'[._\[\]\(\){}]+')
+SPACES = re.compile(r'\s+')
+LANGUAGE_CODES = {'cze': 'cz', 'svk': 'sk', 'eng': 'en', 'ger': 'de', 'dab': 'dabing', 'tit': 'titulky', 'sub': 'titulky', 'subs': 'titulky'}
+# Značky, za kterými už nenásleduje název filmu (rok se hledá zvlášť před nimi)
+TITLE_STOPS = [RESOLUTION, SOURCE, CODEC, HDR, AUDIO, EDITION, LANGUAGE_STOP, EPISODE]
+PARSE_CACHE_SIZE = 4096
+
+RESOLUTIONS = {'2160p': '2160p', '4k': '2160p', 'uhd': '2160p', '1080p': '1080p', '1080i': '1080p', '720p': '720p', '576p': 'SD', '480p': 'SD'}
+EXTENSIONS = ['mkv', 'mp4', 'avi', 'mov']
+
+# Preferenční profily pro výběr "nejlepší" verze
+PROFILES = {
+    'quality': {
+        'resolution': {'2160p': 40, '1080p': 30, '720p': 20, 'SD': 8, None: 12},
+        'hdr': 3, 'hevc': 2, 'cz_dub': 15, 'sk_dub': 8, 'cz_subs': 4
+    },
+    'czech': {
+        'resolution': {'2160p': 20, '1080p': 18, '720p': 14, 'SD': 6, None: 10},
+        'hdr': 1, 'hevc': 1, 'cz_dub': 60, 'sk_dub': 30, 'cz_subs': 12
+    },
+    'saver': {
+        'resolution': {'2160p': 5, '1080p': 20, '720p': 30, 'SD': 15, None: 12},
+        'hdr': 0, 'hevc': 5, 'cz_dub': 15, 'sk_dub': 8, 'cz_subs': 4
+    }
+}
+DEFAULT_PROFILE = 'quality'
+
+# Hodnoty nastavení 'stream_profile' (index lvalues, textové hodnoty z dřívější verze) -> profil
+SETTING_PROFILES = {
+    '0': 'quality',
+    '1': 'czech',
+    '2': 'saver',
+    'Kvalita': 'quality',
+    'Český dabing': 'czech',
+    'Úspora dat': 'saver'
+}
+
+def _first(pattern, text):
+    m = pattern.search(text)
+    return m.group(1).lower() if m else None
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_attributes(name):
+    resolution = _first(RESOLUTION, name)
+    codec = _first(CODEC, name)
+    if codec:
+        codec = codec.replace('.', '')
+        codec = {'x265': 'hevc', 'h265': 'hevc', 'x264': 'h264', 'avc': 'h264', 'divx': 'xvid'}.get(codec, codec)
+    cz_dub = bool(CZ_DUB.search(name))
+    cz_subs = bool(CZ_SUBS.search(name))
+    # samotné "CZ" bez upřesnění bereme jako dabing
+    if not cz_dub and not cz_subs and CZ_ANY.search(name):
+        cz_dub = True
+    return {
+        'resolution': RESOLUTIONS.get(resolution) if resolution else None,
+        'codec': codec,
+        'hdr': bool(HDR.search(name)),
+        'audio': _first(AUDIO, name),
+        'cz_dub': cz_dub,
+        'sk_dub': bool(SK_DUB.search(name)),
+        'cz_subs': cz_subs,
+        'extension': os.path.splitext(name)[1].lower().strip('.')
+    }
+
+def parse_attributes(name):
+    """Technické atributy release podle názvu souboru"""
+    return dict(_parse_attributes(name))
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse(name):
+    base = EXTENSION.sub('', name.strip())
+    base = GROUP.sub('', base)
+    text = SPACES.sub(' ', SEPARATORS.sub(' ', base)).strip()
+
+    # Technická část začíná první značkou kvality; rok vydání je poslední rok před ní
+    # (dřívější roky patří k názvu, např. "Blade Runner 2049 2017"), rok na začátku také ("1917")
+    tags = len(text)
+    for pattern in TITLE_STOPS:
+        for m in pattern.finditer(text):
+            if m.start() == 0:
+                continue
+            tags = min(tags, m.start())
+            break
+    years = [m for m in YEAR.finditer(text, 0, tags) if m.start() > 0]
+    if years:
+        cut = years[-1].start()
+        year = int(years[-1].group(1))
+    else:
+        cut = tags
+        m = YEAR.search(text, tags)
+        year = int(m.group(1)) if m else None
+    title = text[:cut].strip(' -')
+    rest = text[cut:]
+
+    languages = []
+    for m in LANGUAGE.finditer(rest):
+        code = m.group(1).lower()
+        code = LANGUAGE_CODES.get(code, code)
+        if code not in languages:
+            languages.append(code)
+    edition = _first(EDITION, rest)
+    source = _first(SOURCE, rest)
+    if source:
+        source = re.sub(r'[ ._-]', '', source)
+
+    result = dict(_parse_attributes(name))
+    result.update({
+        'title': title or text,
+        'year': year,
+        'source': source,
+        'languages': languages,
+        'edition': edition
+    })
+    return result
+
+def parse(name):
+    """Rozloží název release na název filmu, rok, rozlišení, zdroj, kodek, jazyky a edici.
+
+    Výsledky se pamatují v omezené LRU cache, opakované výpisy tedy parsují jen nové názvy.
+    """
+    result = dict(_parse(name))
+    result['languages'] = list(result['languages'])
+    return result
+
+def score(attrs, profile=DEFAULT_PROFILE):
+    """Číselné skóre release podle preferenčního profilu (vyšší = lepší)"""
+    weights = PROFILES.get(profile, PROFILES[DEFAULT_PROFILE])
+    value = weights['resolution'].get(attrs.get('resolution'), weights['resolution'][None])
+    if attrs.get('hdr'):
+        value += weights['hdr']
+    if attrs.get('codec') == 'hevc':
+        value += weights['hevc']
+    if attrs.get('cz_dub'):
+        value += weights['cz_dub']
+    elif attrs.get('sk_dub'):
+        value += weights['sk_dub']
+    if attrs.get('cz_subs'):
+        value += weights['cz_subs']
+    ext = attrs.get('extension')
+    value += len(EXTENSIONS) - EXTENSIONS.index(ext) if ext in EXTENSIONS else 0
+    return value
+
+def rank(files, profile=DEFAULT_PROFILE):
+    """Seřadí souborové záznamy ({'name', 'size'}) od nejlepší verze"""
+    def key(f):
+        try:
+            size = float(f.get('size') or 0)
+        except ValueError:
+            size = 0
+        return (-score(_parse_attributes(f['name']), profile), -size)
+    return sorted(files, key=key)
+
+def describe(attrs):
+    """Krátký popis atributů do popisku, např. '1080p HEVC CZ'"""
+    parts = [attrs.get('resolution'), (attrs.get('codec') or '').upper() or None]
+    if attrs.get('hdr'):
+        parts.append('HDR')
+    if attrs.get('cz_dub'):
+        parts.append('CZ')
+    elif attrs.get('sk_dub'):
+        parts.append('SK')
+    if attrs.get('cz_subs'):
+        parts.append('CZ tit.')
+    return ' '.join(p for p in parts if p)
@@ -8,11 +8,20 @@ import os
 import io
 import re
 import json
+import zlib
+import shutil
 import xbmc
 import xbmcaddon
 import xbmcgui
 import xml.etree.ElementTree as ET
 import themoviedb
+import catalog
+import file_meta
+import release_parser
+import utils
+import csfd_integration
+import artwork
+import account_mirror
 
 try:
     from urllib import urlencode
@@ -26,6 +35,13 @@ try:
 except ImportError:
     from xbmcvfs import translatePath
 
+# Úložiště seriálu: series_db/<název>/manifest.json + jeden soubor na sérii
+MANIFEST_FILE = 'manifest.json'
+SHARD_PREFIX = 'season_'
+SHARD_PLAIN = '.json'
+SHARD_COMPRESSED = '.json.z'
+STORAGE_FORMAT = 2
+
 # Regular expressions for detecting episode patterns
 EPISODE_PATTERNS = [
     r'[Ss](\d+)[xX][Ee](\d+)',     # S01xE01, S01XE01 (např. "S06xE02")
@@ -40,6 +56,50 @@ EPISODE_PATTERNS = [
     r'\(s\s*(\d+)\s*e\s*(\d+)\)',  # (s8 e1) nebo (s 8 e 1)
     r'[sS](\d+)\s?[eE](\d+)',      # s2 e1 nebo s 2 e 1
 ]
+EPISODE_REGEXES = [re.compile(pattern) for pattern in EPISODE_PATTERNS]
+# Klíčová slova, která také naznačují epizodu (podřetězce, stejně jako dříve)
+EPISODE_KEYWORDS = ['episode', 'season', 'series', 'ep', 'complete', 'serie', 'disk']
+# Všechny vzory a klíčová slova v jednom průchodu
+EPISODE_HINT = re.compile('|'.join(['(?:%s)' % p for p in EPISODE_PATTERNS] + EPISODE_KEYWORDS), re.IGNORECASE)
+
+class EpisodeMatcher:
+    """Rozhoduje, zda soubor vypadá jako epizoda seriálu.
+
+    Všechny varianty názvu se převedou na normalizované posloupnosti tokenů (bez diakritiky,
+    oddělovače sjednocené), název souboru se normalizuje jednou a výsledek se pamatuje podle identu.
+    """
+
+    def __init__(self, names, titles=None):
+        self.titles = titles or {}
+        forms = {}
+        for name in names:
+            tokens = utils.tokenize(name)
+            if tokens:
+                forms[' ' + ' '.join(tokens) + ' '] = tokens
+                forms[' ' + ''.join(tokens) + ' '] = [''.join(tokens)]
+        self.forms = sorted(forms, key=len)
+        # pro odstranění názvu z původního jména souboru: tokeny s libovolnými oddělovači, nejdelší první
+        self.strip_patterns = [re.compile(r'(?<![a-z0-9])' + r'[^a-z0-9]*'.join(re.escape(t) for t in forms[form]) + r'(?![a-z0-9])')
+                               for form in reversed(self.forms)]
+        self.memo = {}
+
+    def matches(self, ident, filename):
+        if ident in self.memo:
+            return self.memo[ident]
+        normalized = ' ' + ' '.join(utils.tokenize(filename)) + ' '
+        result = any(form in normalized for form in self.forms) and (
+            EPISODE_HINT.search(filename) is not None or any(title in normalized for title in self.titles))
+        self.memo[ident] = result
+        return result
+
+    def strip_name(self, filename):
+        """Jméno souboru (malá písmena, bez diakritiky) bez nalezené varianty názvu seriálu"""
+        text = utils.normalize_text(filename)
+        for pattern in self.strip_patterns:
+            stripped, count = pattern.subn(' ', text, 1)
+            if count:
+                return stripped.strip()
+        return text
 
 class SeriesManager:
     def __init__(self, addon, profile):
@@ -51,7 +111,10 @@ class SeriesManager:
     def delete_series(self, series_name):
         filename = series_name
         filepath = os.path.join(self.series_db_path , filename)
-        if os.path.exists(filepath):
+        if os.path.isdir(filepath):
+            shutil.rmtree(filepath, ignore_errors=True)
+            xbmc.log(f"[PLUGIN] Seriál '{series_name}' smazán ({filepath})", xbmc.LOGINFO)
+        elif os.path.exists(filepath):
             os.remove(filepath)
             xbmc.log(f"[PLUGIN] Seriál '{series_name}' smazán ({filepath})", xbmc.LOGINFO)
         else:
@@ -95,42 +158,80 @@ class SeriesManager:
         
         return queries
     
-    def search_series(self, series_name, api_function, token):
-        """Search for episodes of a series"""
+    def series_queries(self, series_name, tmdb=None):
+        """Dotazy hledání seriálu, nejvýš tolik jako prosté hledání lokalizovaného názvu.
+
+        Dotazy se stejnou množinou tokenů (jiné oddělovače, diakritika) se posílají jen jednou;
+        originální název z TMDb se hledá jen holý a s s01, přednostně před názvem z TMDb.
+        """
+        plain = self.remove_diacritics(series_name)
+        budget = len(self.build_fuzzy_name_queries(series_name))
+        if plain != series_name:
+            budget += len(self.build_fuzzy_name_queries(plain))
+        candidates = self.build_fuzzy_name_queries(series_name)
+        if tmdb:
+            original = tmdb.get('original_name')
+            if original and original != 'Unknown':
+                candidates += [original, f"{original} s01"]
+            if tmdb.get('name') and tmdb.get('name') != 'Unknown':
+                candidates += self.build_fuzzy_name_queries(tmdb.get('name'))
+        queries = []
+        keys = set()
+        for query in candidates:
+            key = frozenset(utils.tokenize(query))
+            if key and key not in keys:
+                keys.add(key)
+                queries.append(query)
+        return queries[:budget]
+
+    def search_series(self, series_name, api_function, token, tmdb=None):
+        """Search for episodes of a series
+
+        S kostrou z TMDb (themoviedb.build_tmdb_series_structure) se hledá i pod originálním
+        názvem a streamy se k epizodám přiřadí hromadně podle (série, epizoda) - bez dotazů na epizody.
+        """
         # Structure to hold results
+        profile = self.stream_profile()
         series_data = {
             'name': series_name,
             'last_updated': xbmc.getInfoLabel('System.Date'),
+            'profile': profile,
             'seasons': {}
         }
 
-        # Build improved search queries
-        search_queries = self.build_fuzzy_name_queries(series_name)
+        # Build improved search queries (pro lokalizovaný i originální název, s diakritikou i bez ní)
+        names = [series_name]
+        if tmdb:
+            names += [tmdb.get('name'), tmdb.get('original_name')]
+        names = [name for name in names if name and name != 'Unknown']
+        variants = []
+        for name in names:
+            variants += [name, self.remove_diacritics(name)]
+        variants = list(dict.fromkeys(variants))
+        search_queries = self.series_queries(series_name, tmdb)
+        titles = episode_title_index(tmdb) if tmdb else {}
+        matcher = EpisodeMatcher([v for name in variants for v in self.normalize_series_name(name)], titles)
         all_results = []
+        accepted = set()
+        seen = {}
 
-        # 1. Search with diacritics
+        # Výsledky s diakritikou i bez ní; každý soubor se posuzuje jen jednou podle identu
         for query in search_queries:
             results = self._perform_search(query, api_function, token)
             for result in results:
-                result['_query'] = query
-                if result not in all_results and self._is_likely_episode(result['name'], query):
+                seen[result['ident']] = result
+                if result['ident'] not in accepted and matcher.matches(result['ident'], result['name']):
+                    accepted.add(result['ident'])
                     all_results.append(result)
 
-        # 2. Search without diacritics
-        series_name_without_diacritics = self.remove_diacritics(series_name)
-        if series_name_without_diacritics != series_name:  # Only if there were diacritics
-            search_queries_without_diacritics = self.build_fuzzy_name_queries(series_name_without_diacritics)
-            for query in search_queries_without_diacritics:
-                results = self._perform_search(query, api_function, token)
-                for result in results:
-                    result['_query'] = query
-                    if result not in all_results and self._is_likely_episode(result['name'], query):
-                        all_results.append(result)
+        # Všechny viděné záznamy uložíme do lokálního katalogu
+        catalog.remember(self.profile, list(seen.values()))
 
         # Process results and organize into seasons and episodes
         for item in all_results:
-            query = item.get('_query', series_name)
-            season_num, episode_num = self._detect_episode_info(item['name'], item['_query'])
+            season_num, episode_num = self._detect_episode_info(item['name'], matcher)
+            if season_num is None and titles:
+                season_num, episode_num = match_episode_title(item['name'], titles)
             if season_num is not None:
                 season_num_str = str(season_num)
                 episode_num_str = str(episode_num)
@@ -143,40 +244,29 @@ class SeriesManager:
                     series_data['seasons'][season_num_str][episode_num_str] = []
 
                 # Add the result to the corresponding episode
+                # Atributy release se parsují jednou zde, výpisy už jen čtou uložené skóre
+                attrs = release_parser.parse_attributes(item['name'])
                 series_data['seasons'][season_num_str][episode_num_str].append({
                     'name': item['name'],
                     'ident': item['ident'],
-                    'size': item.get('size', '0')
+                    'size': item.get('size', '0'),
+                    'attrs': attrs,
+                    'score': release_parser.score(attrs, profile)
                 })
 
+        # Soubory každé epizody uložíme již seřazené od nejlepšího
+        for season in series_data['seasons'].values():
+            for episode_num_str in season:
+                season[episode_num_str] = sort_episode_files(season[episode_num_str])
+
+        if tmdb:
+            series_data['tmdb'] = tmdb
+
         # Save the series data
         self._save_series_data(series_name, series_data)
 
         return series_data
     
-    def _is_likely_episode(self, filename, series_name):
-        """Check if a filename is likely to be an episode of the series"""
-        # Skip if doesn't contain series name
-        if not re.search(re.escape(series_name), filename, re.IGNORECASE):
-            return False
-            
-        # Positive indicators
-        for pattern in EPISODE_PATTERNS:
-            if re.search(pattern, filename, re.IGNORECASE):
-                return True
-                
-        # Keywords that suggest it's a episode
-        episode_keywords = [
-            'episode', 'season', 'series', 'ep', 
-            'complete', 'serie', 'season', 'disk'
-        ]
-        
-        for keyword in episode_keywords:
-            if keyword in filename.lower():
-                return True
-                
-        return False
-    
     def _perform_search(self, search_query, api_function, token):
         """Perform the actual search using the provided API function"""
         results = []
@@ -208,14 +298,14 @@ class SeriesManager:
         
         return results
 
-    def _detect_episode_info(self, filename, series_name):
+    def _detect_episode_info(self, filename, matcher):
         """Try to detect season and episode numbers from filename"""
-        # Remove series name and clean up the string
-        cleaned = filename.lower().replace(series_name.lower(), '').strip()
+        # Odstraníme variantu názvu, kterou matcher v souboru našel (čísla v názvu, např. "9-1-1")
+        cleaned = matcher.strip_name(filename)
         
         # Try each of our patterns
-        for pattern in EPISODE_PATTERNS:
-            match = re.search(pattern, cleaned)
+        for pattern in EPISODE_REGEXES:
+            match = pattern.search(cleaned)
             if match:
                 groups = match.groups()
                 if len(groups) == 2:  # Patterns like S01E02
@@ -238,43 +328,220 @@ class SeriesManager:
         # Default fallback
         return None, None
     
-    def _save_series_data(self, series_name, series_data):
-        """Save series data to the database"""
-        safe_name = self._safe_filename(series_name)
-        file_path = os.path.join(self.series_db_path, f"{safe_name}.json")
-        
+    def _series_dir(self, series_name):
+        return os.path.join(self.series_db_path, self._safe_filename(series_name))
+
+    def _write(self, path, data, compress=False):
+        """Kompaktní JSON zapsaný atomicky přes dočasný soubor, volitelně zlib"""
         try:
-            with io.open(file_path, 'w', encoding='utf8') as file:
-                try:
-                    data = json.dumps(series_data, indent=2).decode('utf8')
-                except AttributeError:
-                    data = json.dumps(series_data, indent=2)
+            data = json.dumps(data, separators=(',', ':')).decode('utf8')
+        except AttributeError:
+            data = json.dumps(data, separators=(',', ':'))
+        tmp = path + '.tmp'
+        if compress:
+            with io.open(tmp, 'wb') as file:
+                file.write(zlib.compress(data.encode('utf8')))
+        else:
+            with io.open(tmp, 'w', encoding='utf8') as file:
                 file.write(data)
-                file.close()
+        os.replace(tmp, path)
+
+    def _read(self, path):
+        if path.endswith(SHARD_COMPRESSED):
+            with io.open(path, 'rb') as file:
+                data = zlib.decompress(file.read()).decode('utf8')
+        else:
+            with io.open(path, 'r', encoding='utf8') as file:
+                data = file.read()
+        try:
+            return json.loads(data, "utf-8")
+        except TypeError:
+            return json.loads(data)
+
+    def _shard_path(self, series_dir, season_num):
+        """Cesta k existujícímu souboru série (komprimovanému i nekomprimovanému) nebo None"""
+        for ext in (SHARD_COMPRESSED, SHARD_PLAIN):
+            path = os.path.join(series_dir, SHARD_PREFIX + str(season_num) + ext)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _save_season(self, series_dir, season_num, shard):
+        compress = self.addon.getSetting('series_compress') != 'false'
+        path = os.path.join(series_dir, SHARD_PREFIX + str(season_num) + (SHARD_COMPRESSED if compress else SHARD_PLAIN))
+        self._write(path, shard, compress)
+        # případná kopie v druhém formátu by při čtení překážela
+        other = os.path.join(series_dir, SHARD_PREFIX + str(season_num) + (SHARD_PLAIN if compress else SHARD_COMPRESSED))
+        if os.path.exists(other):
+            os.unlink(other)
+
+    def _save_series_data(self, series_name, series_data):
+        """Save series data to the database
+
+        Data se rozdělí na malý manifest (název, série, počty, TMDb údaje seriálu a sérií)
+        a jeden soubor na sérii se streamy a TMDb údaji jejích epizod.
+        """
+        series_dir = self._series_dir(series_name)
+        try:
+            if not os.path.isdir(series_dir):
+                os.makedirs(series_dir)
+            tmdb = series_data.get('tmdb')
+            tmdb_seasons = tmdb.get('seasons', {}) if tmdb else {}
+            manifest = {
+                'format': STORAGE_FORMAT,
+                'name': series_data.get('name', series_name),
+                'last_updated': series_data.get('last_updated', ''),
+                'seasons': {}
+            }
+            if tmdb:
+                manifest['tmdb'] = {key: value for key, value in tmdb.items() if key != 'seasons'}
+                manifest['tmdb']['seasons'] = {num: {key: value for key, value in season.items() if key != 'episodes'}
+                                               for num, season in tmdb_seasons.items()}
+            # série jen z TMDb (zatím bez streamů) se ukládají také, aby se metadata epizod neztratila
+            season_nums = list(series_data.get('seasons', {})) + [num for num in tmdb_seasons if num not in series_data.get('seasons', {})]
+            for season_num in season_nums:
+                episodes = series_data.get('seasons', {}).get(season_num, {})
+                shard = {
+                    'season': season_num,
+                    'profile': series_data.get('profile'),
+                    'episodes': episodes
+                }
+                if tmdb:
+                    shard['tmdb'] = {
+                        'show': tmdb.get('name', series_name),
+                        'episodes': tmdb_seasons.get(season_num, {}).get('episodes', {})
+                    }
+                self._save_season(series_dir, season_num, shard)
+                manifest['seasons'][season_num] = {
+                    'episodes': len(episodes),
+                    'files': sum(len(files) for files in episodes.values())
+                }
+            # soubory sérií, které už v datech nejsou
+            for filename in os.listdir(series_dir):
+                if filename.startswith(SHARD_PREFIX):
+                    season_num = filename[len(SHARD_PREFIX):].split('.')[0]
+                    if season_num not in manifest['seasons']:
+                        os.unlink(os.path.join(series_dir, filename))
+            # manifest až nakonec - do té doby se čte předchozí stav
+            self._write(os.path.join(series_dir, MANIFEST_FILE), manifest)
         except Exception as e:
             xbmc.log(f'WebshareCinema: Error saving series data: {str(e)}', level=xbmc.LOGERROR)
     
-    def load_series_data(self, series_name):
-        """Load series data from the database"""
-        safe_name = self._safe_filename(series_name)
-        file_path = os.path.join(self.series_db_path, f"{safe_name}.json")
-        
-        if not os.path.exists(file_path):
+    def stream_profile(self):
+        """Preferenční profil pro řazení verzí epizod podle nastavení"""
+        return release_parser.SETTING_PROFILES.get(self.addon.getSetting('stream_profile'), release_parser.DEFAULT_PROFILE)
+
+    def _rescore(self, shard):
+        """Dopočítá skóre u dat bez něj nebo po změně profilu; vrací True, pokud se data změnila"""
+        profile = self.stream_profile()
+        changed = shard.get('profile') != profile
+        episodes = shard.get('episodes', {})
+        for episode_num, files in episodes.items():
+            if not changed and all('score' in f for f in files):
+                continue
+            for f in files:
+                if 'attrs' not in f:
+                    f['attrs'] = release_parser.parse_attributes(f['name'])
+                f['score'] = release_parser.score(f['attrs'], profile)
+            episodes[episode_num] = sort_episode_files(files)
+            changed = True
+        shard['profile'] = profile
+        return changed
+
+    def _legacy_path(self, series_name):
+        return os.path.join(self.series_db_path, f"{self._safe_filename(series_name)}.json")
+
+    def _migrate(self, legacy_path):
+        """Převede jeden dokument series_db/<název>.json na manifest a soubory sérií"""
+        try:
+            series_data = self._read(legacy_path)
+            series_name = os.path.splitext(os.path.basename(legacy_path))[0]
+            self._save_series_data(series_name, series_data)
+            if os.path.exists(os.path.join(self.series_db_path, series_name, MANIFEST_FILE)):
+                os.unlink(legacy_path)
+        except Exception as e:
+            xbmc.log(f'WebshareCinema: Error migrating series data {legacy_path}: {str(e)}', level=xbmc.LOGERROR)
+
+    def load_manifest(self, series_name):
+        """Manifest seriálu (bez streamů) nebo None"""
+        legacy = self._legacy_path(series_name)
+        if os.path.exists(legacy):
+            self._migrate(legacy)
+        path = os.path.join(self._series_dir(series_name), MANIFEST_FILE)
+        if not os.path.exists(path):
             return None
-        
         try:
-            with io.open(file_path, 'r', encoding='utf8') as file:
-                data = file.read()
-                file.close()
-                try:
-                    series_data = json.loads(data, "utf-8")
-                except TypeError:
-                    series_data = json.loads(data)
-                return series_data
+            return self._read(path)
+        except Exception as e:
+            xbmc.log(f'WebshareCinema: Error loading series manifest: {str(e)}', level=xbmc.LOGERROR)
+            return None
+
+    def load_season(self, series_name, season_num):
+        """Data jedné série: {'episodes': {číslo: [soubory]}, 'tmdb': {...}} nebo None"""
+        if os.path.exists(self._legacy_path(series_name)):
+            self._migrate(self._legacy_path(series_name))
+        series_dir = self._series_dir(series_name)
+        path = self._shard_path(series_dir, season_num)
+        if path is None:
+            return None
+        try:
+            shard = self._read(path)
+            if self._rescore(shard):
+                self._save_season(series_dir, season_num, shard)
+            return shard
         except Exception as e:
             xbmc.log(f'WebshareCinema: Error loading series data: {str(e)}', level=xbmc.LOGERROR)
             return None
+
+    def load_series_data(self, series_name):
+        """Load series data from the database
+
+        Složí celý dokument ze všech sérií - výpisy si načítají jen manifest nebo jednu sérii.
+        """
+        manifest = self.load_manifest(series_name)
+        if not manifest:
+            return None
+        series_data = {
+            'name': manifest.get('name', series_name),
+            'last_updated': manifest.get('last_updated', ''),
+            'profile': self.stream_profile(),
+            'seasons': {}
+        }
+        tmdb = manifest.get('tmdb')
+        if tmdb:
+            series_data['tmdb'] = dict(tmdb, seasons={num: dict(season) for num, season in tmdb.get('seasons', {}).items()})
+        for season_num in manifest.get('seasons', {}):
+            shard = self.load_season(series_name, season_num)
+            if shard is None:
+                continue
+            if shard['episodes']:
+                series_data['seasons'][season_num] = shard['episodes']
+            if tmdb and season_num in series_data['tmdb']['seasons']:
+                series_data['tmdb']['seasons'][season_num]['episodes'] = shard.get('tmdb', {}).get('episodes', {})
+        return series_data
         
+    def next_episode(self, series_name, season_num, episode_num):
+        """Následující epizoda podle pořadí série/epizody: (série, epizoda, nejlepší soubor) nebo None
+
+        Čte se jen aktuální série, případně ta následující.
+        """
+        manifest = self.load_manifest(series_name)
+        if not manifest:
+            return None
+        current = (int(season_num), int(episode_num))
+        for season in sorted(int(num) for num in manifest.get('seasons', {})):
+            if season < current[0]:
+                continue
+            shard = self.load_season(series_name, str(season))
+            if not shard:
+                continue
+            candidates = [(int(episode), files) for episode, files in shard['episodes'].items()
+                          if files and (season, int(episode)) > current]
+            if candidates:
+                episode, files = min(candidates, key=lambda x: x[0])
+                return str(season), str(episode), files[0]
+        return None
+
     def load_full_series_by_filename(self, filename):
         path = os.path.join(self.profile, 'series_db_tmdb', filename)
         try:
@@ -289,16 +556,24 @@ class SeriesManager:
         series_list = []
         
         try:
+            # starší dokumenty series_db/<název>.json převedeme na nové úložiště
             for filename in os.listdir(self.series_db_path):
                 if filename.endswith('.json'):
-                    series_name = os.path.splitext(filename)[0]
-                    # Convert safe filename back to proper name (rough conversion)
-                    proper_name = series_name.replace('_', ' ')
-                    series_list.append({
-                        'name': proper_name,
-                        'filename': filename,
-                        'safe_name': series_name
-                    })
+                    self._migrate(os.path.join(self.series_db_path, filename))
+            for filename in sorted(os.listdir(self.series_db_path)):
+                manifest_path = os.path.join(self.series_db_path, filename, MANIFEST_FILE)
+                if not os.path.exists(manifest_path):
+                    continue
+                try:
+                    name = self._read(manifest_path).get('name')
+                except Exception:
+                    name = None
+                series_list.append({
+                    # Convert safe filename back to proper name (rough conversion), pokud manifest název nemá
+                    'name': name or filename.replace('_', ' '),
+                    'filename': filename,
+                    'safe_name': filename
+                })
         except Exception as e:
             xbmc.log(f'WebshareCinema: Error listing series: {str(e)}', level=xbmc.LOGERROR)
         
@@ -343,6 +618,28 @@ class SeriesManager:
         base_text = ''.join([c for c in normalized_text if unicodedata.category(c) != 'Mn'])
         return base_text
 
+def episode_title_index(tmdb):
+    """Normalizovaný název epizody z TMDb -> (série, epizoda), jen pro jednoznačné a dost dlouhé názvy"""
+    index = {}
+    for season_num, season in tmdb.get('seasons', {}).items():
+        for episode_num, episode in season.get('episodes', {}).items():
+            tokens = utils.tokenize(episode.get('name'))
+            title = ' '.join(tokens)
+            # krátké názvy ("Pilot", "Epizoda 3") by se chytaly všude
+            if len(tokens) < 2 or len(title) < 8 or title.startswith('epizoda') or title.startswith('episode'):
+                continue
+            key = ' ' + title + ' '
+            index[key] = None if key in index else (int(season_num), int(episode_num))
+    return {key: value for key, value in index.items() if value}
+
+def match_episode_title(filename, titles):
+    """Najde epizodu podle názvu z TMDb v názvu souboru; (série, epizoda) nebo (None, None)"""
+    normalized = ' ' + ' '.join(utils.tokenize(filename)) + ' '
+    for title, numbers in titles.items():
+        if title in normalized:
+            return numbers
+    return None, None
+
 # Utility functions for the UI layer
 def get_url(**kwargs):
     """Create a URL for calling the plugin recursively"""
@@ -366,9 +663,15 @@ def create_series_menu(series_manager, handle, has_tmdb_token):
 
     # List existing series
     series_list = series_manager.get_all_series()
+    names = [series['name'] for series in series_list]
+    ratings = {}
+    if 'true' == series_manager.addon.getSetting('csfd'):
+        ratings = csfd_integration.csfd_cached(names, series_manager.profile, 'series')
     for series in series_list:
         listitem = xbmcgui.ListItem(label=series['name'])
         listitem.setArt({'icon': 'DefaultFolder.png'})
+        info = csfd_integration.merge_info({'title': series['name']}, ratings.get(series['name']))
+        listitem.setInfo('video', info)
 
         serie_name = series['name']
         # URL pro otevření detailu
@@ -388,65 +691,163 @@ def create_series_menu(series_manager, handle, has_tmdb_token):
 
         xbmcplugin.addDirectoryItem(handle, detail_url, listitem, True)
     xbmcplugin.endOfDirectory(handle)
+    return names
 
 def create_seasons_menu(series_manager, handle, series_name):
     """Create menu of seasons for a series"""
     import xbmcplugin
     
-    series_data = series_manager.load_series_data(series_name)
-    if not series_data:
+    # Stačí manifest - streamy jednotlivých sérií se nenačítají
+    manifest = series_manager.load_manifest(series_name)
+    if not manifest:
         xbmcgui.Dialog().notification('Webshare Cinema', 'Data serialu nenalezena', xbmcgui.NOTIFICATION_WARNING)
         xbmcplugin.endOfDirectory(handle, succeeded=False)
         return
     
+    # Metadata z TMDb jsou uložená u dat seriálu - při procházení se TMDb nevolá
+    tmdb = manifest.get('tmdb') or {}
+    art = artwork.from_settings(series_manager.addon, series_manager.profile)
+    fanart = artwork.tmdb_url(tmdb.get('poster'), 'detail')
+
     # List seasons
-    for season_num in sorted(series_data['seasons'].keys(), key=int):
-        season_name = f"Série {season_num}"
+    for season_num in sorted(manifest['seasons'].keys(), key=int):
+        if not manifest['seasons'][season_num].get('files'):
+            continue
+        meta = tmdb.get('seasons', {}).get(season_num, {})
+        season_name = meta.get('name') or f"Série {season_num}"
         listitem = xbmcgui.ListItem(label=season_name)
         listitem.setArt({'icon': 'DefaultFolder.png'})
+        if meta:
+            poster = art.resolve(artwork.tmdb_url(meta.get('poster') or tmdb.get('poster'), 'list'))
+            if poster:
+                listitem.setArt({'icon': 'DefaultFolder.png', 'poster': poster, 'thumb': poster, 'fanart': fanart})
+            listitem.setInfo('video', {
+                'title': season_name,
+                'tvshowtitle': tmdb.get('name', series_name),
+                'season': int(season_num),
+                'plot': meta.get('overview') or tmdb.get('overview', ''),
+                'premiered': meta.get('air_date', ''),
+                'mediatype': 'season'
+            })
         xbmcplugin.addDirectoryItem(handle, get_url(action='series_season', series_name=series_name, season=season_num), listitem, True)
     
+    if tmdb:
+        xbmcplugin.setContent(handle, 'seasons')
     xbmcplugin.endOfDirectory(handle)
 
-def create_episodes_menu(series_manager, handle, series_name, season_num):
-    """Create menu of episodes for a season, handling multiple files per episode, sorted by file type and size"""
+def create_episodes_menu(series_manager, handle, series_name, season_num, episode_filter=None):
+    """Create menu of episodes for a season, handling multiple files per episode, best ranked first.
+
+    With episode_filter only the copies of that one episode are listed.
+    Returns the list of rendered idents.
+    """
     import xbmcplugin, xbmcgui
     import os  # Na práci s příponami souborů
     
-    # Definování preferovaných přípon
-    preferred_extensions = ['mkv', 'mp4', 'avi', 'mov']  # Zde si definujete pořadí přípon
-    
-    # Load series data
-    series_data = series_manager.load_series_data(series_name)
-    if not series_data or str(season_num) not in series_data['seasons']:
+    # Načte se jen soubor této série
+    shard = series_manager.load_season(series_name, season_num)
+    if not shard:
         xbmcgui.Dialog().notification('Webshare Cinema', 'Data sezony nenalezena', xbmcgui.NOTIFICATION_WARNING)
         xbmcplugin.endOfDirectory(handle, succeeded=False)
-        return
+        return []
     
     # Convert season_num to a string for dict lookup if it's not already
     season_num = str(season_num)
+    idents = []
     
+    best_only = episode_filter is None and series_manager.addon.getSetting('best_only') == 'true'
+
+    # Stažení celé série do fronty
+    if episode_filter is None:
+        listitem = xbmcgui.ListItem(label=series_manager.addon.getLocalizedString(30225))
+        listitem.setArt({'icon': 'DefaultAddonService.png'})
+        xbmcplugin.addDirectoryItem(handle, get_url(action='download_season', series_name=series_name, season=season_num), listitem, False)
+        listitem = xbmcgui.ListItem(label=series_manager.addon.getLocalizedString(30226))
+        listitem.setArt({'icon': 'DefaultAddonService.png'})
+        xbmcplugin.addDirectoryItem(handle, get_url(action='queue_season', series_name=series_name, season=season_num), listitem, False)
+
     # List episodes
-    season = series_data['seasons'][season_num]
+    season = shard['episodes']
+    tmdb = shard.get('tmdb') or {}
+    tmdb_episodes = tmdb.get('episodes', {})
+    art = artwork.from_settings(series_manager.addon, series_manager.profile)
+
+    def episode_info(episode_num, title):
+        """infoLabels a obrázky epizody z uložených TMDb metadat"""
+        meta = tmdb_episodes.get(episode_num, {})
+        info = {'title': title, 'episode': int(episode_num), 'season': int(season_num), 'mediatype': 'episode'}
+        if tmdb:
+            info['tvshowtitle'] = tmdb.get('show', series_name)
+        if meta.get('overview'):
+            info['plot'] = meta['overview']
+        if meta.get('air_date'):
+            info['aired'] = meta['air_date']
+        if meta.get('rating'):
+            info['rating'] = meta['rating']
+        still = art.resolve(artwork.tmdb_url(meta.get('still'), 'list'))
+        images = {'icon': 'DefaultVideo.png'}
+        if still:
+            images['thumb'] = still
+        return meta.get('name'), info, images
+
+    # Uložená metadata file_info (rozlišení, jazyky) pro anotaci
+    store = file_meta.FileMetaStore(series_manager.profile)
+    try:
+        metas = store.summaries([f['ident'] for files in season.values() for f in files])
+    finally:
+        store.close()
+    # přehrané soubory podle zrcadla historie účtu
+    watched = account_mirror.marks(series_manager.profile).watched
+
     for episode_num in sorted(season.keys(), key=int):
-        episode_list = season[episode_num]
-        
-        # Seřadíme soubory pro tuto epizodu podle preferované přípony a velikosti
-        # Získáme typ souboru podle přípony a použijeme naše preferované pořadí
-        episode_list_sorted = sorted(episode_list, key=lambda x: (preferred_extensions.index(get_file_type(x['name'])) 
-                                                                  if get_file_type(x['name']) in preferred_extensions else len(preferred_extensions), 
-                                                                  -float(x['size'])))
+        if episode_filter is not None and episode_num != str(episode_filter):
+            continue
+        # Soubory jsou v úložišti již seřazené podle skóre (nejlepší první)
+        episode_list_sorted = season[episode_num]
+        if not episode_list_sorted:
+            continue
+
+        # Přehrát nejlepší verzi jedním kliknutím
+        if episode_filter is None:
+            best = episode_list_sorted[0]
+            name, info, images = episode_info(episode_num, None)
+            # s TMDb metadaty "1. Název epizody", jinak jako dosud
+            best_label = f"{episode_num}. {name}" if name else f"Epizoda {episode_num} - Přehrát nejlepší"
+            description = release_parser.describe(best.get('attrs', {}))
+            if description:
+                best_label += f" ({description})"
+            best_listitem = xbmcgui.ListItem(label=best_label)
+            info['title'] = name or best_label
+            info.setdefault('plot', best['name'])
+            if any(f['ident'] in watched for f in episode_list_sorted):
+                info['playcount'] = 1
+            best_listitem.setInfo('video', info)
+            best_listitem.setArt(images)
+            best_listitem.setProperty('IsPlayable', 'true')
+            versions_url = get_url(action='series_episode', series_name=series_name, season=season_num, episode=episode_num)
+            best_listitem.addContextMenuItems([("Všechny verze", f"Container.Update({versions_url})")])
+            xbmcplugin.addDirectoryItem(handle, get_url(action='play', ident=best['ident'], name=best['name'], series_name=series_name, season=season_num, episode=episode_num), best_listitem, False)
+            if best_only:
+                idents.append(best['ident'])
+                continue
         
-        # Nyní přidáme všechny soubory této epizody seřazené podle preferované přípony a velikosti
+        # Nyní přidáme všechny soubory této epizody seřazené podle skóre
         for episode in episode_list_sorted:
             #episode_size_mb = round(float(episode['size']) / (1024 * 1024), 2)
             #episode_file_name = f"Epizoda {episode_num} - {episode['name']} [{episode_size_mb} MB]"
-            episode_file_name = f"Epizoda {episode_num} - {episode['name']}"
+            meta = metas.get(episode['ident'])
+            episode_file_name = f"Epizoda {episode_num} - {episode['name']}" + file_meta.label_suffix(meta)
+            idents.append(episode['ident'])
             
             # Vytvoříme položku pro každý soubor epizody
             file_listitem = xbmcgui.ListItem(label=episode_file_name)
-            file_listitem.setInfo('video', { 'size': int(episode['size'])})
-            file_listitem.setArt({'icon': 'DefaultVideo.png'})
+            name, info, images = episode_info(episode_num, episode_file_name)
+            info['size'] = int(episode['size'])
+            if episode['ident'] in watched:
+                info['playcount'] = 1
+            file_listitem.setInfo('video', info)
+            file_meta.apply(file_listitem, meta)
+            file_listitem.setArt(images)
             file_listitem.setProperty('IsPlayable', 'true')
 
             # URL pro otevření detailu
@@ -458,7 +859,7 @@ def create_episodes_menu(series_manager, handle, series_name, season_num):
             file_listitem.addContextMenuItems(context_menu)
 
             # Generování URL pro přehrání souboru
-            file_url = get_url(action='play', ident=episode['ident'], name=episode['name'])
+            file_url = get_url(action='play', ident=episode['ident'], name=episode['name'], series_name=series_name, season=season_num, episode=episode_num)
 
             # Přidání souboru do menu pod epizodou
             xbmcplugin.addDirectoryItem(handle, file_url, file_listitem, False)
@@ -466,9 +867,14 @@ def create_episodes_menu(series_manager, handle, series_name, season_num):
     xbmcplugin.setContent(handle, 'episodes')  # nebo 'videos'
 
     xbmcplugin.endOfDirectory(handle)
+    return idents
 
 # Funkce pro získání typu souboru podle přípony
 def get_file_type(file_name):
     """Vrátí typ souboru podle přípony (např. 'mkv', 'mp4')"""
     _, extension = os.path.splitext(file_name)  # Získá příponu souboru
-    return extension.lower().strip('.')  # Vrátí příponu bez tečky a v malých písmenkách
\ No newline at end of file
+    return extension.lower().strip('.')  # Vrátí příponu bez tečky a v malých písmenkách
+
+def sort_episode_files(files):
+    """Seřadí soubory epizody podle uloženého skóre a velikosti (nejlepší první)"""
+    return sorted(files, key=lambda x: (-x.get('score', 0), -float(x.get('size') or 0)))
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# Module: service
+# Author: user extension
+# Created on: 19.10.2026
+# License: AGPL v.3 https://www.gnu.org/licenses/agpl-3.0.html
+
+import os
+import xbmc
+import xbmcaddon
+import download_queue
+import api_scheduler
+
+try:
+    from urllib import urlencode
+except ImportError:
+    from urllib.parse import urlencode
+
+try:
+    from xbmc import translatePath
+except ImportError:
+    from xbmcvfs import translatePath
+
+_addon = xbmcaddon.Addon()
+_profile = translatePath(_addon.getAddonInfo('profile'))
+try:
+    _profile = _profile.decode("utf-8")
+except:
+    pass
+
+def plugin_url(**kwargs):
+    return 'plugin://{0}/?{1}'.format(_addon.getAddonInfo('id'), urlencode(kwargs, 'utf-8'))
+
+def resume_downloads():
+    """Po startu Kodi pokračuje ve frontě stahování přerušené restartem"""
+    dq = download_queue.DownloadQueue(_profile)
+    if dq.has_pending() and not dq.is_running():
+        xbmc.executebuiltin('RunPlugin(' + plugin_url(action='dqueue_run') + ')')
+
+if __name__ == '__main__':
+    # počítadla API platí od startu Kodi
+    api_scheduler.reset_stats(os.path.join(_profile, api_scheduler.STATS_FILE))
+    monitor = xbmc.Monitor()
+    # chvíli počkáme, než Kodi dokončí start (síť, přihlášení profilu)
+    if not monitor.waitForAbort(10):
+        resume_downloads()
@@ -1,10 +1,10 @@
-import requests
 import xbmc
 import xbmcgui
 import re
 import io
 import os
 import json
+import tmdb_helper
 
 FOLDER_NAME = "series_db_tmdb"
 
@@ -45,11 +45,13 @@ class TMDB:
             "include_adult": "false"
         }
 
-        response = requests.get(url, params=params)
-        if response.status_code != 200:
+        try:
+            data = tmdb_helper.tmdb_get(url, params)
+        except Exception as e:
+            xbmc.log(f"Chyba při hledání seriálu na TMDb: {e}", xbmc.LOGERROR)
+            return None
+        if data is None:
             return None
-
-        data = response.json()
         #xbmc.log(f"get_series_info: {data}", xbmc.LOGINFO)
         return data.get("results", [])
 
@@ -61,11 +63,13 @@ class TMDB:
             "language": self.LANG
         }
 
-        response = requests.get(url, params=params)
-        if response.status_code != 200:
-            xbmc.log(f"Chyba při načítání detailu seriálu (status {response.status_code})", xbmc.LOGERROR)
+        try:
+            data = tmdb_helper.tmdb_get(url, params)
+        except Exception as e:
+            xbmc.log(f"Chyba při načítání detailu seriálu ({e})", xbmc.LOGERROR)
+            return None
+        if data is None:
             return None
-        data = response.json()
         #return data
         #xbmc.log(f"get_series_details: {data}", xbmc.LOGINFO)
         return data.get("seasons")
@@ -78,12 +82,13 @@ class TMDB:
             "language": self.LANG
         }
 
-        response = requests.get(url, params=params)
-        if response.status_code != 200:
-            xbmc.log(f"Chyba při načítání sezóny {season_number} (status {response.status_code})", xbmc.LOGERROR)
+        try:
+            data = tmdb_helper.tmdb_get(url, params)
+        except Exception as e:
+            xbmc.log(f"Chyba při načítání sezóny {season_number} ({e})", xbmc.LOGERROR)
+            return []
+        if data is None:
             return []
-
-        data = response.json()
         #return data
         #xbmc.log(f"get_season_episodes: {data}", xbmc.LOGINFO)
         return data.get('episodes', [])
@@ -109,14 +114,18 @@ class TMDB:
         return results[selected_index]
 
     def build_tmdb_series_structure(self, selected, seasons):
+        """Kostra seriálu z TMDb: série a epizody podle čísel, s názvy, popisy a náhledy"""
         series_data = {
             "name": selected.get("name", "Unknown"),
             "original_name": selected.get("original_name", "Unknown"),
             "id": selected["id"],
+            "overview": selected.get("overview", ""),
+            "poster": selected.get("poster_path"),
+            "first_air_date": selected.get("first_air_date", ""),
             "seasons": {}
         }
 
-        for season in seasons:
+        for season in seasons or []:
             season_number = season.get("season_number")
             season_name = season.get("name", f"Sezóna {season_number}")
             if season_number == 0:
@@ -127,12 +136,27 @@ class TMDB:
             if not episodes:
                 continue
 
-            season_dict = {}
+            season_dict = {
+                "name": season_name,
+                "overview": season.get("overview", ""),
+                "air_date": season.get("air_date", ""),
+                "poster": season.get("poster_path"),
+                "episodes": {}
+            }
             for ep in episodes:
-                ep_name = ep.get("name", f"Epizoda {ep.get('episode_number')}")
-                season_dict[ep_name] = {}  # zatím prázdné – sem později dáme streamy
-
-            series_data["seasons"][season_name] = season_dict
+                ep_number = ep.get("episode_number")
+                if ep_number is None:
+                    continue
+                # streamy se k epizodám přiřadí podle (série, epizoda) - viz SeriesManager.search_series
+                season_dict["episodes"][str(ep_number)] = {
+                    "name": ep.get("name", f"Epizoda {ep_number}"),
+                    "overview": ep.get("overview", ""),
+                    "air_date": ep.get("air_date", ""),
+                    "still": ep.get("still_path"),
+                    "rating": ep.get("vote_average")
+                }
+
+            series_data["seasons"][str(season_number)] = season_dict
 
         return series_data
 
@@ -2,6 +2,17 @@ import requests
 import xbmcgui
 import xbmc
 import os
+import json
+import time
+import sqlite3
+import artwork
+import circuit_breaker
+
+MOVIE_CACHE = 'tmdb_movies.sqlite'
+MOVIE_TTL = 30 * 86400          # platnost nalezených metadat
+MOVIE_MISSING_TTL = 7 * 86400   # jak dlouho si pamatujeme, že film na TMDb není
+TMDB_TIMEOUT = (3, 5)           # (spojení, čtení)
+MOVIE_FIELDS = ['id', 'title', 'original_title', 'overview', 'release_date', 'poster_path', 'backdrop_path', 'vote_average', 'genres']
 
 class TMDbHelper:
     def __init__(self, addon):
@@ -10,34 +21,52 @@ class TMDbHelper:
         self.LANG = addon.getSetting('tmdb_lang') or 'cs-CZ'
         self.BASE_URL = "https://api.themoviedb.org/3"
         
-    def search_movie(self, title):
-        url = f"{self.BASE_URL}/search/movie"
+    def _get(self, path, params):
+        """GET na TMDb API; chyby sítě, rozpojený jistič a HTTP stavy kromě 404 propadají volajícímu"""
+        params = dict(params, api_key=self.API_TOKEN)
+        return tmdb_get(f"{self.BASE_URL}{path}", params)
+
+    def _search_params(self, title, year=None):
         params = {
-            "api_key": self.API_TOKEN,
             "query": title,
             "language": self.LANG,
             "include_adult": "false"
         }
-        
-        response = requests.get(url, params=params)
-        if response.status_code == 200:
-            data = response.json()
-            return data.get("results", [])
+        if year:
+            params["primary_release_year"] = year
+        return params
+
+    def search_movie(self, title, year=None):
+        try:
+            data = self._get("/search/movie", self._search_params(title, year))
+            return data.get("results", []) if data else []
+        except Exception as e:
+            xbmc.log(str(e), xbmc.LOGERROR)
         return []
 
     def get_movie_details(self, movie_id):
-        url = f"{self.BASE_URL}/movie/{movie_id}"
-        params = {
-            "api_key": self.API_TOKEN,
-            "language": self.LANG
-        }
-        
-        response = requests.get(url, params=params)
-        if response.status_code == 200:
-            return response.json()
+        try:
+            return self._get(f"/movie/{movie_id}", {"language": self.LANG})
+        except Exception as e:
+            xbmc.log(str(e), xbmc.LOGERROR)
         return None
 
-    def enrich_listitem(self, listitem, metadata):
+    def lookup_movie(self, title, year=None):
+        """Vyhledá film (s rokem, případně bez něj) a vrátí detail prvního výsledku nebo None.
+
+        Na rozdíl od search_movie chyby nepolyká, aby se výpadek API neuložil jako "film neexistuje".
+        """
+        data = self._get("/search/movie", self._search_params(title, year))
+        results = data.get("results", []) if data else []
+        if not results and year:
+            # rok v názvu souboru nemusí sedět s premiérou - zkusíme ještě bez něj
+            data = self._get("/search/movie", self._search_params(title))
+            results = data.get("results", []) if data else []
+        if not results:
+            return None
+        return self._get(f"/movie/{results[0]['id']}", {"language": self.LANG})
+
+    def enrich_listitem(self, listitem, metadata, view='detail', art=None):
         if not metadata:
             return listitem
             
@@ -47,9 +76,7 @@ class TMDbHelper:
         listitem.setLabel(title)
         
         # Add poster
-        if metadata.get('poster_path'):
-            poster_url = f"https://image.tmdb.org/t/p/w500{metadata['poster_path']}"
-            listitem.setArt({'poster': poster_url, 'thumb': poster_url})
+        listitem.setArt(movie_art(metadata, view, art))
             
         # Add plot and year
         info = {
@@ -61,3 +88,87 @@ class TMDbHelper:
         listitem.setInfo('video', info)
         
         return listitem
+
+class MovieCache:
+    """Perzistentní cache TMDb detailů filmů podle normalizovaného názvu a roku"""
+
+    def __init__(self, profile):
+        self.conn = None
+        try:
+            if not os.path.exists(profile):
+                os.makedirs(profile)
+            self.conn = sqlite3.connect(os.path.join(profile, MOVIE_CACHE), timeout=10)
+            self.conn.execute('CREATE TABLE IF NOT EXISTS movies (key TEXT PRIMARY KEY, meta TEXT, fetched INTEGER)')
+            self.conn.commit()
+        except Exception as e:
+            xbmc.log(f'WebshareCinema: Error opening TMDb cache: {str(e)}', level=xbmc.LOGERROR)
+            self.conn = None
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def get_many(self, keys):
+        """key -> metadata (dict, nebo None pro film, který na TMDb není); chybějící klíče vynechá"""
+        if self.conn is None or not keys:
+            return {}
+        result = {}
+        now = time.time()
+        keys = list(keys)
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            cursor = self.conn.execute('SELECT key, meta, fetched FROM movies WHERE key IN (%s)' % ','.join('?' * len(chunk)), chunk)
+            for key, meta, fetched in cursor:
+                if meta is None and now - fetched < MOVIE_MISSING_TTL:
+                    result[key] = None
+                elif meta is not None and now - fetched < MOVIE_TTL:
+                    result[key] = json.loads(meta)
+        return result
+
+    def put(self, key, meta):
+        if self.conn is None:
+            return
+        if meta is not None:
+            meta = json.dumps({k: meta[k] for k in MOVIE_FIELDS if k in meta})
+        self.conn.execute('INSERT OR REPLACE INTO movies (key, meta, fetched) VALUES (?, ?, ?)', (key, meta, int(time.time())))
+        self.conn.commit()
+
+def movie_key(title, year):
+    """Klíč do MovieCache z normalizovaného názvu a roku"""
+    return title + '|' + (str(year) if year else '')
+
+def movie_art(metadata, view='list', art=None):
+    """Slovník obrázků pro ListItem.setArt; s ArtworkCache se použijí lokální kopie, pokud existují"""
+    result = {}
+    poster = artwork.tmdb_url(metadata.get('poster_path'), view)
+    if poster:
+        poster = art.resolve(poster) if art is not None else poster
+        result['poster'] = poster
+        result['thumb'] = poster
+    fanart = artwork.tmdb_url(metadata.get('backdrop_path'), 'fanart')
+    if fanart:
+        result['fanart'] = fanart
+    return result
+
+_breaker = circuit_breaker.Breaker('tmdb')
+
+def tmdb_get(url, params, timeout=TMDB_TIMEOUT):
+    """GET na TMDb přes jistič: při opakovaných výpadcích hned vyhodí BreakerOpen.
+
+    Vrací JSON odpovědi, None pro 404; ostatní chybové stavy vyhodí výjimku.
+    """
+    _breaker.check()
+    try:
+        response = requests.get(url, params=params, timeout=timeout)
+    except Exception:
+        _breaker.failure()
+        raise
+    if response.status_code == 429 or response.status_code >= 500:
+        _breaker.failure()
+    else:
+        _breaker.success()
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return response.json()
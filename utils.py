@@ -1,4 +1,7 @@
 import re
+import unidecode
+
+_TOKEN_SPLIT = re.compile(r'[^a-z0-9]+')
 
 EPISODE_PATTERNS = [
     r'[sS](\d+)[eE](\d+)',  # S01E01, s01e01
@@ -29,3 +32,11 @@ def save_token_info(token, expiry):
     addon = xbmcaddon.Addon()
     addon.setSetting("webshare_token", token)
     addon.setSetting("webshare_token_expiry", expiry)
+
+def normalize_text(text):
+    """Lowercase and strip diacritics (Příběh -> pribeh)"""
+    return unidecode.unidecode(text or '').lower()
+
+def tokenize(text, min_length=1):
+    """Split text into normalized search tokens"""
+    return [t for t in _TOKEN_SPLIT.split(normalize_text(text)) if len(t) >= min_length]
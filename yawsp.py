@@ -20,10 +20,27 @@ import traceback
 import json
 import unidecode
 import re
-import zipfile
 import uuid
+import time
 import series_manager
 import themoviedb
+import tmdb_helper
+import artwork
+import csfd_integration
+import api_scheduler
+import circuit_breaker
+from api_scheduler import INTERACTIVE, BACKGROUND
+import downloader
+import download_queue
+import backup_db
+import catalog
+import link_cache
+import file_meta
+import listing_cache
+import account_mirror
+import release_parser
+import utils
+from concurrent.futures import ThreadPoolExecutor, wait
 
 try:
     from urllib import urlencode
@@ -42,11 +59,19 @@ API = BASE + '/api/'
 UA = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/81.0.4044.138 Safari/537.36"
 HEADERS = {'User-Agent': UA, 'Referer':BASE}
 REALM = ':Webshare:'
+QUEUED_MARK = ' [ve frontě]'
 CATEGORIES = ['','video','images','audio','archives','docs','adult']
 SORTS = ['','recent','rating','largest','smallest']
 SEARCH_HISTORY = 'search_history'
+LOGIN_CACHE = 'login_cache.json'
 NONE_WHAT = '%#NONE#%'
 BACKUP_DB = 'D1iIcURxlR'
+# výsledek db_update()
+DB_UPDATED = 'updated'
+DB_CURRENT = 'current'
+DB_FAILED = 'failed'
+ANNOTATE_WORKERS = 4
+CLEAR_HISTORY_BATCH = 100    # kolik download_id poslat v jednom clear_history
 
 _url = sys.argv[0]
 _handle = int(sys.argv[1])
@@ -58,13 +83,51 @@ try:
     _profile = _profile.decode("utf-8")
 except:
     pass
+_artwork = None
 
 def get_url(**kwargs):
     return '{0}?{1}'.format(_url, urlencode(kwargs, 'utf-8'))
 
-def api(fnct, data):
-    response = _session.post(API + fnct + "/", data=data)
-    return response
+# Časové limity (spojení, čtení) podle endpointu; výpis nesmí čekat až na watchdog Kodi
+API_TIMEOUTS = {
+    'search': (5, 15),
+    'file_link': (5, 10),
+    'file_info': (5, 10),
+    'queue': (5, 10),
+    'history': (5, 10)
+}
+API_TIMEOUT = (5, 10)
+UNAVAILABLE = (requests.RequestException, circuit_breaker.BreakerOpen)
+
+_breaker = circuit_breaker.Breaker('webshare')
+
+def _send(fnct, data):
+    # chyby jističi hlásí plánovač, jednou za volání po všech opakováních
+    _breaker.check()
+    return _session.post(API + fnct + "/", data=data, timeout=API_TIMEOUTS.get(fnct, API_TIMEOUT))
+
+def _accepted(response):
+    """Odpověď API se statusem OK"""
+    try:
+        return ET.fromstring(response.content).find('status').text == 'OK'
+    except (ET.ParseError, AttributeError):
+        return False
+
+def _setting_number(name, default):
+    try:
+        return float(_addon.getSetting(name) or default)
+    except ValueError:
+        return default
+
+_scheduler = api_scheduler.Scheduler(_send, rate=_setting_number('api_rate', api_scheduler.DEFAULT_RATE),
+                                     concurrency=int(_setting_number('api_concurrency', api_scheduler.DEFAULT_CONCURRENCY)),
+                                     fatal=(circuit_breaker.BreakerOpen, requests.Timeout),
+                                     stats_path=os.path.join(_profile, api_scheduler.STATS_FILE),
+                                     breaker=_breaker, accept=_accepted)
+
+def api(fnct, data, priority=INTERACTIVE):
+    """Volání API Webshare přes společný plánovač (limit rychlosti, priorita, opakování)"""
+    return _scheduler.call(fnct, data, priority)
 
 def is_ok(xml):
     status = xml.find('status').text
@@ -73,6 +136,50 @@ def is_ok(xml):
 def popinfo(message, heading=_addon.getAddonInfo('name'), icon=xbmcgui.NOTIFICATION_INFO, time=3000, sound=False): #NOTIFICATION_WARNING NOTIFICATION_ERROR
     xbmcgui.Dialog().notification(heading, message, icon, time, sound=sound)
 
+def derive_credentials(username, password, salt):
+    """Heslo a digest pro API login z hesla a soli účtu"""
+    encrypted_pass = hashlib.sha1(md5crypt(password.encode('utf-8'), salt.encode('utf-8')).encode('utf-8')).hexdigest()
+    pass_digest = hashlib.md5(username.encode('utf-8') + REALM.encode('utf-8') + encrypted_pass.encode('utf-8')).hexdigest()
+    return encrypted_pass, pass_digest
+
+def credentials_key(username, password):
+    return hashlib.sha256((username + '\0' + password).encode('utf-8')).hexdigest()
+
+def load_credentials(username, password):
+    """Uložené odvozené heslo a digest, pokud patří k aktuálnímu jménu a heslu z nastavení"""
+    try:
+        with io.open(os.path.join(_profile, LOGIN_CACHE), 'r', encoding='utf8') as file:
+            cached = json.loads(file.read())
+    except Exception:
+        return None
+    if cached.get('key') != credentials_key(username, password):
+        return None
+    return cached
+
+def store_credentials(username, password, salt, encrypted_pass, pass_digest):
+    path = os.path.join(_profile, LOGIN_CACHE)
+    try:
+        if not os.path.exists(_profile):
+            os.makedirs(_profile)
+        try:
+            data = json.dumps({'key': credentials_key(username, password), 'salt': salt, 'password': encrypted_pass, 'digest': pass_digest}).decode('utf8')
+        except AttributeError:
+            data = json.dumps({'key': credentials_key(username, password), 'salt': salt, 'password': encrypted_pass, 'digest': pass_digest})
+        with io.open(path + '.tmp', 'w', encoding='utf8') as file:
+            file.write(data)
+        os.replace(path + '.tmp', path)
+    except Exception as e:
+        traceback.print_exc()
+
+def login_call(username, encrypted_pass, pass_digest):
+    response = api('login', {'username_or_email': username, 'password': encrypted_pass, 'digest': pass_digest, 'keep_logged_in': 1})
+    xml = ET.fromstring(response.content)
+    if is_ok(xml):
+        token = xml.find('token').text
+        _addon.setSetting('token', token)
+        return token
+    return None
+
 def login():
     username = _addon.getSetting('wsuser')
     password = _addon.getSetting('wspass')
@@ -80,21 +187,20 @@ def login():
         popinfo(_addon.getLocalizedString(30101), sound=True)
         _addon.openSettings()
         return
+    # odvozené heslo pro známou sůl - opětovné přihlášení je jediné volání API bez hashování
+    cached = load_credentials(username, password)
+    if cached:
+        token = login_call(username, cached['password'], cached['digest'])
+        if token:
+            return token
     response = api('salt', {'username_or_email': username})
     xml = ET.fromstring(response.content)
     if is_ok(xml):
         salt = xml.find('salt').text
-        try:
-            encrypted_pass = hashlib.sha1(md5crypt(password.encode('utf-8'), salt.encode('utf-8'))).hexdigest()
-            pass_digest = hashlib.md5(username.encode('utf-8') + REALM + encrypted_pass.encode('utf-8')).hexdigest()
-        except TypeError:
-            encrypted_pass = hashlib.sha1(md5crypt(password.encode('utf-8'), salt.encode('utf-8')).encode('utf-8')).hexdigest()
-            pass_digest = hashlib.md5(username.encode('utf-8') + REALM.encode('utf-8') + encrypted_pass.encode('utf-8')).hexdigest()
-        response = api('login', {'username_or_email': username, 'password': encrypted_pass, 'digest': pass_digest, 'keep_logged_in': 1})
-        xml = ET.fromstring(response.content)
-        if is_ok(xml):
-            token = xml.find('token').text
-            _addon.setSetting('token', token)
+        encrypted_pass, pass_digest = derive_credentials(username, password, salt)
+        token = login_call(username, encrypted_pass, pass_digest)
+        if token:
+            store_credentials(username, password, salt, encrypted_pass, pass_digest)
             return token
         else:
             popinfo(_addon.getLocalizedString(30102), icon=xbmcgui.NOTIFICATION_ERROR, sound=True)
@@ -109,7 +215,11 @@ def revalidate():
         if login():
             return revalidate()
     else:
-        response = api('user_data', { 'wst': token })
+        try:
+            response = api('user_data', { 'wst': token })
+        except UNAVAILABLE:
+            # bez spojení nemá smysl se přihlašovat znovu - zkusíme uložený token
+            return token
         xml = ET.fromstring(response.content)
         status = xml.find('status').text
         if is_ok(xml):
@@ -165,21 +275,144 @@ def labelize(file):
     label = file['name'] + ' (' + size + ')'
     return label
     
-def tolistitem(file, addcommands=[]):
-    label = labelize(file)
+def tolistitem(file, addcommands=[], meta=None, marks=None):
+    label = labelize(file) + file_meta.label_suffix(meta)
+    if marks is not None and file['ident'] in marks.queued:
+        label += QUEUED_MARK
     listitem = xbmcgui.ListItem(label=label)
+    file_meta.apply(listitem, meta)
     if 'img' in file:
-        listitem.setArt({'thumb': file['img']})
-    listitem.setInfo('video', {'title': label})
+        listitem.setArt({'thumb': artwork_cache().resolve(file['img'])})
+    info = {'title': label}
+    if marks is not None and file['ident'] in marks.watched:
+        info['playcount'] = 1
+    listitem.setInfo('video', info)
     listitem.setProperty('IsPlayable', 'true')
     commands = []
     commands.append(( _addon.getLocalizedString(30211), 'RunPlugin(' + get_url(action='info',ident=file['ident']) + ')'))
-    commands.append(( _addon.getLocalizedString(30212), 'RunPlugin(' + get_url(action='download',ident=file['ident']) + ')'))
+    commands.append(( _addon.getLocalizedString(30212), 'RunPlugin(' + get_url(action='download',ident=file['ident'],name=file['name']) + ')'))
     if addcommands:
         commands = commands + addcommands
     listitem.addContextMenuItems(commands)
     return listitem
 
+def file_summaries(items):
+    """Uložené souhrny file_info pro položky výpisu (bez volání API)"""
+    store = file_meta.FileMetaStore(_profile)
+    try:
+        return store.summaries([item['ident'] for item in items])
+    finally:
+        store.close()
+
+def artwork_cache():
+    global _artwork
+    if _artwork is None:
+        _artwork = artwork.from_settings(_addon, _profile)
+    return _artwork
+
+def prefetch_thumbs(items):
+    """Po vykreslení stáhne náhledy Webshare do lokální cache pro další otevření výpisu"""
+    artwork_cache().prefetch([item.get('img') for item in items], xbmc.Monitor())
+
+def annotate(idents, token):
+    """Po vykreslení výpisu načte file_info pro soubory bez uložených metadat.
+
+    Běží jen se zapnutým nastavením 'annotate'; anotace se zobrazí při dalším otevření výpisu.
+    """
+    if 'true' != _addon.getSetting('annotate') or not idents or not token:
+        return
+    store = file_meta.FileMetaStore(_profile)
+    try:
+        known = store.fresh(idents)
+    finally:
+        store.close()
+    missing = [ident for ident in dict.fromkeys(idents) if ident not in known]
+    if not missing:
+        return
+    def fetch(ident):
+        try:
+            getinfo(ident, token, notify=False, priority=BACKGROUND)
+        except Exception:
+            traceback.print_exc()
+    with ThreadPoolExecutor(max_workers=ANNOTATE_WORKERS) as executor:
+        list(executor.map(fetch, missing))
+
+def listing(key, fetch):
+    """Data výpisu z API, nebo uložený snímek, když Webshare neodpovídá včas (viz listing_cache.load)"""
+    data, snapshot, pending = listing_cache.load(_profile, key, fetch)
+    if snapshot is not None:
+        popinfo('Webshare neodpovídá, zobrazuji uložený výpis', icon=xbmcgui.NOTIFICATION_WARNING)
+    return data, snapshot, pending
+
+def stale_item(snapshot, url):
+    """První položka výpisu ze snímku: čas uložení, kliknutím se výpis zkusí načíst znovu"""
+    listitem = xbmcgui.ListItem(label='[COLOR orange]Offline - uloženo ' + time.strftime('%d.%m. %H:%M', time.localtime(snapshot)) + '[/COLOR]')
+    listitem.setArt({'icon': 'DefaultIconWarning.png'})
+    xbmcplugin.addDirectoryItem(_handle, url, listitem, True)
+
+def refresh_listing(key, pending, url):
+    """Po vykreslení snímku počká na jediný dotaz na pozadí a výpis jednou obnoví, pokud je pořád otevřený.
+
+    Bez klíče (zrcadlo účtu) ukládá výsledek už dotaz sám.
+    """
+    path = _url + sys.argv[2]
+    def showing():
+        return xbmc.getInfoLabel('Container.FolderPath') == path
+    monitor = xbmc.Monitor()
+    if key is None:
+        refreshed = bool(listing_cache.settle(pending, showing, monitor))
+    else:
+        refreshed = listing_cache.revalidate(_profile, key, pending, showing, monitor)
+    if refreshed:
+        # čistá adresa výpisu - Container.Refresh by zopakoval i akci z parametrů (toqueue, dequeue...)
+        xbmc.executebuiltin('Container.Update(' + url + ',replace)')
+
+def account_syncer(kind, token):
+    """Funkce, která synchronizuje zrcadlo fronty/historie; vrací False při chybové odpovědi API"""
+    def fetch_page(offset, limit):
+        xml = ET.fromstring(api(kind, {'wst': token, 'offset': offset, 'limit': limit}).content)
+        if not is_ok(xml):
+            return None
+        try:
+            total = int(xml.find('total').text)
+        except (AttributeError, TypeError, ValueError):
+            total = None
+        return [todict(file) for file in xml.iter('file')], total
+    def sync():
+        mirror = account_mirror.AccountMirror(_profile)
+        try:
+            return mirror.sync(kind, fetch_page)
+        finally:
+            mirror.close()
+    return sync
+
+def account_sync(kind, token):
+    """Synchronizuje zrcadlo fronty/historie ('queue'/'history') s časovým limitem jako listing().
+
+    Vrací (snapshot, pending): snapshot je čas poslední synchronizace, pokud výpis ukáže zrcadlo bez
+    čerstvých dat, pending je běžící synchronizace pro refresh_listing().
+    """
+    sync = account_syncer(kind, token)
+    mirror = account_mirror.AccountMirror(_profile)
+    try:
+        synced = mirror.synced(kind)
+    finally:
+        mirror.close()
+    if time.time() - synced < account_mirror.SYNC_INTERVAL:
+        return None, None
+    future = listing_cache.start(sync)
+    wait([future], listing_cache.FETCH_BUDGET)
+    if synced and (not future.done() or future.exception() is not None):
+        popinfo('Webshare neodpovídá, zobrazuji uložený výpis', icon=xbmcgui.NOTIFICATION_WARNING)
+        return synced, future
+    if not future.result():
+        popinfo(_addon.getLocalizedString(30107), icon=xbmcgui.NOTIFICATION_WARNING)
+    return None, None
+
+def account_marks():
+    """Značky přehraných souborů a souborů ve frontě ze zrcadla účtu (bez volání API)"""
+    return account_mirror.marks(_profile)
+
 def ask(what):
     if what is None:
         what = ''
@@ -201,88 +434,164 @@ def is_episode(filename):
             return True
     return False
 
+def movie_groups(xml):
+    """Filmové soubory z odpovědi search seskupené podle normalizovaného názvu a roku"""
+    seen = [todict(file) for file in xml.iter('file')]
+    catalog.remember(_profile, seen)
+    # Více verzí stejného filmu sloučíme do jedné položky
+    groups = {}
+    for file in seen:
+        if is_episode(file['name']):
+            continue
+        release = release_parser.parse(file['name'])
+        key = tmdb_helper.movie_key(' '.join(utils.tokenize(release['title'])), release['year'])
+        if key not in groups:
+            groups[key] = {'title': release['title'], 'year': release['year'], 'files': []}
+        groups[key]['files'].append(file)
+    return groups
+
 def movies(params):
     xbmcplugin.setPluginCategory(_handle, _addon.getAddonInfo('name') + " \\ Filmy")
     token = revalidate()
-    # --- TMDb minimal helper pro filmy ---
-    class TMDbMovieHelper:
-        def __init__(self, addon):
-            self.API_TOKEN = addon.getSetting('tmdb_token')
-            self.LANG = addon.getSetting('tmdb_lang') or 'cs-CZ'
-            self.BASE_URL = "https://api.themoviedb.org/3"
-        def search(self, query):
-            url = f"{self.BASE_URL}/search/movie"
-            params = {
-                "api_key": self.API_TOKEN,
-                "query": query,
-                "language": self.LANG,
-                "include_adult": "false"
-            }
-            try:
-                resp = requests.get(url, params=params, timeout=5)
-                if resp.status_code == 200:
-                    return resp.json().get("results", [])
-            except Exception as e:
-                xbmc.log(str(e), xbmc.LOGERROR)
-            return []
-        def details(self, movie_id):
-            url = f"{self.BASE_URL}/movie/{movie_id}"
-            params = {
-                "api_key": self.API_TOKEN,
-                "language": self.LANG
-            }
-            try:
-                resp = requests.get(url, params=params, timeout=5)
-                if resp.status_code == 200:
-                    return resp.json()
-            except Exception as e:
-                xbmc.log(str(e), xbmc.LOGERROR)
-            return None
-
-    tmdb = TMDbMovieHelper(_addon)
+    limit = int(params['limit']) if 'limit' in params else int(_addon.getSetting('slimit'))
+    offset = int(params['offset']) if 'offset' in params else 0
     response = api('search', {
         'category': 'video',
         'sort': 'recent',
-        'limit': 100,
-        'offset': 0,
+        'limit': limit,
+        'offset': offset,
         'wst': token,
         'maybe_removed': 'true'
     })
     xml = ET.fromstring(response.content)
-    files = []
-    for file in xml.iter('file'):
-        item = todict(file)
-        if not is_episode(item['name']):
-            files.append(item)
-    for file in files:
-        title = file['name']
-        movie_title = re.sub(r'\.(mp4|mkv|avi|mov)$', '', title, flags=re.IGNORECASE)
-        movie_title = re.sub(r'[\.\_\-\[\]\(\)]', ' ', movie_title)
-        movie_title = re.sub(r'\s+', ' ', movie_title).strip()
-        movie_results = tmdb.search(movie_title)
-        movie_meta = tmdb.details(movie_results[0]['id']) if movie_results else None
-        listitem = xbmcgui.ListItem(label=movie_title)
-        if movie_meta:
-            if movie_meta.get('poster_path'):
-                poster_url = f"https://image.tmdb.org/t/p/w500{movie_meta['poster_path']}"
-                listitem.setArt({'poster': poster_url, 'thumb': poster_url})
-            info = {
-                'title': movie_meta.get('title', movie_title),
-                'originaltitle': movie_meta.get('original_title', ''),
-                'plot': movie_meta.get('overview', ''),
-                'year': movie_meta.get('release_date', '')[:4] if movie_meta.get('release_date') else None
-            }
-            listitem.setInfo('video', info)
-        listitem.setProperty('IsPlayable', 'true')
-        xbmcplugin.addDirectoryItem(
-            _handle,
-            get_url(action='play', ident=file['ident'], name=file['name']),
-            listitem,
-            False
-        )
-    xbmcplugin.setContent(_handle, 'movies')
-    xbmcplugin.endOfDirectory(_handle)
-    
+    if not is_ok(xml):
+        popinfo(_addon.getLocalizedString(30107), icon=xbmcgui.NOTIFICATION_WARNING)
+        xbmcplugin.endOfDirectory(_handle)
+        return
+
+    if offset > 0: #prev page
+        listitem = xbmcgui.ListItem(label=_addon.getLocalizedString(30206))
+        listitem.setArt({'icon': 'DefaultAddonsSearch.png'})
+        xbmcplugin.addDirectoryItem(_handle, get_url(action='movies', limit=limit, offset=offset - limit if offset > limit else 0), listitem, True)
+
+    groups = movie_groups(xml)
+
+    # Stránka se vykreslí hned z uložených metadat, chybějící se doplní až po endOfDirectory
+    cache = tmdb_helper.MovieCache(_profile)
+    try:
+        cached = cache.get_many(groups.keys())
+        art = artwork_cache()
+        use_csfd = 'true' == _addon.getSetting('csfd')
+        ratings = csfd_integration.csfd_cached([g['title'] for g in groups.values()], _profile) if use_csfd else {}
+        profile = release_parser.SETTING_PROFILES.get(_addon.getSetting('stream_profile'), release_parser.DEFAULT_PROFILE)
+        for key, group in groups.items():
+            movie_title = group['title']
+            streams = release_parser.rank(group['files'], profile)
+            movie_meta = cached.get(key)
+            label = movie_title + (f" ({group['year']})" if group['year'] else '')
+            if len(streams) > 1:
+                label += f" [{len(streams)} verzí]"
+            listitem = xbmcgui.ListItem(label=label)
+            info = {}
+            if movie_meta:
+                listitem.setArt(tmdb_helper.movie_art(movie_meta, 'list', art))
+                info = {
+                    'title': movie_meta.get('title', movie_title),
+                    'originaltitle': movie_meta.get('original_title', ''),
+                    'plot': movie_meta.get('overview', ''),
+                    'year': movie_meta.get('release_date', '')[:4] if movie_meta.get('release_date') else None
+                }
+            csfd_integration.merge_info(info, ratings.get(movie_title))
+            if info:
+                listitem.setInfo('video', info)
+            listitem.setProperty('IsPlayable', 'true')
+            xbmcplugin.addDirectoryItem(
+                _handle,
+                get_url(action='movie_play', idents=','.join(f['ident'] for f in streams), name=movie_title),
+                listitem,
+                False
+            )
+
+        try:
+            total = int(xml.find('total').text)
+        except:
+            total = 0
+        if offset + limit < total: #next page
+            listitem = xbmcgui.ListItem(label=_addon.getLocalizedString(30207))
+            listitem.setArt({'icon': 'DefaultAddonsSearch.png'})
+            xbmcplugin.addDirectoryItem(_handle, get_url(action='movies', limit=limit, offset=offset+limit), listitem, True)
+        xbmcplugin.setContent(_handle, 'movies')
+        xbmcplugin.endOfDirectory(_handle)
+
+        missing = [(key, groups[key]) for key in groups if key not in cached]
+        enrich_movies(cache, missing)
+        if offset + limit < total and (art.enabled or use_csfd or _addon.getSetting('tmdb_token')):
+            # další stránku připravíme dopředu, aby se při listování nečekalo na metadata a plakáty
+            try:
+                response = api('search', {
+                    'category': 'video',
+                    'sort': 'recent',
+                    'limit': limit,
+                    'offset': offset + limit,
+                    'wst': token,
+                    'maybe_removed': 'true'
+                }, BACKGROUND)
+                upcoming = ET.fromstring(response.content)
+            except UNAVAILABLE:
+                # výpis už je vykreslený, předběžné načtení se jen vynechá
+                traceback.print_exc()
+                upcoming = None
+            if upcoming is not None and is_ok(upcoming):
+                next_groups = movie_groups(upcoming)
+                known = cache.get_many(next_groups.keys())
+                enrich_movies(cache, [(key, next_groups[key]) for key in next_groups if key not in known])
+                groups.update(next_groups)
+        if use_csfd:
+            csfd_integration.csfd_lookup_many([g['title'] for g in groups.values()], _profile, monitor=xbmc.Monitor())
+        if art.enabled:
+            metas = cache.get_many(groups.keys())
+            art.prefetch([artwork.tmdb_url(meta.get('poster_path'), 'list') for meta in metas.values() if meta], xbmc.Monitor())
+    finally:
+        cache.close()
+
+def enrich_movies(cache, missing):
+    """Dotáhne z TMDb metadata filmů, které ještě nejsou v cache; zobrazí se při dalším otevření stránky"""
+    if not missing or not _addon.getSetting('tmdb_token'):
+        return
+    tmdb = tmdb_helper.TMDbHelper(_addon)
+    monitor = xbmc.Monitor()
+    def fetch(entry):
+        if monitor.abortRequested():
+            return entry[0], None, False
+        try:
+            return entry[0], tmdb.lookup_movie(entry[1]['title'], entry[1]['year']), True
+        except Exception:
+            traceback.print_exc()
+            return entry[0], None, False
+    with ThreadPoolExecutor(max_workers=ANNOTATE_WORKERS) as executor:
+        # zápis do SQLite jen z tohoto vlákna
+        for key, meta, ok in executor.map(fetch, missing):
+            if ok:
+                cache.put(key, meta)
+
+def movie_play(params):
+    """Přehraje nejlepší verzi filmu, případně nabídne výběr ze všech verzí"""
+    idents = params['idents'].split(',')
+    ident = idents[0]
+    if len(idents) > 1 and 'true' == _addon.getSetting('movie_pick'):
+        cat = catalog.Catalog(_profile)
+        try:
+            records = cat.get(idents)
+        finally:
+            cat.close()
+        labels = [labelize(records[i]) if i in records else i for i in idents]
+        selected = xbmcgui.Dialog().select(params['name'], labels)
+        if selected == -1:
+            xbmcplugin.setResolvedUrl(_handle, False, xbmcgui.ListItem())
+            return
+        ident = idents[selected]
+    play({'ident': ident, 'name': params['name']})
+
 def loadsearch():
     history = []
     try:
@@ -346,33 +655,74 @@ def removesearch(what):
                 traceback.print_exc()
 
 def dosearch(token, what, category, sort, limit, offset, action):
-    response = api('search',{'what':'' if what == NONE_WHAT else what, 'category':category, 'sort':sort, 'limit': limit, 'offset': offset, 'wst':token, 'maybe_removed':'true'})
-    xml = ET.fromstring(response.content)
-    if is_ok(xml):
+    """Vykreslí stránku výsledků hledání; vrací (položky, obnova).
+
+    Obnova je funkce, kterou je po endOfDirectory potřeba zavolat, když se zobrazil uložený snímek.
+    """
+    def fetch():
+        response = api('search',{'what':'' if what == NONE_WHAT else what, 'category':category, 'sort':sort, 'limit': limit, 'offset': offset, 'wst':token, 'maybe_removed':'true'})
+        xml = ET.fromstring(response.content)
+        if not is_ok(xml):
+            return None
+        try:
+            total = int(xml.find('total').text)
+        except:
+            total = 0
+        return {'items': [todict(file) for file in xml.iter('file')], 'total': total}
+    key = listing_cache.listing_key('search', what=what, category=category, sort=sort, limit=limit, offset=offset)
+    url = get_url(action=action, what=what, category=category, sort=sort, limit=limit, offset=offset)
+    try:
+        data, snapshot, pending = listing(key, fetch)
+    except UNAVAILABLE:
+        traceback.print_exc()
+        return catalog_results(what), None
+    if data is not None:
+        if snapshot is not None:
+            stale_item(snapshot, url)
         
         if offset > 0: #prev page
             listitem = xbmcgui.ListItem(label=_addon.getLocalizedString(30206))
             listitem.setArt({'icon': 'DefaultAddonsSearch.png'})
             xbmcplugin.addDirectoryItem(_handle, get_url(action=action, what=what, category=category, sort=sort, limit=limit, offset=offset - limit if offset > limit else 0), listitem, True)
             
-        for file in xml.iter('file'):
-            item = todict(file)
+        items = data['items']
+        metas = file_summaries(items)
+        marks = account_marks()
+        for item in items:
             commands = []
             commands.append(( _addon.getLocalizedString(30214), 'Container.Update(' + get_url(action='search',toqueue=item['ident'], what=what, offset=offset) + ')'))
-            listitem = tolistitem(item,commands)
+            listitem = tolistitem(item,commands,metas.get(item['ident']),marks)
             xbmcplugin.addDirectoryItem(_handle, get_url(action='play',ident=item['ident'],name=item['name']), listitem, False)
-        
-        try:
-            total = int(xml.find('total').text)
-        except:
-            total = 0
+        if snapshot is None:
+            catalog.remember(_profile, items)
             
-        if offset + limit < total: #next page
+        if offset + limit < data['total']: #next page
             listitem = xbmcgui.ListItem(label=_addon.getLocalizedString(30207))
             listitem.setArt({'icon': 'DefaultAddonsSearch.png'})
             xbmcplugin.addDirectoryItem(_handle, get_url(action=action, what=what, category=category, sort=sort, limit=limit, offset=offset+limit), listitem, True)
+        if pending is not None:
+            return items, lambda: refresh_listing(key, pending, url)
+        return items, None
     else:
         popinfo(_addon.getLocalizedString(30107), icon=xbmcgui.NOTIFICATION_WARNING)
+        return [], None
+
+def catalog_results(what):
+    """Náhradní výsledky z lokálního katalogu, když Webshare neodpovídá"""
+    popinfo('Webshare je dočasně nedostupný, zobrazuji uložené výsledky', icon=xbmcgui.NOTIFICATION_WARNING)
+    if what == NONE_WHAT:
+        return []
+    cat = catalog.Catalog(_profile)
+    try:
+        items = cat.search(what, int(_addon.getSetting('slimit')))
+    finally:
+        cat.close()
+    metas = file_summaries(items)
+    marks = account_marks()
+    for item in items:
+        listitem = tolistitem(item, [], metas.get(item['ident']), marks)
+        xbmcplugin.addDirectoryItem(_handle, get_url(action='play',ident=item['ident'],name=item['name']), listitem, False)
+    return items
 
 def search(params):
     xbmcplugin.setPluginCategory(_handle, _addon.getAddonInfo('name') + " \ " + _addon.getLocalizedString(30201))
@@ -389,6 +739,8 @@ def search(params):
         updateListing=True
     
     what = None
+    items = []
+    refresh = None
     
     if 'what' in params:
         what = params['what']
@@ -413,7 +765,7 @@ def search(params):
         sort = params['sort'] if 'sort' in params else SORTS[int(_addon.getSetting('ssort'))]
         limit = int(params['limit']) if 'limit' in params else int(_addon.getSetting('slimit'))
         offset = int(params['offset']) if 'offset' in params else 0
-        dosearch(token, what, category, sort, limit, offset, 'search')
+        items, refresh = dosearch(token, what, category, sort, limit, offset, 'search')
     else:
         _addon.setSetting('slast',NONE_WHAT)
         history = loadsearch()
@@ -439,6 +791,38 @@ def search(params):
             listitem.addContextMenuItems(commands)
             xbmcplugin.addDirectoryItem(_handle, get_url(action='search',what=search,ask=1), listitem, True)
     xbmcplugin.endOfDirectory(_handle, updateListing=updateListing)
+    if refresh is not None:
+        refresh()
+        return
+    annotate([item['ident'] for item in items], token)
+    prefetch_thumbs(items)
+
+def isearch(params):
+    """Okamžité hledání v lokálním katalogu, Webshare API až pro další výsledky"""
+    xbmcplugin.setPluginCategory(_handle, _addon.getAddonInfo('name') + " \\ Rychlé hledání")
+    what = params['what'] if 'what' in params else ask(None)
+    if not what:
+        xbmcplugin.endOfDirectory(_handle, succeeded=False)
+        return
+    storesearch(what)
+    cat = catalog.Catalog(_profile)
+    try:
+        items = cat.search(what, int(_addon.getSetting('slimit')))
+    finally:
+        cat.close()
+    metas = file_summaries(items)
+    marks = account_marks()
+    for item in items:
+        commands = []
+        commands.append(( _addon.getLocalizedString(30214), 'Container.Update(' + get_url(action='search',toqueue=item['ident'], what=what) + ')'))
+        listitem = tolistitem(item,commands,metas.get(item['ident']),marks)
+        xbmcplugin.addDirectoryItem(_handle, get_url(action='play',ident=item['ident'],name=item['name']), listitem, False)
+    listitem = xbmcgui.ListItem(label='Další výsledky z Webshare')
+    listitem.setArt({'icon': 'DefaultAddonsSearch.png'})
+    xbmcplugin.addDirectoryItem(_handle, get_url(action='search',what=what), listitem, True)
+    xbmcplugin.endOfDirectory(_handle)
+    annotate([item['ident'] for item in items], _addon.getSetting('token'))
+    prefetch_thumbs(items)
 
 def queue(params):
     xbmcplugin.setPluginCategory(_handle, _addon.getAddonInfo('name') + " \ " + _addon.getLocalizedString(30202))
@@ -450,31 +834,72 @@ def queue(params):
         xml = ET.fromstring(response.content)
         if is_ok(xml):
             popinfo(_addon.getLocalizedString(30106))
+            mirror = account_mirror.AccountMirror(_profile)
+            try:
+                mirror.remove_queue([params['dequeue']])
+            finally:
+                mirror.close()
         else:
             popinfo(_addon.getLocalizedString(30107), icon=xbmcgui.NOTIFICATION_WARNING)
         updateListing=True
     
-    response = api('queue',{'wst':token})
-    xml = ET.fromstring(response.content)
-    if is_ok(xml):
-        for file in xml.iter('file'):
-            item = todict(file)
-            commands = []
-            commands.append(( _addon.getLocalizedString(30215), 'Container.Update(' + get_url(action='queue',dequeue=item['ident']) + ')'))
-            listitem = tolistitem(item,commands)
-            xbmcplugin.addDirectoryItem(_handle, get_url(action='play',ident=item['ident'],name=item['name']), listitem, False)
-    else:
-        popinfo(_addon.getLocalizedString(30107), icon=xbmcgui.NOTIFICATION_WARNING)
+    url = get_url(action='queue')
+    snapshot, pending = account_sync('queue', token)
+    mirror = account_mirror.AccountMirror(_profile)
+    try:
+        items = mirror.queue()
+        marks = mirror.marks()._replace(queued=frozenset())
+    finally:
+        mirror.close()
+    if snapshot is not None:
+        stale_item(snapshot, url)
+    listitem = xbmcgui.ListItem(label='Stáhnout vše')
+    listitem.setArt({'icon': 'DefaultAddonService.png'})
+    xbmcplugin.addDirectoryItem(_handle, get_url(action='queue_download_all'), listitem, False)
+    listitem = xbmcgui.ListItem(label='Odebrat přehrané z fronty')
+    listitem.setArt({'icon': 'DefaultIconWarning.png'})
+    xbmcplugin.addDirectoryItem(_handle, get_url(action='dequeue_watched'), listitem, False)
+    listitem = xbmcgui.ListItem(label='Odebrat vybrané z fronty...')
+    listitem.setArt({'icon': 'DefaultIconWarning.png'})
+    xbmcplugin.addDirectoryItem(_handle, get_url(action='dequeue_select'), listitem, False)
+    metas = file_summaries(items)
+    for item in items:
+        commands = []
+        commands.append(( _addon.getLocalizedString(30215), 'Container.Update(' + get_url(action='queue',dequeue=item['ident']) + ')'))
+        listitem = tolistitem(item,commands,metas.get(item['ident']),marks)
+        xbmcplugin.addDirectoryItem(_handle, get_url(action='play',ident=item['ident'],name=item['name']), listitem, False)
+    if snapshot is None:
+        catalog.remember(_profile, items)
     xbmcplugin.endOfDirectory(_handle,updateListing=updateListing)
+    if pending is not None:
+        refresh_listing(None, pending, url)
+        return
+    annotate([item['ident'] for item in items], token)
+    prefetch_thumbs(items)
 
 def toqueue(ident,token):
     response = api('queue_file',{'ident':ident,'wst':token})
     xml = ET.fromstring(response.content)
     if is_ok(xml):
         popinfo(_addon.getLocalizedString(30105))
+        # do zrcadla hned, s údaji z katalogu, pokud je máme
+        item = catalog_item(ident)
+        mirror = account_mirror.AccountMirror(_profile)
+        try:
+            mirror.add_queue(item)
+        finally:
+            mirror.close()
     else:
         popinfo(_addon.getLocalizedString(30107), icon=xbmcgui.NOTIFICATION_WARNING)
 
+def catalog_item(ident):
+    """Záznam souboru z lokálního katalogu, nebo aspoň ident"""
+    cat = catalog.Catalog(_profile)
+    try:
+        return cat.get([ident]).get(ident) or {'ident': ident, 'name': ident}
+    finally:
+        cat.close()
+
 def history(params):
     xbmcplugin.setPluginCategory(_handle, _addon.getAddonInfo('name') + " \ " + _addon.getLocalizedString(30203))
     token = revalidate()
@@ -483,45 +908,176 @@ def history(params):
     if 'remove' in params:
         remove = params['remove']
         updateListing=True
-        response = api('history',{'wst':token})
-        xml = ET.fromstring(response.content)
-        ids = []
-        if is_ok(xml):
-            for file in xml.iter('file'):
-                if remove == file.find('ident').text:
-                    ids.append(file.find('download_id').text)
-        else:
-            popinfo(_addon.getLocalizedString(30107), icon=xbmcgui.NOTIFICATION_WARNING)
-        if ids:
-            rr = api('clear_history',{'ids[]':ids,'wst':token})
-            xml = ET.fromstring(rr.content)
-            if is_ok(xml):
-                popinfo(_addon.getLocalizedString(30104))
-            else:
-                popinfo(_addon.getLocalizedString(30107), icon=xbmcgui.NOTIFICATION_WARNING)
+        # download_id všech stažení souboru máme v zrcadle, historii není třeba stahovat znovu
+        mirror = account_mirror.AccountMirror(_profile)
+        try:
+            ids = mirror.download_ids(remove)
+            if ids:
+                rr = api('clear_history',{'ids[]':ids,'wst':token})
+                xml = ET.fromstring(rr.content)
+                if is_ok(xml):
+                    mirror.remove_history(ids)
+                    popinfo(_addon.getLocalizedString(30104))
+                else:
+                    popinfo(_addon.getLocalizedString(30107), icon=xbmcgui.NOTIFICATION_WARNING)
+        finally:
+            mirror.close()
     
     if 'toqueue' in params:
         toqueue(params['toqueue'],token)
         updateListing=True
     
-    response = api('history',{'wst':token})
-    xml = ET.fromstring(response.content)
-    files = []
-    if is_ok(xml):
-        for file in xml.iter('file'):
-            item = todict(file, ['ended_at', 'download_id', 'started_at'])
-            if item not in files:
-                files.append(item)
-        for file in files:
-            commands = []
-            commands.append(( _addon.getLocalizedString(30213), 'Container.Update(' + get_url(action='history',remove=file['ident']) + ')'))
-            commands.append(( _addon.getLocalizedString(30214), 'Container.Update(' + get_url(action='history',toqueue=file['ident']) + ')'))
-            listitem = tolistitem(file, commands)
-            xbmcplugin.addDirectoryItem(_handle, get_url(action='play',ident=file['ident'],name=file['name']), listitem, False)
+    url = get_url(action='history')
+    snapshot, pending = account_sync('history', token)
+    mirror = account_mirror.AccountMirror(_profile)
+    try:
+        files = mirror.history()
+        marks = mirror.marks()._replace(watched=frozenset())
+    finally:
+        mirror.close()
+    if snapshot is not None:
+        stale_item(snapshot, url)
     else:
-        popinfo(_addon.getLocalizedString(30107), icon=xbmcgui.NOTIFICATION_WARNING)
+        catalog.remember(_profile, files)
+    listitem = xbmcgui.ListItem(label='Smazat vybrané z historie...')
+    listitem.setArt({'icon': 'DefaultIconWarning.png'})
+    xbmcplugin.addDirectoryItem(_handle, get_url(action='history_select'), listitem, False)
+    listitem = xbmcgui.ListItem(label='Smazat historii starší než...')
+    listitem.setArt({'icon': 'DefaultIconWarning.png'})
+    xbmcplugin.addDirectoryItem(_handle, get_url(action='history_clear_old'), listitem, False)
+    metas = file_summaries(files)
+    for file in files:
+        commands = []
+        commands.append(( _addon.getLocalizedString(30213), 'Container.Update(' + get_url(action='history',remove=file['ident']) + ')'))
+        commands.append(( _addon.getLocalizedString(30214), 'Container.Update(' + get_url(action='history',toqueue=file['ident']) + ')'))
+        listitem = tolistitem(file, commands, metas.get(file['ident']), marks)
+        xbmcplugin.addDirectoryItem(_handle, get_url(action='play',ident=file['ident'],name=file['name']), listitem, False)
     xbmcplugin.endOfDirectory(_handle,updateListing=updateListing)
+    if pending is not None:
+        refresh_listing(None, pending, url)
+        return
+    annotate([file['ident'] for file in files], token)
+    prefetch_thumbs(files)
     
+def bulk_api(fnct, datas, message):
+    """Stejné volání API pro více položek souběžně (rychlost a souběh hlídá plánovač).
+
+    Vrací data položek, pro která API odpovědělo OK; chyba jedné položky (nedostupné API,
+    nečitelná odpověď) ostatní nezastaví.
+    """
+    done = []
+    if not datas:
+        return done
+    dialog = xbmcgui.DialogProgressBG()
+    dialog.create(_addon.getAddonInfo('name'), message)
+    def call(data):
+        try:
+            return data, is_ok(ET.fromstring(api(fnct, data).content))
+        except Exception:
+            traceback.print_exc()
+            return data, False
+    try:
+        with ThreadPoolExecutor(max_workers=_scheduler.concurrency) as executor:
+            for count, (data, ok) in enumerate(executor.map(call, datas), 1):
+                dialog.update(int(count * 100 / len(datas)))
+                if ok:
+                    done.append(data)
+    finally:
+        dialog.close()
+    return done
+
+def dequeue_many(items, token):
+    """Odebere soubory z fronty účtu a výpis jednou obnoví"""
+    done = bulk_api('dequeue_file', [{'ident': item['ident'], 'wst': token} for item in items], _addon.getLocalizedString(30215))
+    mirror = account_mirror.AccountMirror(_profile)
+    try:
+        mirror.remove_queue([data['ident'] for data in done])
+    finally:
+        mirror.close()
+    bulk_result(len(done), len(items))
+
+def clear_history_ids(ids, token):
+    """Smaže záznamy historie po dávkách ids[] a výpis jednou obnoví"""
+    batches = [ids[i:i + CLEAR_HISTORY_BATCH] for i in range(0, len(ids), CLEAR_HISTORY_BATCH)]
+    done = bulk_api('clear_history', [{'ids[]': batch, 'wst': token} for batch in batches], _addon.getLocalizedString(30213))
+    removed = [download_id for data in done for download_id in data['ids[]']]
+    mirror = account_mirror.AccountMirror(_profile)
+    try:
+        mirror.remove_history(removed)
+    finally:
+        mirror.close()
+    bulk_result(len(removed), len(ids))
+
+def bulk_result(done, total):
+    if done < total:
+        popinfo(f'Hotovo {done} z {total}', icon=xbmcgui.NOTIFICATION_WARNING)
+    else:
+        popinfo(f'Hotovo: {done}')
+    xbmc.executebuiltin('Container.Refresh')
+
+def dequeue_watched(params):
+    """Odebere z fronty soubory, které už jsou v historii stahování"""
+    token = revalidate()
+    account_sync('queue', token)
+    account_sync('history', token)
+    mirror = account_mirror.AccountMirror(_profile)
+    try:
+        items = mirror.queue_watched()
+    finally:
+        mirror.close()
+    if not items:
+        popinfo('Ve frontě nejsou žádné přehrané soubory')
+        return
+    dequeue_many(items, token)
+
+def dequeue_select(params):
+    mirror = account_mirror.AccountMirror(_profile)
+    try:
+        items = mirror.queue()
+    finally:
+        mirror.close()
+    selected = xbmcgui.Dialog().multiselect(_addon.getLocalizedString(30215), [labelize(item) for item in items])
+    if not selected:
+        return
+    dequeue_many([items[i] for i in selected], revalidate())
+
+def history_select(params):
+    mirror = account_mirror.AccountMirror(_profile)
+    try:
+        files = mirror.history()
+        selected = xbmcgui.Dialog().multiselect(_addon.getLocalizedString(30213), [labelize(file) for file in files])
+        if not selected:
+            return
+        ids = [download_id for i in selected for download_id in mirror.download_ids(files[i]['ident'])]
+    finally:
+        mirror.close()
+    clear_history_ids(ids, revalidate())
+
+def history_clear_old(params):
+    """Smaže záznamy historie starší než zadaný počet dní"""
+    days = xbmcgui.Dialog().numeric(0, 'Smazat historii starší než (dní)', '30')
+    try:
+        days = int(days)
+    except ValueError:
+        return
+    if days < 1:
+        popinfo('Zadejte alespoň 1 den', icon=xbmcgui.NOTIFICATION_WARNING)
+        return
+    token = revalidate()
+    account_sync('history', token)
+    cutoff = time.time() - days * 86400
+    mirror = account_mirror.AccountMirror(_profile)
+    try:
+        ids = mirror.download_ids_before(cutoff)
+    finally:
+        mirror.close()
+    if not ids:
+        popinfo('Žádné starší záznamy v historii')
+        return
+    if not xbmcgui.Dialog().yesno(_addon.getLocalizedString(30213), f'Smazat {len(ids)} záznamů historie starších než {days} dní?'):
+        return
+    clear_history_ids(ids, token)
+
 def settings(params):
     _addon.openSettings()
     xbmcplugin.setResolvedUrl(_handle, False, xbmcgui.ListItem())
@@ -537,19 +1093,31 @@ def fpsize(fps):
        return str(int(x))
     return str(x)
     
-def getinfo(ident,wst):
-    response = api('file_info',{'ident':ident,'wst': wst})
-    xml = ET.fromstring(response.content)
-    ok = is_ok(xml)
-    if not ok:
-        response = api('file_info',{'ident':ident,'wst': wst, 'maybe_removed':'true'})
+def getinfo(ident,wst,cached=True,notify=True,priority=INTERACTIVE):
+    store = file_meta.FileMetaStore(_profile)
+    try:
+        if cached:
+            xml = store.get(ident)
+            if xml is file_meta.MISSING:
+                if notify:
+                    popinfo(_addon.getLocalizedString(30107), icon=xbmcgui.NOTIFICATION_WARNING)
+                return None
+            if xml is not None:
+                return xml
+        # odpověď bez OK plánovač sám zopakuje s maybe_removed (api_scheduler.FALLBACKS)
+        response = api('file_info',{'ident':ident,'wst': wst}, priority)
         xml = ET.fromstring(response.content)
-        ok = is_ok(xml)
-    if ok:
-        return xml
-    else:
-        popinfo(_addon.getLocalizedString(30107), icon=xbmcgui.NOTIFICATION_WARNING)
-        return None
+        if is_ok(xml):
+            store.put(ident, xml)
+            return xml
+        else:
+            if file_meta.is_not_found(xml):
+                store.put_missing(ident)
+            if notify:
+                popinfo(_addon.getLocalizedString(30107), icon=xbmcgui.NOTIFICATION_WARNING)
+            return None
+    finally:
+        store.close()
 
 def info(params):
     xbmc.log(f'PARAMS: {params}', level=xbmc.LOGINFO)
@@ -592,7 +1160,7 @@ def info(params):
         xbmc.log(f'PARAMS: {params}', level=xbmc.LOGDEBUG)
         xbmcgui.Dialog().textviewer(_addon.getAddonInfo('name'), text)
 
-def getlink(ident,wst,dtype='video_stream'):
+def getlink(ident,wst,dtype='video_stream',priority=INTERACTIVE):
     #uuid experiment
     duuid = _addon.getSetting('duuid')
     if not duuid:
@@ -604,7 +1172,7 @@ def getlink(ident,wst,dtype='video_stream'):
     #xml = ET.fromstring(response.content)
     #if is_ok(xml) and xml.find('protected').text != 0:
     #    pass #ask for password
-    response = api('file_link',data)
+    response = api('file_link',data,priority)
     xml = ET.fromstring(response.content)
     if is_ok(xml):
         return xml.find('link').text
@@ -613,8 +1181,12 @@ def getlink(ident,wst,dtype='video_stream'):
         return None
 
 def play(params):
+    cache = link_cache.LinkCache(_profile)
     token = revalidate()
-    link = getlink(params['ident'],token)
+    # odkaz předem získaný během přehrávání předchozí epizody
+    link = cache.take(params['ident'])
+    if link is None:
+        link = getlink(params['ident'],token)
     if link is not None:
         #headers experiment
         headers = _session.headers
@@ -624,107 +1196,321 @@ def play(params):
         listitem = xbmcgui.ListItem(label=params['name'],path=link)
         listitem.setProperty('mimetype', 'application/octet-stream')
         xbmcplugin.setResolvedUrl(_handle, True, listitem)
+        if 'series_name' in params:
+            prefetch_next_episode(params, token, cache)
     else:
         popinfo(_addon.getLocalizedString(30107), icon=xbmcgui.NOTIFICATION_WARNING)
         xbmcplugin.setResolvedUrl(_handle, False, xbmcgui.ListItem())
 
+def prefetch_next_episode(params, token, cache):
+    """Během přehrávání získá odkaz na další epizodu a případně ji zařadí do playlistu"""
+    try:
+        sm = series_manager.SeriesManager(_addon, _profile)
+        following = sm.next_episode(params['series_name'], params['season'], params['episode'])
+        if following is None:
+            return
+        season, episode, file = following
+        if cache.get(file['ident']) is None:
+            link = getlink(file['ident'],token,priority=BACKGROUND)
+            if link is None:
+                return
+            cache.put(file['ident'], link)
+        if 'true' == _addon.getSetting('autoqueue_next'):
+            url = get_url(action='play', ident=file['ident'], name=file['name'], series_name=params['series_name'], season=season, episode=episode)
+            listitem = xbmcgui.ListItem(label=f"Epizoda {episode} - {file['name']}")
+            listitem.setProperty('IsPlayable', 'true')
+            playlist = xbmc.PlayList(xbmc.PLAYLIST_VIDEO)
+            # mimo playlist (přehrání přímo z výpisu) by se přidaná epizoda nikdy nespustila
+            if playlist.getposition() < 0:
+                return
+            if not any(playlist[i].getPath() == url for i in range(playlist.size())):
+                playlist.add(url, listitem)
+    except Exception:
+        traceback.print_exc()
+
 def join(path, file):
     if path.endswith('/') or path.endswith('\\'):
         return path + file
     else:
         return path + '/' + file
 
-def download(params):
-    token = revalidate()
+def download_folder():
     where = _addon.getSetting('dfolder')
     if not where or not xbmcvfs.exists(where):
         popinfo('set folder!', sound=True)#_addon.getLocalizedString(30101)
         _addon.openSettings()
-        return
-        
+        return None
+    return where
+
+def download_file(ident, token, where, limiter=None, on_update=None):
+    """Stáhne jeden soubor do složky `where`, vrací název souboru. Při chybě vyhodí výjimku."""
     local = os.path.exists(where)
-        
     normalize = 'true' == _addon.getSetting('dnormalize')
     notify = 'true' == _addon.getSetting('dnotify')
-    every = _addon.getSetting('dnevery')
+    progress = None
     try:
-        every = int(re.sub(r'[^\d]+', '', every))
-    except:
-        every = 10
-        
-    try:
-        link = getlink(params['ident'],token,'file_download')
-        info = getinfo(params['ident'],token)
+        # odkaz a informace o souboru získáme souběžně
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            link_future = executor.submit(getlink, ident, token, 'file_download', BACKGROUND)
+            info_future = executor.submit(getinfo, ident, token, priority=BACKGROUND)
+            link = link_future.result()
+            info = info_future.result()
+        if link is None or info is None:
+            raise IOError('file link not available')
         name = info.find('name').text
         if normalize:
             name = unidecode.unidecode(name)
-        bf = io.open(os.path.join(where,name), 'wb') if local else xbmcvfs.File(join(where,name), 'w')
-        response = _session.get(link, stream=True)
-        total = response.headers.get('content-length')
-        if total is None:
-            popinfo(_addon.getLocalizedString(30301) + name, icon=xbmcgui.NOTIFICATION_WARNING, sound=True)
-            bf.write(response.content)
-        elif not notify:
-            popinfo(_addon.getLocalizedString(30302) + name)
-            bf.write(response.content)
-        else:
-            popinfo(_addon.getLocalizedString(30302) + name)
-            dl = 0
-            total = int(total)
-            pct = total / 100
-            lastpop=0
-            for data in response.iter_content(chunk_size=4096):
-                dl += len(data)
-                bf.write(data)
-                done = int(dl / pct)
-                if done % every == 0 and lastpop != done:
-                    popinfo(str(done) + '% - ' + name)
-                    lastpop = done
-        bf.close()
-        popinfo(_addon.getLocalizedString(30303) + name, sound=True)
-    except Exception as e:
-        #TODO - remove unfinished file?
-        traceback.print_exc()
-        popinfo(_addon.getLocalizedString(30304) + name, icon=xbmcgui.NOTIFICATION_ERROR, sound=True)
+        path = os.path.join(where,name) if local else join(where,name)
+        bf = io.open(path, 'wb') if local else xbmcvfs.File(path, 'w')
+        try:
+            response = _session.get(link, stream=True)
+            total = response.headers.get('content-length')
+            if total is None:
+                popinfo(_addon.getLocalizedString(30301) + name, icon=xbmcgui.NOTIFICATION_WARNING, sound=True)
+            else:
+                total = int(total)
+                popinfo(_addon.getLocalizedString(30302) + name)
+            # průběh pro frontu stahování hlásíme vždy, dialog jen se zapnutým upozorněním
+            progress = downloader.ThrottledProgress(_addon.getAddonInfo('name'), name, on_update=on_update, show=notify)
+            try:
+                downloader.pipe(response, bf, total, progress, limiter)
+            finally:
+                bf.close()
+        except BaseException:
+            # nedokončený soubor smažeme, úloha se při dalším pokusu stahuje znovu od začátku
+            try:
+                if local:
+                    os.remove(path)
+                else:
+                    xbmcvfs.delete(path)
+            except Exception:
+                traceback.print_exc()
+            raise
+        return name
+    finally:
+        if progress is not None:
+            progress.close()
+
+def enqueue_downloads(items):
+    """Přidá soubory ({'ident','name'}) do fronty stahování a spustí její zpracování"""
+    if download_folder() is None:
+        return
+    dq = download_queue.DownloadQueue(_profile)
+    added = dq.add_many(items)
+    popinfo(f'Přidáno do fronty stahování: {added}')
+    if not dq.is_running():
+        xbmc.executebuiltin('RunPlugin(' + get_url(action='dqueue_run') + ')')
+
+def download(params):
+    enqueue_downloads([{'ident': params['ident'], 'name': params.get('name')}])
+
+def season_best(params):
+    """Nejlepší soubor každé epizody dané série"""
+    sm = series_manager.SeriesManager(_addon, _profile)
+    season = (sm.load_season(params['series_name'], str(params['season'])) or {}).get('episodes')
+    if not season:
+        popinfo('Data sezony nenalezena', icon=xbmcgui.NOTIFICATION_WARNING)
+        return []
+    items = []
+    for episode_num in sorted(season.keys(), key=int):
+        files = season[episode_num]
+        if files:
+            items.append({'ident': files[0]['ident'], 'name': files[0]['name']})
+    return items
 
-def loaddb(dbdir,file):
+def download_season(params):
+    """Zařadí do fronty nejlepší soubor každé epizody dané série"""
+    items = season_best(params)
+    if items:
+        enqueue_downloads(items)
+
+def queue_season(params):
+    """Přidá nejlepší soubor každé epizody série do fronty účtu Webshare"""
+    items = season_best(params)
+    if not items:
+        return
+    queued = account_marks().queued
+    items = [item for item in items if item['ident'] not in queued]
+    if not items:
+        popinfo('Všechny epizody série už jsou ve frontě')
+        return
+    token = revalidate()
+    done = set(data['ident'] for data in bulk_api('queue_file', [{'ident': item['ident'], 'wst': token} for item in items], _addon.getLocalizedString(30214)))
+    mirror = account_mirror.AccountMirror(_profile)
     try:
-        data = {}
-        with io.open(os.path.join(dbdir, file), 'r', encoding='utf8') as file:
-            fdata = file.read()
-            file.close()
+        for item in items:
+            if item['ident'] in done:
+                mirror.add_queue(item)
+    finally:
+        mirror.close()
+    bulk_result(len(done), len(items))
+
+def queue_download_all(params):
+    token = revalidate()
+    # stahuje se jen podle aktuální fronty - na synchronizaci počkáme, bez ní se nestahuje nic
+    if not account_syncer('queue', token)():
+        popinfo(_addon.getLocalizedString(30107), icon=xbmcgui.NOTIFICATION_WARNING)
+        return
+    mirror = account_mirror.AccountMirror(_profile)
+    try:
+        items = mirror.queue()
+    finally:
+        mirror.close()
+    enqueue_downloads([{'ident': item['ident'], 'name': item.get('name')} for item in items])
+
+def dqueue_run(params):
+    """Zpracuje frontu stahování; běží v samostatném RunPlugin volání"""
+    where = download_folder()
+    if where is None:
+        return
+    dqueue = download_queue.DownloadQueue(_profile)
+    # jediný zpracovatel fronty; jinak by reset_running() vrátil rozpracované úlohy jiného
+    if not dqueue.start_runner():
+        return
+    try:
+        dqueue.reset_running()
+        try:
+            concurrency = int(_addon.getSetting('dqconcurrent'))
+        except ValueError:
+            concurrency = 2
+        try:
+            rate = int(_addon.getSetting('dqlimit')) * 1024
+        except ValueError:
+            rate = 0
+
+        def worker(job, limiter):
+            token = revalidate()
+            def on_update(done, total):
+                dqueue.update(job['id'], done=done, total=total or 0)
+            name = job['name']
             try:
-                data = json.loads(fdata, "utf-8")['data']
-            except TypeError:
-                data = json.loads(fdata)['data']
-        return data
+                name = download_file(job['ident'], token, where, limiter, on_update)
+                popinfo(_addon.getLocalizedString(30303) + name, sound=True)
+            except downloader.DownloadAborted:
+                raise
+            except Exception:
+                popinfo(_addon.getLocalizedString(30304) + name, icon=xbmcgui.NOTIFICATION_ERROR, sound=True)
+                raise
+
+        download_queue.run(dqueue, worker, concurrency, rate)
+    finally:
+        dqueue.stop_runner()
+
+def dqueue(params):
+    """Stav fronty stahování"""
+    xbmcplugin.setPluginCategory(_handle, _addon.getAddonInfo('name') + " \\ " + _addon.getLocalizedString(30216))
+    dq = download_queue.DownloadQueue(_profile)
+    updateListing=False
+
+    if 'remove' in params:
+        dq.remove(params['remove'])
+        updateListing=True
+    if 'retry' in params:
+        dq.retry(params['retry'])
+        updateListing=True
+    if 'clear' in params:
+        dq.clear_finished()
+        updateListing=True
+
+    if not dq.is_running() and dq.has_pending():
+        listitem = xbmcgui.ListItem(label=_addon.getLocalizedString(30217))
+        listitem.setArt({'icon': 'DefaultAddonService.png'})
+        xbmcplugin.addDirectoryItem(_handle, get_url(action='dqueue_run'), listitem, False)
+
+    listitem = xbmcgui.ListItem(label=_addon.getLocalizedString(30218))
+    listitem.setArt({'icon': 'DefaultAddonNone.png'})
+    xbmcplugin.addDirectoryItem(_handle, get_url(action='dqueue',clear=1), listitem, True)
+
+    states = {
+        download_queue.PENDING: _addon.getLocalizedString(30221),
+        download_queue.RUNNING: _addon.getLocalizedString(30222),
+        download_queue.DONE: _addon.getLocalizedString(30223),
+        download_queue.FAILED: _addon.getLocalizedString(30224)
+    }
+    for job in dq.jobs():
+        label = '[' + states.get(job['state'], job['state']) + '] ' + job['name']
+        if job['state'] == download_queue.RUNNING and job.get('total'):
+            label += ' (' + str(int(job['done'] * 100 / job['total'])) + '%)'
+        listitem = xbmcgui.ListItem(label=label)
+        listitem.setArt({'icon': 'DefaultVideo.png'})
+        if job.get('error'):
+            listitem.setInfo('video', {'title': label, 'plot': job['error']})
+        commands = []
+        if job['state'] == download_queue.FAILED:
+            commands.append((_addon.getLocalizedString(30219), 'Container.Update(' + get_url(action='dqueue',retry=job['id']) + ')'))
+        commands.append((_addon.getLocalizedString(30220), 'Container.Update(' + get_url(action='dqueue',remove=job['id']) + ')'))
+        listitem.addContextMenuItems(commands)
+        xbmcplugin.addDirectoryItem(_handle, get_url(action='dqueue'), listitem, True)
+    xbmcplugin.endOfDirectory(_handle, updateListing=updateListing)
+
+def db_remote(token):
+    """Velikost a případný hash Backup DB archivu podle file_info"""
+    xml = getinfo(BACKUP_DB,token,cached=False)
+    if xml is None:
+        return None
+    remote = {'ident': BACKUP_DB, 'size': xml.find('size').text, 'hash': None}
+    for tag in ['md5', 'sha1', 'hash']:
+        element = xml.find(tag)
+        if element is not None and element.text:
+            remote['hash'] = element.text
+            break
+    return remote
+
+def db_update(token, bdb, force=False):
+    """Stáhne Backup DB, pokud se vzdálený archiv změnil (nebo vždy při force).
+
+    Vrací DB_UPDATED, DB_CURRENT (archiv se nezměnil), nebo DB_FAILED (API nebo stažení selhalo).
+    """
+    remote = db_remote(token)
+    if remote is None:
+        return DB_FAILED
+    if not force and not bdb.changed(remote):
+        bdb.mark_checked()
+        return DB_CURRENT
+    link = getlink(BACKUP_DB,token)
+    if link is None:
+        return DB_FAILED
+    progress = downloader.ThrottledProgress(_addon.getAddonInfo('name'), 'Backup DB')
+    try:
+        response = _session.get(link, stream=True)
+        bdb.install(response, remote, link, progress)
+        return DB_UPDATED
     except Exception as e:
         traceback.print_exc()
-        return {}
+        return DB_FAILED
+    finally:
+        progress.close()
 
 def db(params):
     token = revalidate()
     updateListing=False
-    dbdir = os.path.join(_profile,'db')
-    if not os.path.exists(dbdir):
-        link = getlink(BACKUP_DB,token)
-        dbfile = os.path.join(_profile,'db.zip')
-        with io.open(dbfile, 'wb') as bf:
-            response = _session.get(link, stream=True)
-            bf.write(response.content)
-            bf.flush()
-            bf.close()
-        with zipfile.ZipFile(dbfile, 'r') as zf:
-            zf.extractall(_profile)
-        os.unlink(dbfile)
+    bdb = backup_db.BackupDB(_profile)
+    bdb.migrate()
+    try:
+        check_days = int(_addon.getSetting('dbcheck'))
+    except ValueError:
+        check_days = 7
+    result = None
+    if not bdb.is_installed():
+        result = db_update(token, bdb, force=True)
+    elif 'update' in params:
+        result = db_update(token, bdb)
+        if result == DB_UPDATED:
+            popinfo('Backup DB byla aktualizována')
+        elif result == DB_CURRENT:
+            popinfo('Backup DB je aktuální')
+        updateListing=True
+    elif bdb.needs_check(check_days):
+        result = db_update(token, bdb)
+    if result == DB_FAILED:
+        popinfo(_addon.getLocalizedString(30304) + 'Backup DB', icon=xbmcgui.NOTIFICATION_ERROR)
     
     if 'toqueue' in params:
         toqueue(params['toqueue'],token)
         updateListing=True
     
     if 'file' in params and 'key' in params:
-        data = loaddb(dbdir,params['file'])
-        item = next((x for x in data if x['id'] == params['key']), None)
+        item = bdb.item(params['file'],params['key'])
         if item is not None:
             for stream in item['streams']:
                 commands = []
@@ -732,21 +1518,74 @@ def db(params):
                 listitem = tolistitem({'ident':stream['ident'],'name':stream['quality'] + ' - ' + stream['lang'] + stream['ainfo'],'sizelized':stream['size']},commands)
                 xbmcplugin.addDirectoryItem(_handle, get_url(action='play',ident=stream['ident'],name=item['title']), listitem, False)
     elif 'file' in params:
-        data = loaddb(dbdir,params['file'])
-        for item in data:
-            listitem = xbmcgui.ListItem(label=item['title'])
-            if 'plot' in item:
-                listitem.setInfo('video', {'title': item['title'],'plot': item['plot']})
-            xbmcplugin.addDirectoryItem(_handle, get_url(action='db',file=params['file'],key=item['id']), listitem, True)
+        for key, title, plot in bdb.titles(params['file']):
+            listitem = xbmcgui.ListItem(label=title)
+            if plot is not None:
+                listitem.setInfo('video', {'title': title,'plot': plot})
+            xbmcplugin.addDirectoryItem(_handle, get_url(action='db',file=params['file'],key=key), listitem, True)
     else:
-        if os.path.exists(dbdir):
-            dbfiles = [f for f in os.listdir(dbdir) if os.path.isfile(os.path.join(dbdir, f))]
-            for dbfile in dbfiles:
-                listitem = xbmcgui.ListItem(label=os.path.splitext(dbfile)[0])
-                xbmcplugin.addDirectoryItem(_handle, get_url(action='db',file=dbfile), listitem, True)
+        listitem = xbmcgui.ListItem(label='Aktualizovat Backup DB')
+        listitem.setArt({'icon': 'DefaultAddonsUpdates.png'})
+        listitem.setProperty('SpecialSort', 'top')
+        xbmcplugin.addDirectoryItem(_handle, get_url(action='db',update=1), listitem, True)
+        listitem = xbmcgui.ListItem(label='Hledat v Backup DB')
+        listitem.setArt({'icon': 'DefaultAddonsSearch.png'})
+        listitem.setProperty('SpecialSort', 'top')
+        xbmcplugin.addDirectoryItem(_handle, get_url(action='db_search'), listitem, True)
+        for dbfile in bdb.files():
+            listitem = xbmcgui.ListItem(label=os.path.splitext(dbfile)[0])
+            xbmcplugin.addDirectoryItem(_handle, get_url(action='db',file=dbfile), listitem, True)
     xbmcplugin.addSortMethod(_handle,xbmcplugin.SORT_METHOD_LABEL)
     xbmcplugin.endOfDirectory(_handle, updateListing=updateListing)
 
+def db_search(params):
+    """Offline hledání v Backup DB přes lokální invertovaný index"""
+    xbmcplugin.setPluginCategory(_handle, _addon.getAddonInfo('name') + " \\ Backup DB")
+    what = params['what'] if 'what' in params else ask(None)
+    if not what:
+        xbmcplugin.endOfDirectory(_handle, succeeded=False)
+        return
+    bdb = backup_db.BackupDB(_profile)
+    bdb.ensure_search_index()
+    for item in bdb.search(what):
+        listitem = xbmcgui.ListItem(label=item['title'])
+        info = {'title': item['title']}
+        if item['plot'] is not None:
+            info['plot'] = item['plot']
+        listitem.setInfo('video', info)
+        listitem.setLabel2(os.path.splitext(item['file'])[0])
+        xbmcplugin.addDirectoryItem(_handle, get_url(action='db',file=item['file'],key=item['id']), listitem, True)
+    xbmcplugin.endOfDirectory(_handle)
+
+def diagnostics(params):
+    """Počítadla plánovače API"""
+    xbmcplugin.setPluginCategory(_handle, _addon.getAddonInfo('name') + " \\ Diagnostika")
+    path = os.path.join(_profile, api_scheduler.STATS_FILE)
+    if 'reset' in params:
+        api_scheduler.reset_stats(path)
+    else:
+        _scheduler.stats.flush()
+    counters = api_scheduler.stats(path)
+    calls = counters.get('calls', 0)
+    rows = [
+        ('Volání API', calls),
+        ('Interaktivní', counters.get('interactive', 0)),
+        ('Na pozadí', counters.get('background', 0)),
+        ('Sloučené souběžné požadavky', counters.get('coalesced', 0)),
+        ('Opakování', counters.get('retries', 0)),
+        ('Omezení serverem (429)', counters.get('throttled', 0)),
+        ('Chyby (5xx, spojení)', counters.get('errors', 0)),
+        ('Průměrné čekání ve frontě', f"{counters.get('queued_ms', 0) // calls if calls else 0} ms"),
+        ('Průměrná doba volání', f"{counters.get('total_ms', 0) // calls if calls else 0} ms")
+    ]
+    for label, value in rows:
+        listitem = xbmcgui.ListItem(label=f"{label}: {value}")
+        xbmcplugin.addDirectoryItem(_handle, get_url(action='diagnostics'), listitem, True)
+    listitem = xbmcgui.ListItem(label='Vynulovat počítadla')
+    listitem.setArt({'icon': 'DefaultAddonService.png'})
+    xbmcplugin.addDirectoryItem(_handle, get_url(action='diagnostics', reset=1), listitem, True)
+    xbmcplugin.endOfDirectory(_handle, updateListing='reset' in params, cacheToDisc=False)
+
 def menu():
     revalidate()
 
@@ -756,6 +1595,11 @@ def menu():
     listitem.setArt({'icon': 'DefaultAddonsSearch.png'})
     xbmcplugin.addDirectoryItem(_handle, get_url(action='search'), listitem, True)
 
+    # Instant search
+    listitem = xbmcgui.ListItem(label='Rychlé hledání')
+    listitem.setArt({'icon': 'DefaultAddonsSearch.png'})
+    xbmcplugin.addDirectoryItem(_handle, get_url(action='isearch'), listitem, True)
+
     # Movies
     listitem = xbmcgui.ListItem(label='Filmy')
     listitem.setArt({'icon': 'DefaultMovies.png'})
@@ -771,6 +1615,11 @@ def menu():
     listitem.setArt({'icon': 'DefaultPlaylist.png'})
     xbmcplugin.addDirectoryItem(_handle, get_url(action='queue'), listitem, True)
     
+    # Download queue
+    listitem = xbmcgui.ListItem(label=_addon.getLocalizedString(30216))
+    listitem.setArt({'icon': 'DefaultNetwork.png'})
+    xbmcplugin.addDirectoryItem(_handle, get_url(action='dqueue'), listitem, True)
+
     # History
     listitem = xbmcgui.ListItem(label=_addon.getLocalizedString(30203))
     listitem.setArt({'icon': 'DefaultAddonsUpdates.png'})
@@ -781,6 +1630,9 @@ def menu():
         listitem = xbmcgui.ListItem(label='Backup DB')
         listitem.setArt({'icon': 'DefaultAddonsZip.png'})
         xbmcplugin.addDirectoryItem(_handle, get_url(action='db'), listitem, True)
+        listitem = xbmcgui.ListItem(label='Diagnostika')
+        listitem.setArt({'icon': 'DefaultAddonService.png'})
+        xbmcplugin.addDirectoryItem(_handle, get_url(action='diagnostics'), listitem, True)
 
     # Settings
     listitem = xbmcgui.ListItem(label=_addon.getLocalizedString(30204))
@@ -793,9 +1645,11 @@ def series_menu(params):
     """Handle Series functionality"""
     # Initialize SeriesManager
     sm = series_manager.SeriesManager(_addon, _profile)
-    series_manager.create_series_menu(sm, _handle, _addon.getSetting('tmdb_token'))
+    names = series_manager.create_series_menu(sm, _handle, _addon.getSetting('tmdb_token'))
+    if 'true' == _addon.getSetting('csfd'):
+        # hodnocení chybějících seriálů se zobrazí při dalším otevření
+        csfd_integration.csfd_lookup_many(names, _profile, 'series', monitor=xbmc.Monitor())
 
-# TODO
 def series_search_tmdb(params):
     """Search for a TV series on TMDB"""
     series_name = ask(None)
@@ -810,14 +1664,37 @@ def series_search_tmdb(params):
         xbmcplugin.endOfDirectory(_handle, succeeded=False)
         return
     
+    token = revalidate()
     progress = xbmcgui.DialogProgress()
     progress.create("Webshare Cinema", f"Vyhledávám {selected['name']} / {selected['original_name']}")
 
-    id = tmdb.get_series_details(selected['id'])
-    result = tmdb.build_tmdb_series_structure(selected, id)
+    try:
+        id = tmdb.get_series_details(selected['id'])
+        result = tmdb.build_tmdb_series_structure(selected, id)
 
-    folder_path = os.path.join(_profile, themoviedb.FOLDER_NAME)
-    themoviedb.save_series_structure(result, folder_path)
+        folder_path = os.path.join(_profile, themoviedb.FOLDER_NAME)
+        themoviedb.save_series_structure(result, folder_path)
+
+        # Kostru naplníme streamy z jednoho souhrnného hledání na Webshare
+        series_name = selected['name']
+        sm = series_manager.SeriesManager(_addon, _profile)
+        series_data = sm.search_series(series_name, api, token, result)
+        progress.close()
+        if not series_data or not series_data['seasons']:
+            popinfo('Nenalezeny zadne epizody tohoto serialu', icon=xbmcgui.NOTIFICATION_WARNING)
+            xbmcplugin.endOfDirectory(_handle, succeeded=False)
+            return
+        popinfo(f'Nalezeno {sum(len(season) for season in series_data["seasons"].values())} epizod v {len(series_data["seasons"])} sezonach')
+        xbmc.executebuiltin(f'Container.Update({get_url(action="series_detail", series_name=series_name)})')
+    except UNAVAILABLE:
+        progress.close()
+        traceback.print_exc()
+        series_offline(series_name)
+    except Exception as e:
+        progress.close()
+        traceback.print_exc()
+        popinfo(f'Chyba: {str(e)}', icon=xbmcgui.NOTIFICATION_ERROR)
+        xbmcplugin.endOfDirectory(_handle, succeeded=False)
 
 def series_search(params):
     """Search for a TV series and organize it into seasons and episodes"""
@@ -829,6 +1706,18 @@ def series_search(params):
         xbmcplugin.endOfDirectory(_handle, succeeded=False)
         return
     
+    # Metadata z TMDb jen pro seriál, který uživatel potvrdí; bez výběru se hledá jako dříve
+    tmdb_data = None
+    if _addon.getSetting('tmdb_token'):
+        try:
+            tmdb = themoviedb.TMDB(_addon, _profile)
+            results = tmdb.get_series_info(series_name)
+            selected = tmdb.choose_series_from_results(results) if results else None
+            if selected:
+                tmdb_data = tmdb.build_tmdb_series_structure(selected, tmdb.get_series_details(selected['id']))
+        except Exception:
+            traceback.print_exc()
+
     # Initialize SeriesManager and perform search
     sm = series_manager.SeriesManager(_addon, _profile)
     
@@ -838,7 +1727,7 @@ def series_search(params):
     
     try:
         # Search for the series
-        series_data = sm.search_series(series_name, api, token)
+        series_data = sm.search_series(series_name, api, token, tmdb_data)
         
         if not series_data or not series_data['seasons']:
             progress.close()
@@ -853,12 +1742,26 @@ def series_search(params):
         # Redirect to series detail
         xbmc.executebuiltin(f'Container.Update({get_url(action="series_detail", series_name=series_name)})')
         
+    except UNAVAILABLE:
+        progress.close()
+        traceback.print_exc()
+        series_offline(series_name)
     except Exception as e:
         progress.close()
         traceback.print_exc()
         popinfo(f'Chyba: {str(e)}', icon=xbmcgui.NOTIFICATION_ERROR)
         xbmcplugin.endOfDirectory(_handle, succeeded=False)
 
+def series_offline(series_name):
+    """Webshare neodpovídá - zobrazí dříve uložená data seriálu, pokud nějaká jsou"""
+    sm = series_manager.SeriesManager(_addon, _profile)
+    if sm.load_manifest(series_name):
+        popinfo('Webshare neodpovídá, zobrazuji uložená data seriálu', icon=xbmcgui.NOTIFICATION_WARNING)
+        xbmc.executebuiltin(f'Container.Update({get_url(action="series_detail", series_name=series_name)})')
+    else:
+        popinfo('Webshare je dočasně nedostupný', icon=xbmcgui.NOTIFICATION_WARNING)
+        xbmcplugin.endOfDirectory(_handle, succeeded=False)
+
 def series_detail(params):
     """Show seasons for a series"""
     xbmcplugin.setPluginCategory(_handle, _addon.getAddonInfo('name') + " \ " + params['series_name'])
@@ -880,7 +1783,18 @@ def series_season(params):
     sm = series_manager.SeriesManager(_addon, _profile)
     
     # Display episodes menu
-    series_manager.create_episodes_menu(sm, _handle, series_name, season)
+    idents = series_manager.create_episodes_menu(sm, _handle, series_name, season)
+    annotate(idents, _addon.getSetting('token'))
+
+def series_episode(params):
+    """Show all copies of one episode"""
+    series_name = params['series_name']
+    season = params['season']
+    episode = params['episode']
+    xbmcplugin.setPluginCategory(_handle, _addon.getAddonInfo('name') + " \\ " + series_name + " \\ " + f"Rada {season} \\ Epizoda {episode}")
+    sm = series_manager.SeriesManager(_addon, _profile)
+    idents = series_manager.create_episodes_menu(sm, _handle, series_name, season, episode)
+    annotate(idents, _addon.getSetting('token'))
 
 def series_refresh(params):
     """Refresh series data"""
@@ -895,8 +1809,9 @@ def series_refresh(params):
     progress.create('Webshare Cinema', f'Aktualizuji data pro serial {series_name}...')
     
     try:
-        # Search for the series
-        series_data = sm.search_series(series_name, api, token)
+        # Search for the series (TMDb kostru z dřívějška zachováme)
+        existing = sm.load_series_data(series_name)
+        series_data = sm.search_series(series_name, api, token, existing.get('tmdb') if existing else None)
         
         if not series_data or not series_data['seasons']:
             progress.close()
@@ -911,17 +1826,40 @@ def series_refresh(params):
         # Redirect to series detail to refresh the view
         xbmc.executebuiltin(f'Container.Update({get_url(action="series_detail", series_name=series_name)})')
         
+    except UNAVAILABLE:
+        progress.close()
+        traceback.print_exc()
+        series_offline(series_name)
     except Exception as e:
         progress.close()
         traceback.print_exc()
         popinfo(f'Chyba: {str(e)}', icon=xbmcgui.NOTIFICATION_ERROR)
         xbmcplugin.endOfDirectory(_handle, succeeded=False)
 
+def unavailable(params):
+    """Webshare neodpovídá nebo je jistič rozpojený - výpis skončí hned místo čekání"""
+    popinfo('Webshare je dočasně nedostupný', icon=xbmcgui.NOTIFICATION_WARNING)
+    if params.get('action') in ['play', 'movie_play']:
+        xbmcplugin.setResolvedUrl(_handle, False, xbmcgui.ListItem())
+    else:
+        xbmcplugin.endOfDirectory(_handle, succeeded=False)
+
 def router(paramstring):
     params = dict(parse_qsl(paramstring))
+    try:
+        route(params)
+    except UNAVAILABLE:
+        traceback.print_exc()
+        unavailable(params)
+    finally:
+        _scheduler.stats.flush()
+
+def route(params):
     if params:
         if params['action'] == 'search':
             search(params)
+        elif params['action'] == 'isearch':
+            isearch(params)
         elif params['action'] == 'queue':
             queue(params)
         elif params['action'] == 'history':
@@ -935,21 +1873,47 @@ def router(paramstring):
             play(params)
         elif params['action'] == 'download':
             download(params)
+        elif params['action'] == 'download_season':
+            download_season(params)
+        elif params['action'] == 'queue_download_all':
+            queue_download_all(params)
+        elif params['action'] == 'queue_season':
+            queue_season(params)
+        elif params['action'] == 'dequeue_watched':
+            dequeue_watched(params)
+        elif params['action'] == 'dequeue_select':
+            dequeue_select(params)
+        elif params['action'] == 'history_select':
+            history_select(params)
+        elif params['action'] == 'history_clear_old':
+            history_clear_old(params)
+        elif params['action'] == 'dqueue':
+            dqueue(params)
+        elif params['action'] == 'diagnostics':
+            diagnostics(params)
+        elif params['action'] == 'dqueue_run':
+            dqueue_run(params)
         elif params['action'] == 'db':
             db(params)
+        elif params['action'] == 'db_search':
+            db_search(params)
         elif params['action'] == 'movies':
             movies(params)
+        elif params['action'] == 'movie_play':
+            movie_play(params)
         # Series Manager actions
-       elif params['action'] == 'series':
-            series_manager.create_series_menu(series_manager.SeriesManager(_addon, _profile), _handle, _addon.getSetting('tmdb_token'))
+        elif params['action'] == 'series':
+            series_menu(params)
         elif params['action'] == 'series_search':
-            series_manager.create_series_search(series_manager.SeriesManager(_addon, _profile), _handle, _addon.getSetting('tmdb_token'))
+            series_search(params)
         elif params['action'] == 'series_search_tmdb':
             series_search_tmdb(params)
         elif params['action'] == 'series_detail':
             series_detail(params)
         elif params['action'] == 'series_season':
             series_season(params)
+        elif params['action'] == 'series_episode':
+            series_episode(params)
         elif params['action'] == 'series_refresh':
             series_refresh(params)
         elif params['action'] == 'series_delete':